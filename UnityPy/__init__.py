@@ -4,6 +4,7 @@ from .environment import Environment as Environment
 from .helpers.ArchiveStorageManager import (
     set_assetbundle_decrypt_key as set_assetbundle_decrypt_key,
 )
+from .helpers.ProbeHelper import probe as probe
 
 load = Environment
 
@@ -12,8 +12,68 @@ FALLBACK_UNITY_VERSION = None
 SERIALIZED_FILE_PARSE_TYPETREE = True
 """Determines if the typetree structures for the Object types will be parsed.
 
-   Disabling this will reduce the load time by a lot (half of the time is spend on parsing the typetrees),
-   but it will also prevent saving an edited file.
+   The typetree of a type is only parsed when it's used for the first time (see `SerializedType.node`),
+   so disabling this doesn't reduce the load time much anymore, but it will prevent saving an edited file.
+"""
+
+INTERN_TYPETREES = True
+"""Determines if equal typetrees of different SerializedFiles share the same (cached) TypeTreeNode.
+
+   Each typetree blob is only parsed once, which speeds up loading many files of the same game
+   and keeps only one copy of each typetree in memory, see `UnityPy.helpers.TypeTreeNode.TYPETREE_CACHE`.
+   The shared nodes must not be modified, disable this if the nodes of the types are edited.
+"""
+
+COMPILE_TYPETREE_READERS = True
+"""Determines if typetrees are read by readers that are generated per TypeTreeNode if UnityPyBoost isn't available.
+
+   The reader of a node is generated on its first use (see `UnityPy.helpers.TypeTreeCompiler`),
+   it reads the same values as the generic reader, but without inspecting the node for every value.
+   Disabling this reads all typetrees with the generic reader.
+"""
+
+DECOMPRESS_WORKERS = None
+"""Number of threads used to decompress the blocks of a BundleFile.
+
+   By default (None) the blocks are decompressed lazily, only when a read touches them.
+   Setting this to a number decompresses the whole bundle on load instead,
+   using a thread pool with the given amount of workers to decompress the blocks concurrently.
+   This is faster if (nearly) all data of the bundles is going to be read anyway.
+"""
+
+COMPRESS_WORKERS = None
+"""Number of threads used to compress the LZ4/LZ4HC chunks when saving a BundleFile.
+
+   By default (None) the chunks are compressed one after another.
+   The output is the same with any amount of workers.
+"""
+
+COMPRESSION_CHUNK_SIZE = None
+"""Size (in bytes) of the LZ4/LZ4HC chunks when saving a BundleFile.
+
+   By default (None) the chunk size of the compression (CompressionHelper.COMPRESSION_CHUNK_SIZE_MAP) is used.
+"""
+
+COMPRESSION_LEVEL = None
+"""LZ4HC compression level (1-12) used when saving a BundleFile.
+
+   By default (None) the level of CompressionHelper.compress_lz4 is used.
+"""
+
+LZMA_SPILL_THRESHOLD = None
+"""Uncompressed size (in bytes) above which LZMA blocks of a BundleFile are decompressed to disk.
+
+   LZMA bundles are stored as a single block, so by default (None) the whole bundle is decompressed into memory.
+   Blocks bigger than this threshold are decompressed incrementally into a temporary file instead,
+   which is then memory-mapped, so that the operating system can page the data in and out as needed.
+"""
+
+MMAP_LOCAL_FILES = True
+"""Determines if local files are memory-mapped when they're loaded, otherwise they're streamed from the disk.
+
+   Memory-mapped files are only paged in by the operating system when their data is read.
+   A loaded file must not be modified or truncated while it's in use,
+   Environment.save writes a changed file to a temporary file that replaces the original instead.
 """
 
 
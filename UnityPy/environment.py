@@ -2,12 +2,15 @@ import io
 import ntpath
 import os
 import re
-from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, List, Optional, Union, cast
-from zipfile import ZipFile
+import shutil
+import tempfile
+from functools import partial
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, List, Optional, Tuple, Union, cast
 
 from fsspec import AbstractFileSystem
 from fsspec.implementations.local import LocalFileSystem
 
+from . import config
 from .enums import FileType
 from .files import BundleFile, File, ObjectReader, SerializedFile, WebFile
 from .helpers.ContainerHelper import ContainerHelper
@@ -17,30 +20,61 @@ from .helpers.ImportHelper import (
     find_sensitive_path,
     parse_file,
 )
-from .streams import EndianBinaryReader
+from .helpers.IndexHelper import FileIndex, index_files
+from .helpers.ZipHelper import ZipIndex
+from .streams import BlockCache, EndianBinaryReader, SegmentStorage
 
 if TYPE_CHECKING:
+    from UnityPy.classes import AssetInfo, Object, PPtr
     from UnityPy.helpers.TypeTreeGenerator import TypeTreeGenerator
 
 reSplit = re.compile(r"(.*?([^\/\\]+?))\.split\d+")
 
 
 class Environment:
-    files: Dict[str, Union[SerializedFile, BundleFile, WebFile, EndianBinaryReader]]
+    _files: Dict[str, Union[SerializedFile, BundleFile, WebFile, EndianBinaryReader]]
+    # members of zip archives that weren't loaded so far, name -> opener
+    _pending: Dict[str, Callable[[], Union[EndianBinaryReader, BinaryIO]]]
+    # simplified name -> name of the pending members, to find them as dependencies
+    _pending_cabs: Dict[str, str]
+    # container path -> name of the pending (indexed) file that contains it
+    _pending_container: Dict[str, str]
     cabs: Dict[str, Union[SerializedFile, EndianBinaryReader]]
     path: str
     local_files: List[str]
     local_files_simple: List[str]
     typetree_generator: Optional["TypeTreeGenerator"] = None
+    block_cache: Optional[BlockCache] = None
     _container_index_built: bool = False
 
-    def __init__(self, *args: FileSourceType, fs: Optional[AbstractFileSystem] = None, path: Optional[str] = None):
-        self.files = {}
+    def __init__(
+        self,
+        *args: FileSourceType,
+        fs: Optional[AbstractFileSystem] = None,
+        path: Optional[str] = None,
+        cache_bytes: Optional[int] = None,
+        workers: Optional[int] = None,
+        index_cache: Optional[str] = None,
+    ):
+        """
+        cache_bytes:
+            memory budget for the decompressed blocks of all lazily decompressed bundles of the Environment.
+            The least recently used blocks are evicted once the budget is exceeded.
+            By default each bundle keeps the blocks it decompressed as long as it's loaded.
+        workers, index_cache:
+            used to index the files of folders instead of loading them, see load_folder.
+        """
+        self._files = {}
+        self._pending = {}
+        self._pending_cabs = {}
+        self._pending_container = {}
         self.cabs = {}
         self.fs = fs or LocalFileSystem()
         self.local_files = []
         self.local_files_simple = []
         self._container_index_built = False
+        if cache_bytes is not None:
+            self.block_cache = BlockCache(cache_bytes)
 
         if path is None:
             # if no path is given, use the current working directory
@@ -65,37 +99,105 @@ class Environment:
                                 self.load_file(arg)
                     elif self.fs.isdir(arg):
                         self.path = arg
-                        self.load_folder(arg)
+                        self.load_folder(arg, workers=workers, index_cache=index_cache)
                 else:
                     self.load_file(file=arg)
 
-        if len(self.files) == 1:
+        if len(self._files) + len(self._pending) == 1:
             self.file = list(self.files.values())[0]
 
+    @property
+    def files(self) -> Dict[str, Union[SerializedFile, BundleFile, WebFile, EndianBinaryReader]]:
+        if self._pending:
+            self._load_pending()
+        return self._files
+
+    @files.setter
+    def files(self, value: Dict[str, Union[SerializedFile, BundleFile, WebFile, EndianBinaryReader]]):
+        self._files = value
+
     def load_files(self, files: List[str]):
         """Loads all files (list) into the Environment and merges .split files for common usage."""
-        self.load_assets(files, lambda x: open(x, "rb"))
+        self.load_assets(files, self._open_file)
+
+    def _open_file(self, path: str) -> Union[EndianBinaryReader, BinaryIO]:
+        if config.MMAP_LOCAL_FILES and isinstance(self.fs, LocalFileSystem):
+            # the data of memory-mapped files is only paged in when it's read
+            return EndianBinaryReader(path)
+        return cast(BinaryIO, self.fs.open(path, "rb"))
+
+    def load_folder(self, path: str, workers: Optional[int] = None, index_cache: Optional[str] = None):
+        """Loads all files in the given path and its subdirs into the Environment.
 
-    def load_folder(self, path: str):
-        """Loads all files in the given path and its subdirs into the Environment."""
-        self.load_files([self.fs.sep.join([root, f]) for root, dirs, files in self.fs.walk(path) for f in files])
+        If workers or index_cache is set, the files of a local folder are only indexed,
+        and loaded once they're used, see load_index.
+
+        workers:
+            number of processes used to index the files.
+        index_cache:
+            path of a database the indices are cached in (see IndexHelper.IndexCache),
+            unchanged files don't have to be indexed again, e.g. the next time a game is loaded.
+        """
+        files = [self.fs.sep.join([root, f]) for root, dirs, files in self.fs.walk(path) for f in files]
+        if (workers is None and index_cache is None) or not isinstance(self.fs, LocalFileSystem):
+            self.load_files(files)
+            return
+
+        # the pieces of .split files are indexed together, the cache itself isn't indexed
+        cache_path = os.path.abspath(index_cache) if index_cache is not None else None
+        paths: Dict[str, None] = {}
+        for f in files:
+            split_match = reSplit.match(f)
+            if split_match:
+                paths[split_match.group(1)] = None
+            elif os.path.abspath(f) != cache_path:
+                paths[f] = None
+        self.load_index(index_files(list(paths), workers, index_cache))
+
+    def load_index(self, indices: List[FileIndex]):
+        """Adds indexed files to the Environment without loading them.
+
+        A file is loaded once it's needed, e.g. as dependency, for a path of the container,
+        or once the files of the Environment are accessed.
+        """
+        for index in indices:
+            name = index.path
+            self._add_pending(name, partial(self._open_indexed_file, name))
+            for cab in index.cabs:
+                self._pending_cabs[simplify_name(cab.name)] = name
+                for path, _ in cab.container:
+                    self._pending_container[path] = name
+            for resource in index.resources:
+                self._pending_cabs[simplify_name(resource)] = name
+
+    def _open_indexed_file(self, path: str) -> Union[EndianBinaryReader, BinaryIO]:
+        if not self.fs.exists(path) and self.fs.exists(f"{path}.split0"):
+            return self._load_split_file(path)
+        return self._open_file(path)
 
     def load(self, files: List[str]):
         """Loads all files into the Environment."""
-        self.files.update(
+        self._files.update(
             {ntpath.basename(f): self.load_file(self.fs.open(f, "rb"), self, f) for f in files if self.fs.exists(f)}
         )
 
-    def _load_split_file(self, basename: str) -> bytes:
-        file: List[bytes] = []
+    def _load_split_file(self, basename: str) -> EndianBinaryReader:
+        # the pieces are presented as one continuous reader instead of being joined,
+        # so memory-mapped pieces are only paged in when they're read
+        pieces: List[Union[bytes, memoryview]] = []
         for i in range(0, 999):
             item = f"{basename}.split{i}"
             if self.fs.exists(item):
-                with self.fs.open(item, "rb") as f:
-                    file.append(f.read())  # type: ignore
+                if config.MMAP_LOCAL_FILES and isinstance(self.fs, LocalFileSystem):
+                    pieces.append(EndianBinaryReader(item).view)
+                else:
+                    with self.fs.open(item, "rb") as f:
+                        pieces.append(f.read())  # type: ignore
             elif i:
                 break
-        return b"".join(file)
+        if len(pieces) == 1:
+            return EndianBinaryReader(pieces[0])
+        return EndianBinaryReader(SegmentStorage(pieces))
 
     def load_file(
         self,
@@ -108,6 +210,10 @@ class Environment:
             parent = self
 
         if isinstance(file, str):
+            # members of zip archives are loaded once they're requested
+            pending = self._find_pending(file)
+            if pending is not None:
+                return self._load_pending_file(pending)
             split_match = reSplit.match(file)
             if split_match:
                 basepath, _basename = split_match.groups()
@@ -134,7 +240,7 @@ class Environment:
                             # raise FileNotFoundError(f"File {file} not found in {self.path}")
 
                 if isinstance(file, str):
-                    file = self.fs.open(file, "rb")
+                    file = self._open_file(file)
 
         typ, reader = check_file_type(file)
 
@@ -156,32 +262,93 @@ class Environment:
         if isinstance(f, (SerializedFile, EndianBinaryReader)):
             self.register_cab(stream_name, f)
 
-        self.files[stream_name] = f
+        self._files[stream_name] = f
         return f
 
     def load_zip_file(self, value):
+        """Indexes the members of a zip archive (e.g. an apk or obb).
+
+        The members are only loaded once they're requested via load_file,
+        needed as dependency, or once the files of the Environment are accessed.
+        """
         if isinstance(value, str) and self.fs.exists(value):
-            buffer = cast(io.BufferedReader, self.fs.open(value, "rb"))
+            if config.MMAP_LOCAL_FILES and isinstance(self.fs, LocalFileSystem):
+                buffer = EndianBinaryReader(value)
+            else:
+                buffer = cast(io.BufferedReader, self.fs.open(value, "rb"))
         elif isinstance(value, (bytes, bytearray, memoryview)):
-            buffer = io.BytesIO(value)
-        elif isinstance(value, (io.BufferedReader, io.BufferedIOBase)):
+            buffer = EndianBinaryReader(value)
+        elif isinstance(value, (io.BufferedReader, io.BufferedIOBase, EndianBinaryReader)):
             buffer = value
         else:
             raise TypeError("Unsupported type for loading zip file")
 
-        z = ZipFile(buffer)
-        self.load_assets(z.namelist(), lambda x: z.open(x, "r"))  # type: ignore
-        z.close()
+        z = ZipIndex(buffer)
+        split_files: Dict[str, List[str]] = {}
+        for path in z.namelist():
+            split_match = reSplit.match(path)
+            if split_match:
+                split_files.setdefault(split_match.group(1), []).append(path)
+            else:
+                self._add_pending(path, partial(z.open, path))
+
+        for basepath, pieces in split_files.items():
+            pieces.sort(key=lambda piece: int(piece[piece.rindex(".split") + 6 :]))
+            self._add_pending(basepath, partial(_open_zip_split_file, z, pieces))
+
+    def _add_pending(self, name: str, opener: Callable[[], Union[EndianBinaryReader, BinaryIO]]) -> None:
+        self._pending[name] = opener
+        self._pending_cabs[simplify_name(name)] = name
+
+    def _find_pending(self, name: str) -> Optional[str]:
+        if name in self._pending:
+            return name
+        if self._pending_cabs and not self.fs.exists(name):
+            pending = self._pending_cabs.get(simplify_name(name))
+            # indexed files can contain many cabs, which stay registered after the file was loaded
+            if pending in self._pending:
+                return pending
+        return None
+
+    def _load_pending_file(self, name: str):
+        opener = self._pending.pop(name)
+        self._pending_cabs.pop(simplify_name(name), None)
+        # the members are part of the loaded archive, so they aren't loaded as dependencies
+        return self.load_file(opener(), name=name)
+
+    def _load_pending(self) -> None:
+        """Loads all zip members that weren't loaded so far."""
+        while self._pending:
+            self._load_pending_file(next(iter(self._pending)))
 
     def save(self, pack="none", out_path="output"):
         """Saves all changed assets.
         Mark assets as changed using `.mark_changed()`.
         pack = "none" (default) or "lz4"
         """
-        for fname, fitem in self.files.items():
+        # files that are still pending can't have been changed, so they aren't loaded for this
+        for fname, fitem in self._files.items():
             if getattr(fitem, "is_changed", False):
-                with open(self.fs.sep.join([out_path, ntpath.basename(fname)]), "wb") as out:
-                    out.write(fitem.save(packer=pack))
+                path = self.fs.sep.join([out_path, ntpath.basename(fname)])
+                if isinstance(fitem, File) and fitem.reads_from(path):
+                    # the file is still read from the output path (e.g. memory-mapped),
+                    # so it's written to a temporary file that replaces the original afterwards
+                    fd, temp_path = tempfile.mkstemp(dir=out_path)
+                    with open(fd, "wb") as out:
+                        self._save_file(fitem, pack, out)
+                    shutil.copymode(path, temp_path)
+                    os.replace(temp_path, path)
+                else:
+                    with open(path, "wb") as out:
+                        self._save_file(fitem, pack, out)
+
+    @staticmethod
+    def _save_file(fitem: File, pack: str, out: BinaryIO) -> None:
+        if isinstance(fitem, (BundleFile, SerializedFile)):
+            # stream the file directly to the disk
+            fitem.save(packer=pack, fp=out)
+        else:
+            out.write(fitem.save(packer=pack))
 
     @property
     def objects(self) -> List[ObjectReader]:
@@ -206,6 +373,8 @@ class Environment:
         return search(self)
 
     def _build_container_index(self) -> None:
+        if self._pending:
+            self._load_pending()
         if self._container_index_built:
             return
 
@@ -217,6 +386,12 @@ class Environment:
     @property
     def container(self) -> ContainerHelper:
         """Returns a dictionary of all objects in the Environment."""
+        if self._pending_container and self._pending:
+            # indexed files are only loaded once one of their paths is requested
+            return IndexedContainer(self)
+        return self._build_container()
+
+    def _build_container(self) -> ContainerHelper:
         self._build_container_index()
         container = []
         for f in self.cabs.values():
@@ -277,9 +452,14 @@ class Environment:
         File
             The cab file.
         """
-        return self.cabs.get(simplify_name(name), None)
+        simple_name = simplify_name(name)
+        cab = self.cabs.get(simple_name, None)
+        if cab is None and self._pending_cabs.get(simple_name) in self._pending:
+            self._load_pending_file(self._pending_cabs[simple_name])
+            cab = self.cabs.get(simple_name, None)
+        return cab
 
-    def load_assets(self, assets: List[str], open_f: Callable[[str], BinaryIO]):
+    def load_assets(self, assets: List[str], open_f: Callable[[str], Union[BinaryIO, EndianBinaryReader]]):
         """
         Load all assets from a list of files via the given open_f function.
 
@@ -327,6 +507,12 @@ class Environment:
         cab = self.get_cab(simple_name)
         if cab:
             return cab
+        if self._pending:
+            # the file might be within a bundle of a zip archive that wasn't loaded so far
+            self._load_pending()
+            cab = self.get_cab(simple_name)
+            if cab:
+                return cab
         fp = self.fs.sep.join([self.path, name])
         if self.fs.exists(fp):
             return self.load_file(fp, name=name, is_dependency=is_dependency)
@@ -354,6 +540,68 @@ class Environment:
         return self.load_file(fp, name=name, is_dependency=is_dependency)
 
 
+class IndexedContainer(ContainerHelper):
+    """Container of an Environment with indexed files that weren't loaded so far.
+
+    Looking up a path only loads the file that contains it,
+    everything else loads all files and is answered by the full container.
+    """
+
+    environment: Environment
+
+    def __init__(self, environment: Environment):
+        self.environment = environment
+        self._preload_table = None
+        self._read_preload_table = None
+
+    def _find(self, key: str) -> Optional["PPtr[Object]"]:
+        environment = self.environment
+        name = environment._pending_container.get(key)
+        if name is None:
+            # the path isn't in the index, but it might be in a file that wasn't indexed
+            return self.container_dict.get(key)
+        if name in environment._pending:
+            environment._load_pending_file(name)
+        # only the SerializedFiles of the file that contains the path
+        f = environment._files.get(name)
+        candidates = [f] if isinstance(f, SerializedFile) else list(getattr(f, "get_assets", list)())
+        for f in candidates:
+            if isinstance(f, SerializedFile) and not f.is_dependency and key in f.container:
+                return f.container[key]
+        return None
+
+    @property
+    def container(self) -> List[Tuple[str, "AssetInfo"]]:  # type: ignore
+        return self.environment._build_container().container
+
+    @property
+    def container_dict(self) -> Dict[str, "PPtr[Object]"]:  # type: ignore
+        return self.environment._build_container().container_dict
+
+    @property
+    def path_dict(self) -> Dict[int, str]:  # type: ignore
+        return self.environment._build_container().path_dict
+
+    def parse_preload_table(self) -> None:
+        self.environment._build_container_index()
+
+    def get(self, key: str, default: Optional["PPtr[Object]"] = None) -> Optional["PPtr[Object]"]:
+        value = self._find(key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> "PPtr[Object]":
+        value = self._find(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __getattr__(self, name: str) -> "PPtr[Object]":
+        return self[name]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.environment._pending_container or self._find(key) is not None
+
+
 def simplify_name(name: str) -> str:
     """Simplifies a name by:
     - removing the extension
@@ -361,3 +609,8 @@ def simplify_name(name: str) -> str:
     - converting to lowercase
     """
     return ntpath.basename(name).lower()
+
+
+def _open_zip_split_file(z: ZipIndex, pieces: List[str]) -> EndianBinaryReader:
+    # the pieces are presented as one continuous reader instead of being joined
+    return EndianBinaryReader(SegmentStorage([z.open(piece).view for piece in pieces]))
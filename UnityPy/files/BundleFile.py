@@ -1,18 +1,26 @@
 # TODO: implement encryption for saving files
+import itertools
 import re
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
-from typing import Optional, Union, cast
+from mmap import mmap
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union, cast
 
 from .. import config
 from ..enums import ArchiveFlags, ArchiveFlagsOld, CompressionFlags
 from ..helpers import ArchiveStorageManager, CompressionHelper
 from ..helpers.UnityVersion import UnityVersion
-from ..streams import EndianBinaryReader, EndianBinaryWriter
+from ..streams import BlockStorage, EndianBinaryReader, EndianBinaryWriter
 from . import File
 
 BlockInfo = namedtuple("BlockInfo", "uncompressedSize compressedSize flags")
 DirectoryInfoFS = namedtuple("DirectoryInfoFS", "offset size flags path")
 reVersion = re.compile(r"(\d+)\.(\d+)\.(\d+)\w.+")
+# size of the pieces in which node data is copied while saving
+COPY_CHUNK_SIZE = 0x100000
+# compressed data that has to be buffered while saving is kept in memory up to this size
+SPOOL_MAX_SIZE = 0x4000000
 
 
 class BundleFile(File.File):
@@ -23,16 +31,35 @@ class BundleFile(File.File):
     version_player: str
     dataflags: Union[ArchiveFlags, ArchiveFlagsOld]
     decryptor: Optional[ArchiveStorageManager.ArchiveStorageDecryptor] = None
+    blocks_info: List[BlockInfo]
+    directory_info: List[Union[DirectoryInfoFS, File.DirectoryInfo]]
+    header_only: bool = False
+    blocks_reader: Optional[EndianBinaryReader] = None
+    # Hash128 of the uncompressed data (UnityFS), usually zero
+    uncompressed_data_hash: Optional[bytes] = None
     _uses_block_alignment: bool = False
+    # source of the original blocks, used to copy unchanged blocks while saving
+    _blocks_storage: Optional[BlockStorage] = None
+    _original_files: Dict[str, Union[File.File, EndianBinaryReader]]
 
     def __init__(
         self,
         reader: EndianBinaryReader,
         parent: File,
         name: Optional[str] = None,
+        header_only: bool = False,
         **kwargs,
     ):
+        """
+        header_only:
+            only reads the header, the blocks info and the directory info,
+            the files of the bundle aren't parsed and no data block is decompressed.
+            The (lazy) reader of the uncompressed data is kept as blocks_reader instead.
+        """
         super().__init__(parent=parent, name=name, **kwargs)
+        self.header_only = header_only
+        self.blocks_info = []
+        self._original_files = {}
         signature = self.signature = reader.read_string_to_null()
         self.version = reader.read_u_int()
         self.version_player = reader.read_string_to_null()
@@ -50,7 +77,12 @@ class BundleFile(File.File):
         else:
             raise NotImplementedError(f"Unknown Bundle signature: {signature}")
 
-        self.read_files(blocksReader, m_DirectoryInfo)
+        self.directory_info = m_DirectoryInfo
+        if header_only:
+            self.blocks_reader = blocksReader
+        else:
+            self.read_files(blocksReader, m_DirectoryInfo)
+            self._original_files = dict(self.files)
 
     def read_web_raw(self, reader: EndianBinaryReader):
         # def read_header_and_blocks_info(self, reader:EndianBinaryReader):
@@ -141,7 +173,7 @@ class BundleFile(File.File):
         blocksInfoBytes = self.decompress_data(blocksInfoBytes, uncompressedSize, self.dataflags)
         blocksInfoReader = EndianBinaryReader(blocksInfoBytes, offset=start)
 
-        uncompressedDataHash = blocksInfoReader.read_bytes(16)  # noqa: F841
+        self.uncompressed_data_hash = blocksInfoReader.read_bytes(16)
         blocksInfoCount = blocksInfoReader.read_int()
 
         m_BlocksInfo = [
@@ -164,28 +196,36 @@ class BundleFile(File.File):
             for _ in range(nodesCount)
         ]
 
+        self.blocks_info = m_BlocksInfo
         if m_BlocksInfo:
             self._block_info_flags = m_BlocksInfo[0].flags
 
         if isinstance(self.dataflags, ArchiveFlags) and self.dataflags & ArchiveFlags.BlockInfoNeedPaddingAtStart:
             reader.align_stream(16)
 
-        blocksReader = EndianBinaryReader(
-            b"".join(
-                self.decompress_data(
-                    reader.read_bytes(blockInfo.compressedSize),
-                    blockInfo.uncompressedSize,
-                    blockInfo.flags,
-                    i,
-                )
-                for i, blockInfo in enumerate(m_BlocksInfo)
-            ),
-            offset=(blocksInfoReader.real_offset()),
+        blocksStorage = BlockStorage(
+            reader,
+            m_BlocksInfo,
+            reader.Position,
+            self.decompress_data,
+            cache=getattr(self.environment, "block_cache", None),
         )
+        self._blocks_storage = blocksStorage
+        if config.DECOMPRESS_WORKERS and not self.header_only:
+            blocksReader = EndianBinaryReader(
+                blocksStorage.decompress_all(config.DECOMPRESS_WORKERS),
+                offset=(blocksInfoReader.real_offset()),
+            )
+        else:
+            # blocks are only decompressed when a read touches them
+            blocksReader = EndianBinaryReader(
+                blocksStorage,
+                offset=(blocksInfoReader.real_offset()),
+            )
 
         return m_DirectoryInfo, blocksReader
 
-    def save(self, packer=None):
+    def save(self, packer=None, fp: Optional[BinaryIO] = None) -> Optional[bytes]:
         """
         Rewrites the BundleFile and returns it as bytes object.
 
@@ -195,14 +235,31 @@ class BundleFile(File.File):
             allowed strings:
                 none - no compression, default, safest bet
                 lz4 - lz4 compression
-                original - uses the original flags
+                original - uses the original flags,
+                           blocks that only contain unchanged data are copied without recompressing them
+        fp:
+            seekable file handle the BundleFile is written to instead.
+            The blocks are written as soon as they are compressed,
+            so the bundle doesn't have to be kept in memory.
+            Returns None in this case.
+            It can't be the (memory-mapped) file the bundle is read from.
         """
+        if fp is not None and self.reads_from(fp):
+            # the data that wasn't read so far would be read from the file while it's overwritten
+            raise ValueError("A BundleFile can't be written into the file it's read from, save it to another path")
+
+        storage = self._blocks_storage
+        if storage is not None:
+            # the blocks that weren't read so far would be read from the source while it's overwritten,
+            # so they're copied into memory first
+            storage.reader.detach()
+
         # file_header
         #     signature         (string_to_null)
         #     format            (int)
         #     version_player    (string_to_null)
         #     version_engine    (string_to_null)
-        writer = EndianBinaryWriter()
+        writer = EndianBinaryWriter(fp) if fp is not None else EndianBinaryWriter()
 
         writer.write_string_to_null(self.signature)
         writer.write_u_int(self.version)
@@ -224,6 +281,7 @@ class BundleFile(File.File):
                     writer,
                     data_flag=self.dataflags,
                     block_info_flag=self._block_info_flags,
+                    reuse_blocks=True,
                 )
             elif packer == "lz4":
                 self.save_fs(writer, data_flag=194, block_info_flag=2)
@@ -233,9 +291,21 @@ class BundleFile(File.File):
                 self.save_fs(writer, *packer)
             else:
                 raise NotImplementedError("UnityFS - Packer:", packer)
+
+        if fp is not None:
+            return None
         return writer.bytes
 
-    def save_fs(self, writer: EndianBinaryWriter, data_flag: int, block_info_flag: int):
+    def _get_source(self) -> Optional[EndianBinaryReader]:
+        return self._blocks_storage.reader if self._blocks_storage is not None else None
+
+    def save_fs(
+        self,
+        writer: EndianBinaryWriter,
+        data_flag: int,
+        block_info_flag: int,
+        reuse_blocks: bool = False,
+    ):
         # header
         # compressed blockinfo (block details & directionary)
         # compressed assets
@@ -283,32 +353,187 @@ class BundleFile(File.File):
         #         name      (string_to_null)
         #     )
 
-        # file list & file data
-        # prep nodes and build up block data
-        data_writer = EndianBinaryWriter()
-        files = [
-            (
-                name,
-                f.flags,
-                data_writer.write_bytes(
-                    f.bytes if isinstance(f, (EndianBinaryReader, EndianBinaryWriter)) else f.save()
-                ),
-            )
-            for name, f in self.files.items()
-        ]
-
-        file_data = data_writer.bytes
-        data_writer.dispose()
-
         # remove encryption flag, as encryption isn't done
         if block_info_flag & self.dataflags.UsesAssetBundleEncryption:
             block_info_flag ^= self.dataflags.UsesAssetBundleEncryption
         if data_flag & self.dataflags.UsesAssetBundleEncryption:
             data_flag ^= self.dataflags.UsesAssetBundleEncryption
 
-        file_data, block_info = CompressionHelper.chunk_based_compress(file_data, block_info_flag)
+        if not data_flag & 0x40:
+            raise NotImplementedError("UnityPy always writes DirectoryInfo, so data_flag must include 0x40")
+
+        # write the header info
+        ## sizes - 0 for now, will be set at the end,
+        ## because they can only be calculated after the data compression
+        writer_header_pos = writer.Position
+        writer.write_long(0)
+        # compressed blockInfoBytes size
+        writer.write_u_int(0)
+        # uncompressed size
+        writer.write_u_int(0)
+        # compression and file layout flag
+        writer.write_u_int(data_flag)
+
+        # UnityWeb version 6
+        if self.signature != "UnityFS":
+            writer.write_byte(0)
+
+        if self._uses_block_alignment:
+            # UnityFS\x00 - 8
+            # size 8
+            # comp sizes 4+4
+            # flag 4
+            # sum : 28 -> +8 alignment
+            writer.align_stream(16)
+
+        if data_flag & 0x80:  # at end of file
+            if data_flag & 0x200:
+                writer.align_stream(16)
+            # the blocks are written as soon as they are compressed
+            block_info, files = self._write_blocks(writer, block_info_flag, reuse_blocks)
+            block_data, uncompressed_block_data_size = self._build_blocks_info(block_info, files, data_flag)
+            writer.write(block_data)
+        else:
+            # the block info has to be written before the data,
+            # but it can only be built after the data is compressed,
+            # so the compressed blocks are spooled into a temporary file first
+            with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+                block_info, files = self._write_blocks(EndianBinaryWriter(spool), block_info_flag, reuse_blocks)
+                block_data, uncompressed_block_data_size = self._build_blocks_info(block_info, files, data_flag)
+                writer.write(block_data)
+                if data_flag & 0x200:
+                    writer.align_stream(16)
+                spool.seek(0)
+                for chunk in iter(lambda: spool.read(COPY_CHUNK_SIZE), b""):
+                    writer.write(chunk)
+
+        writer_end_pos = writer.Position
+        writer.Position = writer_header_pos
+        # correct file size
+        writer.write_long(writer_end_pos)
+        # compressed blockInfoBytes size
+        writer.write_u_int(len(block_data))
+        # uncompressed size
+        writer.write_u_int(uncompressed_block_data_size)
+        writer.Position = writer_end_pos
+
+    def _iter_file_data(self, f: Union[File.File, EndianBinaryReader, EndianBinaryWriter]):
+        """Yields the data of a node in pieces, readers are copied chunk by chunk."""
+        if isinstance(f, EndianBinaryReader):
+            for pos in range(0, f.Length, COPY_CHUNK_SIZE):
+                f.Position = pos
+                yield f.read(COPY_CHUNK_SIZE)
+        elif isinstance(f, EndianBinaryWriter):
+            yield f.bytes
+        else:
+            yield f.save()
+
+    def _write_blocks(self, writer: EndianBinaryWriter, block_info_flag: int, reuse_blocks: bool = False):
+        """Compresses the data of all nodes and writes each block as soon as it's compressed.
+
+        If reuse_blocks is set, the original compressed blocks
+        that are fully covered by unchanged data are copied instead.
+        Unchanged data are unchanged nodes, and the parts of changed SerializedFiles
+        that stay the same at the same position (e.g. the objects in front of the first changed one).
+
+        Returns the block info and the (name, flags, size) of each node."""
+        storage = self._blocks_storage
+        original_nodes = {}
+        # encrypted blocks can't be copied, as the encryption isn't written
+        if reuse_blocks and storage is not None and self.decryptor is None:
+            original_nodes = {node.path: node for node in self.directory_info}
+
+        sizes: Dict[str, int] = {}
+        # the data of the bundle as sequence of
+        # unchanged ranges of the original data (start, end) and iterables of new data
+        segments = []
+
+        def add_range(start: int, end: int):
+            if segments and isinstance(segments[-1], tuple) and segments[-1][1] == start:
+                segments[-1] = (segments[-1][0], end)
+            else:
+                segments.append((start, end))
+
+        for name, f in self.files.items():
+            node = original_nodes.get(name)
+            if node is None or self._original_files.get(name) is not f:
+                segments.append(self._iter_counted_data(name, f, sizes))
+            elif not getattr(f, "is_changed", False):
+                sizes[name] = node.size
+                add_range(node.offset, node.offset + node.size)
+            elif hasattr(f, "_save_segments"):
+                # SerializedFile, the parts that didn't change are copied like unchanged nodes
+                size = 0
+                for segment in f._save_segments():  # type: ignore
+                    if isinstance(segment, tuple):
+                        add_range(node.offset + segment[0], node.offset + segment[1])
+                        size += segment[1] - segment[0]
+                    else:
+                        segments.append(segment)
+                        size += sum(len(data) for data in segment)
+                sizes[name] = size
+            else:
+                segments.append(self._iter_counted_data(name, f, sizes))
 
-        # write the block_info
+        block_info = []
+        pending = []
+
+        def flush():
+            if pending:
+                block_info.extend(
+                    CompressionHelper.chunk_based_compress_stream(
+                        itertools.chain.from_iterable(pending), block_info_flag, writer.write
+                    )
+                )
+                pending.clear()
+
+        for segment in segments:
+            if not isinstance(segment, tuple):
+                pending.append(segment)
+                continue
+            assert storage is not None
+            start, end = segment
+            # blocks within [first, last) lie completely within the unchanged range
+            first = bisect_left(storage.offsets, start)
+            last = bisect_right(storage.offsets, end) - 1
+            if first >= last:
+                pending.append(self._iter_storage_data(storage, start, end))
+                continue
+            if start < storage.offsets[first]:
+                pending.append(self._iter_storage_data(storage, start, storage.offsets[first]))
+            flush()
+            for index in range(first, last):
+                writer.write(storage.read_compressed_block(index))
+                block = storage.blocks[index]
+                block_info.append((block.uncompressedSize, block.compressedSize, block.flags))
+            if storage.offsets[last] < end:
+                pending.append(self._iter_storage_data(storage, storage.offsets[last], end))
+        flush()
+
+        files = [(name, f.flags, sizes[name]) for name, f in self.files.items()]
+        return block_info, files
+
+    def _iter_counted_data(
+        self,
+        name: str,
+        f: Union[File.File, EndianBinaryReader, EndianBinaryWriter],
+        sizes: Dict[str, int],
+    ):
+        """Yields the data of a node and stores its size in sizes once it's exhausted."""
+        size = 0
+        for data in self._iter_file_data(f):
+            size += len(data)
+            yield data
+        sizes[name] = size
+
+    @staticmethod
+    def _iter_storage_data(storage: BlockStorage, start: int, end: int):
+        """Yields the uncompressed data of the storage between start and end in chunks."""
+        for pos in range(start, end, COPY_CHUNK_SIZE):
+            yield storage.read(pos, min(COPY_CHUNK_SIZE, end - pos))
+
+    def _build_blocks_info(self, block_info: list, files: list, data_flag: int) -> Tuple[bytes, int]:
+        """Builds the (compressed) block info, returns it together with its uncompressed size."""
         # uncompressedDataHash
         block_writer = EndianBinaryWriter(b"\x00" * 0x10)
         # data block info
@@ -322,8 +547,6 @@ class BundleFile(File.File):
             block_writer.write_u_short(block_flag)
 
         # file block info
-        if not data_flag & 0x40:
-            raise NotImplementedError("UnityPy always writes DirectoryInfo, so data_flag must include 0x40")
         # file count
         block_writer.write_int(len(files))
         offset = 0
@@ -350,47 +573,7 @@ class BundleFile(File.File):
         else:
             raise NotImplementedError(f"No compression function in the CompressionHelper.COMPRESSION_MAP for {switch}")
 
-        compressed_block_data_size = len(block_data)
-
-        # write the header info
-        ## file size - 0 for now, will be set at the end
-        writer_header_pos = writer.Position
-        writer.write_long(0)
-        # compressed blockInfoBytes size
-        writer.write_u_int(compressed_block_data_size)
-        # uncompressed size
-        writer.write_u_int(uncompressed_block_data_size)
-        # compression and file layout flag
-        writer.write_u_int(data_flag)
-
-        # UnityWeb version 6
-        if self.signature != "UnityFS":
-            writer.write_byte(0)
-
-        if self._uses_block_alignment:
-            # UnityFS\x00 - 8
-            # size 8
-            # comp sizes 4+4
-            # flag 4
-            # sum : 28 -> +8 alignment
-            writer.align_stream(16)
-
-        if data_flag & 0x80:  # at end of file
-            if data_flag & 0x200:
-                writer.align_stream(16)
-            writer.write(file_data)
-            writer.write(block_data)
-        else:
-            writer.write(block_data)
-            if data_flag & 0x200:
-                writer.align_stream(16)
-            writer.write(file_data)
-
-        writer_end_pos = writer.Position
-        writer.Position = writer_header_pos
-        # correct file size
-        writer.write_long(writer_end_pos)
-        writer.Position = writer_end_pos
+        return block_data, uncompressed_block_data_size
 
     def save_web_raw(self, writer: EndianBinaryWriter):
         # (version >= 4) hash
@@ -492,7 +675,7 @@ class BundleFile(File.File):
         uncompressed_size: int,
         flags: Union[int, ArchiveFlags, ArchiveFlagsOld],
         index: int = 0,
-    ) -> bytes:
+    ) -> Union[bytes, mmap]:
         """
         Parameters
         ----------
@@ -505,14 +688,21 @@ class BundleFile(File.File):
 
         Returns
         -------
-        bytes
-            The decompressed data."""
+        bytes | mmap
+            The decompressed data,
+            LZMA data bigger than config.LZMA_SPILL_THRESHOLD is returned as read-only mmap."""
         comp_flag = CompressionFlags(flags & ArchiveFlags.CompressionTypeMask)
 
         if self.decryptor is not None and flags & 0x100 and comp_flag != CompressionFlags.NONE:
             compressed_data = self.decryptor.decrypt_block(compressed_data, index)
 
-        if comp_flag in CompressionHelper.DECOMPRESSION_MAP:
+        if (
+            comp_flag == CompressionFlags.LZMA
+            and config.LZMA_SPILL_THRESHOLD is not None
+            and uncompressed_size > config.LZMA_SPILL_THRESHOLD
+        ):
+            return CompressionHelper.decompress_lzma_to_mmap(compressed_data, uncompressed_size)
+        elif comp_flag in CompressionHelper.DECOMPRESSION_MAP:
             return cast(
                 bytes,
                 CompressionHelper.DECOMPRESSION_MAP[comp_flag](compressed_data, uncompressed_size),
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from attrs import define, field
+
+
+@define(slots=True)
+class ObjectChange:
+    """Change of an object of a SerializedFile.
+
+    old_size -- size of the original data, None for added objects
+    new_size -- size of the new data, None for removed objects
+    """
+
+    path_id: int
+    class_id: int
+    old_size: Optional[int]
+    new_size: Optional[int]
+
+    @property
+    def byte_delta(self) -> int:
+        return (self.new_size or 0) - (self.old_size or 0)
+
+
+@define(slots=True)
+class ChangeSet:
+    """Changes of a file since it was loaded.
+
+    objects -- changed objects of a SerializedFile
+    files -- change sets of the changed files within a BundleFile or WebFile,
+             files that were added as raw data (e.g. new resource files) don't have any changed objects
+    """
+
+    name: str
+    objects: List[ObjectChange] = field(factory=list)
+    files: List[ChangeSet] = field(factory=list)
+
+    @property
+    def path_ids(self) -> List[int]:
+        """Path ids of the changed objects of this file (without the ones of the files within)."""
+        return [change.path_id for change in self.objects]
+
+    @property
+    def byte_delta(self) -> int:
+        """Size difference of the data of all changed objects, including the ones of the files within."""
+        return sum(change.byte_delta for change in self.objects) + sum(f.byte_delta for f in self.files)
+
+    def __bool__(self) -> bool:
+        return bool(self.objects or self.files)
+
+
+__all__ = [
+    "ChangeSet",
+    "ObjectChange",
+]
@@ -2,10 +2,12 @@ from __future__ import annotations
 
 from collections import namedtuple
 from os.path import basename
-from typing import TYPE_CHECKING, Dict, Optional
+from typing import TYPE_CHECKING, BinaryIO, Dict, Optional, Union
 
 from ..helpers import ImportHelper
 from ..streams import EndianBinaryReader, EndianBinaryWriter
+from ..streams.EndianBinaryReader import EndianBinaryReader_Blocks, EndianBinaryReader_Memoryview, file_id
+from .ChangeSet import ChangeSet
 
 if TYPE_CHECKING:
     from ..environment import Environment
@@ -58,9 +60,7 @@ class File:
                     if obj.type in obj_types:
                         yield obj
             elif isinstance(f, SerializedFile.SerializedFile):
-                for obj in f.objects.values():
-                    if obj.type in obj_types:
-                        yield obj
+                yield from f.objects.get_by_class_id(*obj_types)
 
     def get_objects(self):
         for f in self.files.values():
@@ -76,18 +76,38 @@ class File:
     def read_files(self, reader: EndianBinaryReader, files: list):
         # read file data and convert it
         for node in files:
-            reader.Position = node.offset
-            name = node.path
-            node_reader = EndianBinaryReader(reader.read(node.size), offset=(reader.BaseOffset + node.offset))
-            f = ImportHelper.parse_file(node_reader, self, name, is_dependency=self.is_dependency)
-
-            if isinstance(f, (EndianBinaryReader, SerializedFile.SerializedFile)):
-                if self.environment:
-                    self.environment.register_cab(name, f)
-
-            # required for BundleFiles
-            f.flags = getattr(node, "flags", 0)
-            self.files[name] = f
+            self.files[node.path] = self.read_file(reader, node)
+
+    def read_file(self, reader: EndianBinaryReader, node):
+        """Parses a node of the directory info and registers it in the environment."""
+        name = node.path
+        node_reader = self.get_node_reader(reader, node)
+        f = ImportHelper.parse_file(node_reader, self, name, is_dependency=self.is_dependency)
+
+        if isinstance(f, (EndianBinaryReader, SerializedFile.SerializedFile)):
+            if self.environment:
+                self.environment.register_cab(name, f)
+
+        # required for BundleFiles
+        f.flags = getattr(node, "flags", 0)
+        return f
+
+    def get_node_reader(self, reader: EndianBinaryReader, node) -> EndianBinaryReader:
+        """Returns a reader for the data of a node of the directory info."""
+        if isinstance(reader, EndianBinaryReader_Blocks):
+            # keep the node lazy, so that only the blocks it reads from are decompressed
+            return EndianBinaryReader(
+                reader.storage.window(node.offset, node.size),
+                offset=(reader.BaseOffset + node.offset),
+            )
+        if isinstance(reader, EndianBinaryReader_Memoryview):
+            # slice of the parent data instead of a copy
+            return EndianBinaryReader(
+                reader.view[node.offset : node.offset + node.size],
+                offset=(reader.BaseOffset + node.offset),
+            )
+        reader.Position = node.offset
+        return EndianBinaryReader(reader.read(node.size), offset=(reader.BaseOffset + node.offset))
 
     def get_writeable_cab(self, name: Optional[str] = None):
         """
@@ -142,11 +162,34 @@ class File:
     def __repr__(self):
         return f"<{self.__class__.__name__}>"
 
+    def _get_source(self) -> Optional[EndianBinaryReader]:
+        """Returns the reader the data of this file is (lazily) read from."""
+        return None
+
+    def reads_from(self, file: Union[str, BinaryIO]) -> bool:
+        """Checks if the data of this file is still read from the given local file (path or handle),
+        in which case the file must not be overwritten while this file is saved."""
+        source = self._get_source()
+        source_id = source.get_file_id() if source is not None else None
+        return source_id is not None and source_id == file_id(file)
+
     def mark_changed(self):
         if isinstance(self.parent, File):
             self.parent.mark_changed()
         self.is_changed = True
 
+    def get_changes(self) -> ChangeSet:
+        """Returns the changes of the files within this file since it was loaded."""
+        changes = ChangeSet(self.name)
+        for name, f in self.files.items():
+            if isinstance(f, File):
+                if f.is_changed:
+                    changes.files.append(f.get_changes())
+            elif isinstance(f, EndianBinaryWriter):
+                # new raw data, e.g. the resource file of get_writeable_cab
+                changes.files.append(ChangeSet(name))
+        return changes
+
 
 # recursive import requires the import down here
 from . import BundleFile, ObjectReader, SerializedFile, WebFile  # noqa: E402
@@ -5,6 +5,7 @@ from typing import (
     Any,
     Dict,
     Generic,
+    Iterator,
     List,
     Optional,
     Type,
@@ -23,6 +24,7 @@ from ..helpers import TypeTreeHelper
 from ..helpers.Tpk import get_typetree_node
 from ..helpers.TypeTreeNode import TypeTreeNode
 from ..streams import EndianBinaryReader, EndianBinaryWriter
+from ..streams.EndianBinaryReader import EndianBinaryReader_Blocks, EndianBinaryReader_Memoryview
 
 if TYPE_CHECKING:
     from ..files.SerializedFile import SerializedFile, SerializedType
@@ -130,14 +132,6 @@ class ObjectReader(Generic[T]):
         )
 
     def write(self, header, writer: EndianBinaryWriter, data_writer: EndianBinaryWriter):
-        if self.assets_file.big_id_enabled:
-            writer.write_long(self.path_id)
-        elif header.version < 14:
-            writer.write_int(self.path_id)
-        else:
-            writer.align_stream()
-            writer.write_long(self.path_id)
-
         if self.data is not None:
             data = self.data
             # in some cases the parser doesn't read all of the object data
@@ -153,13 +147,25 @@ class ObjectReader(Generic[T]):
             self.reset()
             data = self.reader.read(self.byte_size)
 
+        self.write_info(header, writer, data_writer.Position, len(data))
+        data_writer.write(data)
+
+    def write_info(self, header, writer: EndianBinaryWriter, byte_start: int, byte_size: int):
+        """Writes the object info, the data of the object is written separately at byte_start."""
+        if self.assets_file.big_id_enabled:
+            writer.write_long(self.path_id)
+        elif header.version < 14:
+            writer.write_int(self.path_id)
+        else:
+            writer.align_stream()
+            writer.write_long(self.path_id)
+
         if header.version >= 22:
-            writer.write_long(data_writer.Position)
+            writer.write_long(byte_start)
         else:
-            writer.write_u_int(data_writer.Position)
+            writer.write_u_int(byte_start)
 
-        writer.write_u_int(len(data))
-        data_writer.write(data)
+        writer.write_u_int(byte_size)
 
         writer.write_int(self.type_id)
 
@@ -179,10 +185,18 @@ class ObjectReader(Generic[T]):
             writer.write_byte(self.is_stripped)
 
     def set_raw_data(self, data: bytes):
+        if self.data is None and len(data) == self.byte_size and data == self.get_raw_data():
+            # the data didn't change, so the object (and its file) don't have to be saved
+            return
         self.data = data
         if self.assets_file:
             self.assets_file.mark_changed()
 
+    @property
+    def is_changed(self) -> bool:
+        """Whether the data of the object was changed, see set_raw_data."""
+        return self.data is not None
+
     def get_class(self) -> Union[Type[T], None]:
         return ClassIDTypeToClassMap.get(self.type)  # type: ignore
 
@@ -282,6 +296,30 @@ class ObjectReader(Generic[T]):
         self.Position = pos
         return ret
 
+    def iter_raw_data(self) -> Iterator[Union[bytes, memoryview]]:
+        """Yields the raw data of the object (or its changed data) in pieces.
+
+        The data of unchanged objects is returned as slices of the data of the file
+        instead of copies where possible, so the pieces are only valid as long as the file is open.
+        """
+        if self.data is not None:
+            yield self.data
+            return
+
+        reader = self.reader
+        start = self.byte_start
+        end = start + self.byte_size
+        if isinstance(reader, EndianBinaryReader_Memoryview):
+            yield reader.view[start:end]
+        elif isinstance(reader, EndianBinaryReader_Blocks):
+            # one slice per block
+            while start < end:
+                view, view_start, view_end = reader.storage.get_view(start)
+                yield view[start - view_start : min(end, view_end) - view_start]
+                start = view_end
+        else:
+            yield self.get_raw_data()
+
     def _get_typetree_node(
         self,
         node: Optional[NodeInput] = None,
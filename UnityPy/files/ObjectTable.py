@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from struct import Struct
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    ItemsView,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    ValuesView,
+)
+
+from ..enums import ClassIDType
+from .ChangeSet import ObjectChange
+from .ObjectReader import ObjectReader
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from ..streams.EndianBinaryReader import EndianBinaryReader
+    from .SerializedFile import SerializedFile
+
+
+class ObjectTable(MutableMapping[int, ObjectReader]):
+    """The objects of a SerializedFile by their path id.
+
+    The object infos are stored as parallel arrays (columns),
+    the ObjectReaders are only created once an object is accessed.
+    Created ObjectReaders are kept, so changes made to them persist.
+
+    path_ids, byte_starts, byte_sizes, type_ids, class_ids -- columns of the object infos, one row per object
+    is_destroyed, is_stripped -- optional columns, only set for the versions that have them
+    """
+
+    assets_file: SerializedFile
+    reader: EndianBinaryReader
+    path_ids: array
+    byte_starts: array
+    byte_sizes: array
+    type_ids: array
+    class_ids: array
+    is_destroyed: Optional[array]
+    is_stripped: Optional[array]
+    # path id -> row, only used if the path ids aren't sorted, otherwise the row is found via bisection
+    _rows: Optional[Dict[int, int]]
+    _readers: Dict[int, ObjectReader]
+    _class_types: Dict[int, ClassIDType]
+    # objects that were added after the table was read
+    _extra: Dict[int, ObjectReader]
+    _deleted: Set[int]
+    # changes to the table, path id -> row of removed objects and rows whose object was replaced
+    _removed: Dict[int, int]
+    _replaced: Set[int]
+
+    def __init__(self, assets_file: SerializedFile, reader: EndianBinaryReader):
+        self.assets_file = assets_file
+        self.reader = reader
+        self.path_ids = array("q")
+        self.byte_starts = array("q")
+        self.byte_sizes = array("I")
+        self.type_ids = array("i")
+        self.class_ids = array("i")
+        self.is_destroyed = None
+        self.is_stripped = None
+        self._rows = None
+        self._readers = {}
+        self._class_types = {}
+        self._extra = {}
+        self._deleted = set()
+        self._removed = {}
+        self._replaced = set()
+
+    @classmethod
+    def from_reader(cls, assets_file: SerializedFile, reader: EndianBinaryReader, count: int) -> ObjectTable:
+        """Reads the object infos of the SerializedFile."""
+        table = cls(assets_file, reader)
+        version = assets_file.header.version
+        if version >= 17 and count:
+            table._read_fixed_size(reader, count)
+        else:
+            table._read(reader, count)
+
+        # path ids are usually sorted, which allows to find them via bisection instead of a dict
+        path_ids = table.path_ids
+        # the dict is used unless the path ids are known to be strictly increasing,
+        # they're compared directly, as their differences can overflow int64
+        if np is not None:
+            ids = np.frombuffer(path_ids, dtype=np.int64)
+            is_sorted = bool((ids[1:] > ids[:-1]).all())
+        else:
+            is_sorted = all(path_ids[i] < path_ids[i + 1] for i in range(len(path_ids) - 1))
+        if not is_sorted:
+            rows: Dict[int, int] = {}
+            for row, path_id in enumerate(path_ids):
+                if path_id in rows:
+                    # the last object with the same path id wins
+                    table._deleted.add(rows[path_id])
+                rows[path_id] = row
+            table._rows = rows
+        return table
+
+    def _read_fixed_size(self, reader: EndianBinaryReader, count: int) -> None:
+        # since version 17 all object infos have the same size and alignment,
+        # so the whole table can be unpacked at once
+        header = self.assets_file.header
+        reader.align_stream()
+        endian = reader.endian
+        types = self.assets_file.types
+        if header.version >= 22:
+            fields = (("path_id", "q"), ("byte_start", "q"), ("byte_size", "I"), ("type_id", "i"))
+        else:
+            fields = (("path_id", "q"), ("byte_start", "I"), ("byte_size", "I"), ("type_id", "i"))
+        record_size = sum(Struct(typ).size for _, typ in fields)
+        data = reader.read_bytes(record_size * count)
+
+        if np is not None:
+            table = np.frombuffer(data, dtype=np.dtype([(name, f"{endian}{typ}") for name, typ in fields]))
+            path_ids = table["path_id"].astype(np.int64).tobytes()
+            byte_starts = (table["byte_start"].astype(np.int64) + header.data_offset).tobytes()
+            byte_sizes = table["byte_size"].astype(np.uint32).tobytes()
+            type_ids = table["type_id"].astype(np.int32)
+            class_ids = np.array([typ.class_id for typ in types], dtype=np.int32)[type_ids].tobytes()
+            type_ids = type_ids.tobytes()
+        else:
+            record = Struct(endian + "".join(typ for _, typ in fields))
+            path_ids, byte_starts, byte_sizes, type_ids = zip(*record.iter_unpack(data))
+            byte_starts = [byte_start + header.data_offset for byte_start in byte_starts]
+            class_ids = [types[type_id].class_id for type_id in type_ids]
+
+        self.path_ids = array("q", path_ids)
+        self.byte_starts = array("q", byte_starts)
+        self.byte_sizes = array("I", byte_sizes)
+        self.type_ids = array("i", type_ids)
+        self.class_ids = array("i", class_ids)
+
+    def _read(self, reader: EndianBinaryReader, count: int) -> None:
+        # same as ObjectReader.from_reader
+        assets_file = self.assets_file
+        header = assets_file.header
+        types = assets_file.types
+        if header.version < 11:
+            self.is_destroyed = array("H")
+        if header.version in (15, 16):
+            self.is_stripped = array("b")
+
+        for _ in range(count):
+            if assets_file.big_id_enabled:
+                path_id = reader.read_long()
+            elif header.version < 14:
+                path_id = reader.read_int()
+            else:
+                reader.align_stream()
+                path_id = reader.read_long()
+
+            if header.version >= 22:
+                byte_start = reader.read_long()
+            else:
+                byte_start = reader.read_u_int()
+
+            byte_start += header.data_offset
+            byte_size = reader.read_u_int()
+
+            type_id = reader.read_int()
+
+            serialized_type = None
+            if header.version < 16:
+                class_id = reader.read_u_short()
+                serialized_type = self._find_type(type_id)
+            else:
+                serialized_type = types[type_id]
+                class_id = serialized_type.class_id
+
+            if self.is_destroyed is not None:
+                self.is_destroyed.append(reader.read_u_short())
+
+            if 11 <= header.version < 17:
+                script_type_index = reader.read_short()
+                if serialized_type:
+                    serialized_type.script_type_index = script_type_index
+
+            if self.is_stripped is not None:
+                self.is_stripped.append(reader.read_byte())
+
+            self.path_ids.append(path_id)
+            self.byte_starts.append(byte_start)
+            self.byte_sizes.append(byte_size)
+            self.type_ids.append(type_id)
+            self.class_ids.append(class_id)
+
+    def _find_type(self, type_id: int):
+        # before version 16 the type id is the class id of the type
+        for typ in self.assets_file.types:
+            if typ.class_id == type_id:
+                return typ
+        return None
+
+    def _find_row(self, path_id: int) -> Optional[int]:
+        if self._rows is not None:
+            row = self._rows.get(path_id)
+        else:
+            row = bisect_left(self.path_ids, path_id)
+            if row == len(self.path_ids) or self.path_ids[row] != path_id:
+                row = None
+        if row is None or row in self._deleted:
+            return None
+        return row
+
+    def _get_reader(self, row: int) -> ObjectReader:
+        obj = self._readers.get(row)
+        if obj is None:
+            type_id = self.type_ids[row]
+            class_id = self.class_ids[row]
+            if self.assets_file.header.version < 16:
+                serialized_type = self._find_type(type_id)
+            else:
+                serialized_type = self.assets_file.types[type_id]
+            # converting the class id to the enum is relatively slow
+            clz_type = self._class_types.get(class_id)
+            if clz_type is None:
+                clz_type = self._class_types[class_id] = ClassIDType(class_id)
+            obj = self._readers[row] = ObjectReader(
+                self.assets_file,
+                self.reader,
+                self.path_ids[row],
+                type_id,
+                serialized_type,
+                class_id,
+                clz_type,
+                self.byte_starts[row],
+                self.byte_sizes[row],
+                self.is_destroyed[row] if self.is_destroyed is not None else None,
+                self.is_stripped[row] if self.is_stripped is not None else None,
+            )
+        return obj
+
+    def _iter_rows(self) -> Iterator[int]:
+        if not self._deleted:
+            return iter(range(len(self.path_ids)))
+        return (row for row in range(len(self.path_ids)) if row not in self._deleted)
+
+    def get_by_class_id(self, *class_ids: Union[int, ClassIDType]) -> List[ObjectReader]:
+        """Returns the objects with the given class ids, only their ObjectReaders are created."""
+        if np is not None and len(self.class_ids):
+            rows = np.isin(np.frombuffer(self.class_ids, dtype=np.int32), class_ids).nonzero()[0].tolist()
+        else:
+            wanted = set(class_ids)
+            rows = [row for row, class_id in enumerate(self.class_ids) if class_id in wanted]
+        objects = [self._get_reader(row) for row in rows if row not in self._deleted]
+        objects.extend(obj for obj in self._extra.values() if obj.class_id in class_ids)
+        return objects
+
+    def get_changes(self) -> List[ObjectChange]:
+        """Returns the objects that were changed, added or removed since the table was read."""
+        changes = []
+        for row, obj in sorted(self._readers.items()):
+            if row in self._deleted or (obj.data is None and row not in self._replaced):
+                continue
+            new_size = len(obj.data) if obj.data is not None else obj.byte_size
+            changes.append(ObjectChange(obj.path_id, obj.class_id, self.byte_sizes[row], new_size))
+        for path_id, obj in self._extra.items():
+            # an object that replaces a removed one
+            row = self._removed.get(path_id)
+            old_size = self.byte_sizes[row] if row is not None else None
+            new_size = len(obj.data) if obj.data is not None else obj.byte_size
+            changes.append(ObjectChange(path_id, obj.class_id, old_size, new_size))
+        for path_id, row in self._removed.items():
+            if path_id not in self._extra:
+                changes.append(ObjectChange(path_id, self.class_ids[row], self.byte_sizes[row], None))
+        return changes
+
+    def __getitem__(self, path_id: int) -> ObjectReader:
+        obj = self._extra.get(path_id)
+        if obj is not None:
+            return obj
+        row = self._find_row(path_id)
+        if row is None:
+            raise KeyError(path_id)
+        return self._get_reader(row)
+
+    def __setitem__(self, path_id: int, obj: ObjectReader) -> None:
+        row = self._find_row(path_id)
+        if row is not None:
+            if self._readers.get(row) is not obj:
+                self._replaced.add(row)
+            self._readers[row] = obj
+            # keep the filtering by class id up to date
+            self.class_ids[row] = obj.class_id
+        else:
+            self._extra[path_id] = obj
+
+    def __delitem__(self, path_id: int) -> None:
+        if path_id in self._extra:
+            del self._extra[path_id]
+            return
+        row = self._find_row(path_id)
+        if row is None:
+            raise KeyError(path_id)
+        self._deleted.add(row)
+        self._readers.pop(row, None)
+        self._replaced.discard(row)
+        self._removed[path_id] = row
+
+    def __contains__(self, path_id: object) -> bool:
+        return path_id in self._extra or (isinstance(path_id, int) and self._find_row(path_id) is not None)
+
+    def __iter__(self) -> Iterator[int]:
+        path_ids = self.path_ids
+        for row in self._iter_rows():
+            yield path_ids[row]
+        yield from self._extra
+
+    def values(self) -> ValuesView[ObjectReader]:
+        return ObjectTableValues(self)
+
+    def items(self) -> ItemsView[int, ObjectReader]:
+        return ObjectTableItems(self)
+
+    def __len__(self) -> int:
+        return len(self.path_ids) - len(self._deleted) + len(self._extra)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {len(self)} objects>"
+
+
+class ObjectTableValues(ValuesView):
+    _mapping: ObjectTable
+
+    def __iter__(self) -> Iterator[ObjectReader]:
+        # iterates the rows directly instead of looking up each path id
+        table = self._mapping
+        for row in table._iter_rows():
+            yield table._get_reader(row)
+        yield from table._extra.values()
+
+
+class ObjectTableItems(ItemsView):
+    _mapping: ObjectTable
+
+    def __iter__(self) -> Iterator[Tuple[int, ObjectReader]]:
+        table = self._mapping
+        for row in table._iter_rows():
+            yield table.path_ids[row], table._get_reader(row)
+        yield from table._extra.items()
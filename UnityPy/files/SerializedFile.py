@@ -1,23 +1,37 @@
 from __future__ import annotations
 
 from ntpath import basename
-from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 
-from attrs import define
+from attrs import define, field
 
 from .. import config
 from ..enums import BuildTarget, ClassIDType, CommonString
 from ..helpers.ContainerHelper import ContainerHelper
 from ..helpers.TypeTreeHelper import TypeTreeNode
+from ..helpers.TypeTreeNode import TYPETREE_CACHE
 from ..helpers.UnityVersion import UnityVersion
-from ..streams import EndianBinaryWriter
+from ..streams import EndianBinaryReader, EndianBinaryWriter
 from . import BundleFile, File
-from .ObjectReader import ObjectReader
+from .ChangeSet import ChangeSet
+from .ObjectTable import ObjectTable
 
 if TYPE_CHECKING:
     from ..classes import AssetBundle, Object
-    from ..files import ObjectReader
-    from ..streams.EndianBinaryReader import EndianBinaryReader
+    from .ObjectReader import ObjectReader
+
+# layout of a saved SerializedFile, see SerializedFile.save
+SavedLayout = NamedTuple(
+    "SavedLayout",
+    [
+        ("head", bytes),
+        ("objects", List["ObjectReader"]),
+        ("byte_starts", List[int]),
+        ("byte_sizes", List[int]),
+        ("data_size", int),
+        ("tail", bytes),
+    ],
+)
 
 
 @define(slots=True)
@@ -101,7 +115,11 @@ class SerializedType:
     script_type_index: int = -1
     script_id: Optional[bytes] = None  # Hash128
     old_type_hash: Optional[bytes] = None  # Hash128
-    node: Optional[TypeTreeNode] = None
+    _node: Optional[TypeTreeNode] = None
+    # raw typetree blob, parsed on the first access of node
+    _blob: Optional[bytes] = field(default=None, eq=False, repr=False)
+    _blob_version: Optional[int] = field(default=None, eq=False, repr=False)
+    _blob_endian: Optional[str] = field(default=None, eq=False, repr=False)
     # ref type
     m_ClassName: Optional[str] = None
     m_NameSpace: Optional[str] = None
@@ -136,7 +154,10 @@ class SerializedType:
 
         if serialized_file._enable_type_tree:
             if version >= 12 or version == 10:
-                self.node = TypeTreeNode.parse_blob(reader, version)
+                # the blob is only parsed when the node is used
+                self._blob = TypeTreeNode.read_blob(reader, version)
+                self._blob_version = version
+                self._blob_endian = reader.endian
             else:
                 self.node = TypeTreeNode.parse(reader, version)
 
@@ -177,11 +198,20 @@ class SerializedType:
             writer.write_bytes(self.old_type_hash)  # Hash128
 
         if serialized_file._enable_type_tree:
-            assert self.node is not None
-            if version >= 12 or version == 10:
-                self.node.dump_blob(writer, version)
+            if (
+                self._node is None
+                and self._blob is not None
+                and self._blob_version == version
+                and self._blob_endian == writer.endian
+            ):
+                # the typetree wasn't used, so it can be written back as it was read
+                writer.write_bytes(self._blob)
             else:
-                serialized_file.dump(writer, version)
+                assert self.node is not None
+                if version >= 12 or version == 10:
+                    self.node.dump_blob(writer, version)
+                else:
+                    self.node.dump(writer, version)
 
             if version >= 21:
                 if is_ref_type:
@@ -197,6 +227,27 @@ class SerializedType:
                     assert self.type_dependencies is not None
                     writer.write_int_array(self.type_dependencies, True)
 
+    @property
+    def node(self) -> Optional[TypeTreeNode]:
+        if self._node is None and self._blob is not None:
+            assert self._blob_version is not None and self._blob_endian is not None
+            if config.INTERN_TYPETREES:
+                self._node = TYPETREE_CACHE.get_node(
+                    self._blob,
+                    self._blob_version,
+                    self._blob_endian,
+                    (self.class_id, self.old_type_hash, self.script_id),
+                )
+            else:
+                self._node = TypeTreeNode.parse_blob(
+                    EndianBinaryReader(self._blob, self._blob_endian), self._blob_version
+                )
+        return self._node
+
+    @node.setter
+    def node(self, node: Optional[TypeTreeNode]):
+        self._node = node
+
     @property
     def nodes(self) -> Optional[TypeTreeNode]:
         # for compatibility with old versions
@@ -213,13 +264,15 @@ class SerializedFile(File.File):
     script_types: List[LocalSerializedObjectIdentifier]
     externals: List[FileIdentifier]
     ref_types: Optional[List[SerializedType]]
-    objects: Dict[int, ObjectReader]
+    objects: ObjectTable
     unknown: int
     header: SerializedFileHeader
     _m_target_platform: int
     big_id_enabled: int
     userInformation: Optional[str]
-    assetbundle: Optional[AssetBundle]
+    _assetbundle: Optional[AssetBundle]
+    _assetbundle_read: bool
+    _container_helper: Optional[ContainerHelper]
     _cache: Dict[str, Object]
 
     @property
@@ -232,7 +285,12 @@ class SerializedFile(File.File):
     def files(self, value):
         self.objects = value
 
-    def __init__(self, reader: EndianBinaryReader, parent=None, name=None, **kwargs):
+    def __init__(self, reader: EndianBinaryReader, parent=None, name=None, header_only: bool = False, **kwargs):
+        """
+        header_only:
+            only reads the metadata (header, types, object infos, externals),
+            the AssetBundle object isn't parsed, so the container stays empty.
+        """
         super().__init__(parent=parent, name=name, **kwargs)
         self.reader = reader
 
@@ -242,7 +300,7 @@ class SerializedFile(File.File):
         self.types = []
         self.script_types = []
         self.externals = []
-        self.objects = {}
+        self.objects = ObjectTable(self, reader)
         # used to speed up mass asset extraction
         # some assets refer to each other, so by keeping the result
         # of specific assets cached the extraction can be speed up by a lot.
@@ -289,10 +347,7 @@ class SerializedFile(File.File):
 
         # ReadObjects
         object_count = reader.read_int()
-        self.objects = {}
-        for _ in range(object_count):
-            obj = ObjectReader.from_reader(self, reader)
-            self.objects[obj.path_id] = obj
+        self.objects = ObjectTable.from_reader(self, reader, object_count)
 
         # Read Scripts
         if header.version >= 11:
@@ -313,20 +368,52 @@ class SerializedFile(File.File):
         if header.version >= 5:
             self.userInformation = reader.read_string_to_null()
 
-        # read the asset_bundles to get the containers
-        for obj in self.objects.values():
-            if obj.type == ClassIDType.AssetBundle:
-                self.assetbundle = obj.parse_as_object()
-                self._container = ContainerHelper(self.assetbundle)
-                break
-        else:
-            self.assetbundle = None
-            self._container = ContainerHelper([])
+        # the AssetBundle object and its container are only parsed when they're used
+        self._assetbundle = None
+        self._assetbundle_read = header_only
+        self._container_helper = ContainerHelper([]) if header_only else None
+
+    @property
+    def assetbundle(self) -> Optional[AssetBundle]:
+        if not self._assetbundle_read:
+            self._assetbundle_read = True
+            assetbundles = self.objects.get_by_class_id(ClassIDType.AssetBundle)
+            if assetbundles:
+                self._assetbundle = assetbundles[0].parse_as_object()
+        return self._assetbundle
+
+    @assetbundle.setter
+    def assetbundle(self, value: Optional[AssetBundle]):
+        self._assetbundle = value
+        self._assetbundle_read = True
+        self._container_helper = None
+
+    @property
+    def _container(self) -> ContainerHelper:
+        if self._container_helper is None:
+            if self._assetbundle_read:
+                self._container_helper = ContainerHelper(self._assetbundle if self._assetbundle is not None else [])
+            else:
+                # only the container is parsed, not the whole AssetBundle
+                assetbundles = self.objects.get_by_class_id(ClassIDType.AssetBundle)
+                if assetbundles:
+                    self._container_helper = ContainerHelper.from_object_reader(assetbundles[0])
+                else:
+                    self._container_helper = ContainerHelper([])
+        return self._container_helper
+
+    @_container.setter
+    def _container(self, value: ContainerHelper):
+        self._container_helper = value
 
     @property
     def container(self):
         return self._container
 
+    def get_changes(self) -> ChangeSet:
+        """Returns the objects that were changed, added or removed since the file was loaded."""
+        return ChangeSet(self.name, self.objects.get_changes())
+
     def load_dependencies(self, possible_dependencies: Optional[list] = None):
         """Load all external dependencies.
 
@@ -386,14 +473,50 @@ class SerializedFile(File.File):
 
         return cab
 
-    def save(self, packer: Optional[str] = None) -> bytes:
-        # 1. header -> has to be delayed until the very end
-        # 2. data -> types, objects, scripts, ...
+    def _get_source(self) -> Optional[EndianBinaryReader]:
+        return self.reader
+
+    def save(self, packer: Optional[str] = None, fp: Optional[BinaryIO] = None) -> Optional[bytes]:
+        """
+        Rewrites the SerializedFile and returns it as bytes object.
+
+        The layout of the file is computed first,
+        so that the header, the metadata and the object data can be written in one pass.
+        The data of unchanged objects is copied directly from the data of the original file.
+
+        fp:
+            file handle the SerializedFile is written to instead.
+            Returns None in this case.
+            It can't be the (memory-mapped) file the SerializedFile is read from.
+        """
+        if fp is not None and self.reads_from(fp):
+            # the data of the unchanged objects would be copied from the file while it's overwritten
+            raise ValueError("A SerializedFile can't be written into the file it's read from, save it to another path")
+
+        parts = self._iter_saved_parts(self._build_layout())
+        if fp is not None:
+            for part in parts:
+                fp.write(part)
+            return None
+        return b"".join(parts)
 
-        # so write the data first
+    def _build_layout(self) -> SavedLayout:
+        """Computes the layout of the saved file and writes its header and metadata."""
         header = self.header
+        objects = sorted(self.objects.values(), key=lambda x: x.path_id)
+
+        # layout of the object data, each object is aligned to 8 bytes
+        byte_starts: List[int] = []
+        byte_sizes: List[int] = []
+        data_size = 0
+        for obj in objects:
+            byte_size = len(obj.data) if obj.data is not None else obj.byte_size
+            byte_starts.append(data_size)
+            byte_sizes.append(byte_size)
+            data_size += byte_size
+            data_size += (8 - data_size % 8) % 8
+
         meta_writer = EndianBinaryWriter(endian=header.endian)
-        data_writer = EndianBinaryWriter(endian=header.endian)
 
         if header.version >= 7:
             meta_writer.write_string_to_null(self.unity_version)
@@ -413,10 +536,9 @@ class SerializedFile(File.File):
             meta_writer.write_int(self.big_id_enabled)
 
         # ReadObjects
-        meta_writer.write_int(len(self.objects))
-        for obj in sorted(self.objects.values(), key=lambda x: x.path_id):
-            obj.write(header, meta_writer, data_writer)
-            data_writer.align_stream(8)
+        meta_writer.write_int(len(objects))
+        for obj, byte_start, byte_size in zip(objects, byte_starts, byte_sizes):
+            obj.write_info(header, meta_writer, byte_start, byte_size)
 
         # Read Scripts
         if header.version >= 11:
@@ -440,10 +562,10 @@ class SerializedFile(File.File):
             meta_writer.write_string_to_null(self.userInformation)
 
         # prepare header
+        # the file consists of head, object data and tail
         writer = EndianBinaryWriter()
         header_size = 16  # 4*4
         metadata_size = meta_writer.Length
-        data_size = data_writer.Length
         if header.version >= 9:
             # 1 bool + 3 reserved + extra header 4 + 3*8
             header_size += 4 if header.version < 22 else 4 + 28
@@ -475,7 +597,8 @@ class SerializedFile(File.File):
 
             writer.write_bytes(meta_writer.bytes)
             writer.align_stream(16)
-            writer.write_bytes(data_writer.bytes)
+            head = writer.bytes
+            tail = b""
 
         else:
             metadata_size += 1  # endian boolean
@@ -486,11 +609,83 @@ class SerializedFile(File.File):
             # reader.Position = header.file_size - header.metadata_size
             # so data follows right after this header -> after 32
             writer.write_u_int(32)
-            writer.write_bytes(data_writer.bytes)
-            writer.write_boolean(">" == header.endian)
-            writer.write_bytes(meta_writer.bytes)
+            head = writer.bytes
+            tail = (b"\x01" if ">" == header.endian else b"\x00") + meta_writer.bytes
+
+        return SavedLayout(head, objects, byte_starts, byte_sizes, data_size, tail)
+
+    @staticmethod
+    def _iter_saved_parts(layout: SavedLayout) -> Iterator[Union[bytes, memoryview]]:
+        """Yields the data of the saved file in pieces."""
+        yield layout.head
+        position = 0
+        for obj, byte_start, byte_size in zip(layout.objects, layout.byte_starts, layout.byte_sizes):
+            # padding of the previous object
+            yield b"\x00" * (byte_start - position)
+            yield from obj.iter_raw_data()
+            position = byte_start + byte_size
+        yield b"\x00" * (layout.data_size - position)
+        yield layout.tail
+
+    def _save_segments(self) -> List[Union[Tuple[int, int], List[Union[bytes, memoryview]]]]:
+        """Returns the data of the saved file as segments,
+        either ranges (start, end) of the original data that are kept at the same position,
+        or lists of new data.
+
+        Used by BundleFile.save to copy the compressed blocks that only contain unchanged data."""
+        layout = self._build_layout()
+        header = self.header
+        if header.version < 9:
+            # the metadata follows the object data, so any change moves it
+            return [list(self._iter_saved_parts(layout))]
 
-        return writer.bytes
+        segments: List[Union[Tuple[int, int], List[Union[bytes, memoryview]]]] = []
+
+        def add_range(start: int, end: int):
+            if segments and isinstance(segments[-1], tuple) and segments[-1][1] == start:
+                segments[-1] = (segments[-1][0], end)
+            else:
+                segments.append((start, end))
+
+        def add_data(*data: Union[bytes, memoryview]):
+            if not segments or isinstance(segments[-1], tuple):
+                segments.append([])
+            segments[-1].extend(data)  # type: ignore
+
+        def add_padding(start: int, end: int):
+            # padding between two kept objects is kept as well
+            if segments and isinstance(segments[-1], tuple) and segments[-1][1] == start:
+                add_range(start, end)
+            elif end > start:
+                add_data(b"\x00" * (end - start))
+
+        head = layout.head
+        reader = self.reader
+        position = reader.Position
+        reader.Position = 0
+        same_head = len(head) == header.data_offset and reader.read_bytes(len(head)) == head
+        reader.Position = position
+        if same_head:
+            add_range(0, len(head))
+        else:
+            add_data(head)
+
+        data_offset = len(head)
+        position = data_offset
+        for obj, byte_start, byte_size in zip(layout.objects, layout.byte_starts, layout.byte_sizes):
+            start = data_offset + byte_start
+            if not obj.is_changed and obj.assets_file is self and obj.byte_start == start:
+                add_padding(position, start)
+                add_range(start, start + byte_size)
+            else:
+                add_data(b"\x00" * (start - position), *obj.iter_raw_data())
+            position = start + byte_size
+        end = data_offset + layout.data_size
+        if header.file_size == end:
+            add_padding(position, end)
+        elif end > position:
+            add_data(b"\x00" * (end - position))
+        return segments
 
 
 def read_string(string_buffer_reader: EndianBinaryReader, value: int) -> str:
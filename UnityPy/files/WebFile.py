@@ -1,4 +1,5 @@
-from typing import Optional
+from struct import unpack_from
+from typing import Dict, Iterator, List, Optional, Union
 
 from ..helpers import CompressionHelper
 from ..streams import EndianBinaryReader, EndianBinaryWriter
@@ -9,11 +10,35 @@ class WebFile(File.File):
     """A package which can hold other WebFiles, Bundles and SerialiedFiles.
     It may be compressed via gzip or brotli.
 
+    Only the header is read (and decompressed) on load,
+    the files are decompressed and parsed once they're accessed.
+
     files -- list of all files in the WebFile
+    directory_info -- path, offset and size of all files in the WebFile
     """
 
+    directory_info: List[File.DirectoryInfo]
+    _files: Dict[str, Union[File.File, EndianBinaryReader]]
+    _pending: Dict[str, File.DirectoryInfo]
+    _reader: EndianBinaryReader
+    # compressed WebFiles are decompressed on demand into _data
+    _decompressor: Optional[Iterator[bytes]] = None
+    _data: Optional[bytearray] = None
+    _decompressed: int = 0
+
+    @property
+    def files(self):
+        if self._pending:
+            self._read_pending()
+        return self._files
+
+    @files.setter
+    def files(self, value):
+        self._files = value
+
     def __init__(self, reader: EndianBinaryReader, parent: File, name=None, **kwargs):
         """Constructor Method"""
+        self._pending = {}
         super().__init__(parent=parent, name=name, **kwargs)
 
         # check compression
@@ -22,38 +47,108 @@ class WebFile(File.File):
 
         if magic == CompressionHelper.GZIP_MAGIC:
             self.packer = "gzip"
-            data = CompressionHelper.decompress_gzip(reader.bytes)
-            reader = EndianBinaryReader(data, endian="<")
+            self._decompressor = CompressionHelper.decompress_gzip_stream(reader.read)
         else:
             reader.Position = 0x20
             magic = reader.read_bytes(6)
             reader.Position = 0
             if CompressionHelper.BROTLI_MAGIC == magic:
                 self.packer = "brotli"
-                data = CompressionHelper.decompress_brotli(reader.bytes)
-                reader = EndianBinaryReader(data, endian="<")
+                self._decompressor = CompressionHelper.decompress_brotli_stream(reader.read)
             else:
                 self.packer = "none"
                 reader.endian = "<"
 
+        if self._decompressor is not None:
+            header = self._decompress_header()
+            header_reader = EndianBinaryReader(header, endian="<")
+        else:
+            header_reader = reader
+
         # signature check
-        signature = reader.read_string_to_null()
+        signature = header_reader.read_string_to_null()
         if not signature.startswith(("UnityWebData", "TuanjieWebData")):
             raise ValueError(f"Invalid WebFile signature: {signature!r}. Expected 'UnityWebData' or 'TuanjieWebData'.")
         self.signature = signature
 
         # read header -> contains file headers
-        head_length = reader.read_int()
+        head_length = header_reader.read_int()
 
         files = []
-        while reader.Position < head_length:
-            offset = reader.read_int()
-            length = reader.read_int()
-            path_length = reader.read_int()
-            name = bytes(reader.read_bytes(path_length)).decode("utf-8")
+        while header_reader.Position < head_length:
+            offset = header_reader.read_int()
+            length = header_reader.read_int()
+            path_length = header_reader.read_int()
+            name = bytes(header_reader.read_bytes(path_length)).decode("utf-8")
             files.append(File.DirectoryInfo(name, offset, length))
 
-        self.read_files(reader, files)
+        if self._decompressor is not None:
+            # the size of the uncompressed data is known from the header,
+            # so the data can be decompressed into a preallocated buffer
+            size = max([head_length, len(header), *(node.offset + node.size for node in files)])
+            self._data = bytearray(size)
+            self._data[: len(header)] = header
+            self._decompressed = len(header)
+            reader = EndianBinaryReader(self._data, endian="<")
+
+        self.directory_info = files
+        self._reader = reader
+        self._pending = {node.path: node for node in files}
+
+    def _decompress_header(self) -> bytearray:
+        """Decompresses the data until the header (signature and file headers) is complete."""
+        assert self._decompressor is not None
+        header = bytearray()
+        # signature and header length
+        end = -1
+        while end == -1 or len(header) < end + 5:
+            header += self._next_decompressed()
+            end = header.find(0)
+        (head_length,) = unpack_from("<i", header, end + 1)
+        while len(header) < head_length:
+            header += self._next_decompressed()
+        return header
+
+    def _next_decompressed(self) -> bytes:
+        assert self._decompressor is not None
+        data = next(self._decompressor, None)
+        if data is None:
+            raise EOFError("Compressed data ended before the end of the WebFile was reached")
+        return data
+
+    def _decompress_until(self, end: int) -> None:
+        """Decompresses the data until the given offset is reached."""
+        data = self._data
+        assert data is not None
+        while self._decompressed < end:
+            chunk = self._next_decompressed()
+            size = min(len(chunk), len(data) - self._decompressed)
+            data[self._decompressed : self._decompressed + size] = chunk[:size]
+            self._decompressed += size
+        if self._decompressed == len(data):
+            self._decompressor = None
+
+    def get_node_reader(self, reader: EndianBinaryReader, node) -> EndianBinaryReader:
+        if self._decompressor is not None:
+            self._decompress_until(node.offset + node.size)
+        return super().get_node_reader(reader, node)
+
+    def _read_pending(self) -> None:
+        """Parses all files that weren't accessed so far."""
+        pending, self._pending = self._pending, {}
+        for node in pending.values():
+            self._files[node.path] = self.read_file(self._reader, node)
+        # keep the order of the directory info
+        files = {node.path: self._files[node.path] for node in self.directory_info if node.path in self._files}
+        files.update(self._files)
+        self._files = files
+
+    def __getitem__(self, item):
+        # parse only the requested file
+        node = self._pending.pop(item, None)
+        if node is not None:
+            self._files[item] = self.read_file(self._reader, node)
+        return self._files[item]
 
     def save(
         self,
@@ -1,4 +1,5 @@
 from .BundleFile import BundleFile
+from .ChangeSet import ChangeSet, ObjectChange
 from .File import DirectoryInfo, File
 from .ObjectReader import ObjectReader
 from .SerializedFile import SerializedFile
@@ -6,8 +7,10 @@ from .WebFile import WebFile
 
 __all__ = [
     "BundleFile",
+    "ChangeSet",
     "DirectoryInfo",
     "File",
+    "ObjectChange",
     "ObjectReader",
     "SerializedFile",
     "WebFile",
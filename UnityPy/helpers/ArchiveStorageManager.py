@@ -1,6 +1,8 @@
 # based on: https://github.com/Razmoth/PGRStudio/blob/master/AssetStudio/PGR/PGR.cs
+import os
 import re
-from typing import Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, Tuple, Union
 
 from ..streams import EndianBinaryReader
 
@@ -9,8 +11,17 @@ try:
 except ImportError:
     UnityPyBoost = None
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 UNITY3D_SIGNATURE = b"#$unity3dchina!@"
 DECRYPT_KEY: Optional[bytes] = None
+# size of the pieces of the file that are searched for the key in parallel
+BRUTE_FORCE_SHARD_SIZE = 0x400000
+# the shards overlap by the key length - 1, so that keys on shard borders are found
+BRUTE_FORCE_SHARD_OVERLAP = 15
 
 
 def set_assetbundle_decrypt_key(key: Union[bytes, str]):
@@ -43,18 +54,108 @@ def brute_force_key(
     data_sig: bytes,
     pattern: re.Pattern = re.compile(rb"(?=(\w{16}))"),
     verbose: bool = False,
-):
-    with open(fp, "rb") as f:
-        data = f.read()
+    workers: Optional[int] = None,
+    shard_size: int = BRUTE_FORCE_SHARD_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[Callable[[], bool]] = None,
+) -> Optional[bytes]:
+    """Searches the file for the key of UnityCN encrypted bundles.
+
+    The file is split into overlapping shards,
+    which are searched one after another or by a process pool if workers is set.
+    The results of the shards are checked in the order of the file,
+    so the same (first) key is found with any number of workers.
+
+    Parameters
+    ----------
+    fp : str
+        Path to the global-metadata.dat or a memory dump.
+    key_sig : bytes
+        key_sig of the ArchiveStorageDecryptor.
+    data_sig : bytes
+        data_sig of the ArchiveStorageDecryptor.
+    pattern : re.Pattern
+        Pattern that yields the candidates as first group.
+    workers : int
+        Number of processes, None (default) or 1 searches within this process.
+    shard_size : int
+        Number of bytes searched per task.
+    progress : Callable[[int, int], None]
+        Called with the searched and total number of bytes after each shard.
+    cancel : Callable[[], bool]
+        Polled after each shard, the search stops if it returns True.
+
+    Returns
+    -------
+    bytes | None
+        The key, or None if it wasn't found or the search was cancelled.
+    """
+    total = os.path.getsize(fp)
+    shards = [(start, min(start + shard_size, total)) for start in range(0, total, shard_size)]
 
-    matches = pattern.findall(data)
-    for i, key in enumerate(matches):
+    def report(searched: int) -> bool:
         if verbose:
-            print(f"Trying {i + 1}/{len(matches)} - {key}")
-        signature = decrypt_key(key_sig, data_sig, key)
-        if signature == UNITY3D_SIGNATURE:
-            if verbose:
-                print(f"Found key: {key}")
+            print(f"Searched {searched}/{total} bytes")
+        if progress:
+            progress(searched, total)
+        return bool(cancel and cancel())
+
+    key = None
+    searched = 0
+    if workers is None or workers <= 1 or len(shards) <= 1:
+        for start, end in shards:
+            key = _brute_force_shard(fp, start, end, key_sig, data_sig, pattern)
+            searched += end - start
+            if key or report(searched):
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_brute_force_shard, fp, start, end, key_sig, data_sig, pattern) for start, end in shards
+            ]
+            try:
+                for future, (start, end) in zip(futures, shards):
+                    key = future.result()
+                    searched += end - start
+                    if key or report(searched):
+                        break
+            finally:
+                # stop the shards that weren't started yet
+                for future in futures:
+                    future.cancel()
+
+    if verbose and key:
+        print(f"Found key: {key}")
+    return key
+
+
+def _brute_force_shard(
+    fp: str,
+    start: int,
+    end: int,
+    key_sig: bytes,
+    data_sig: bytes,
+    pattern: re.Pattern,
+) -> Optional[bytes]:
+    """Checks all candidates starting within [start, end) of the file."""
+    from Crypto.Cipher import AES
+
+    with open(fp, "rb") as f:
+        f.seek(start)
+        # overlap with the next shard, so that keys on the border are found as well
+        data = f.read(end - start + BRUTE_FORCE_SHARD_OVERLAP)
+
+    # decrypt_key(key_sig, data_sig, key) == UNITY3D_SIGNATURE
+    # is equivalent to the key encrypting key_sig to data_sig ^ UNITY3D_SIGNATURE
+    target = bytes(x ^ y for x, y in zip(data_sig, UNITY3D_SIGNATURE))
+    # dumps contain lots of duplicates, so each candidate is only checked once,
+    # 16 byte candidates can't start within the overlap, as it's shorter than them
+    checked = set()
+    for key in pattern.findall(data):
+        if key in checked:
+            continue
+        checked.add(key)
+        if AES.new(key, AES.MODE_ECB).encrypt(key_sig) == target:
             return key
     return None
 
@@ -63,6 +164,7 @@ class ArchiveStorageDecryptor:
     unknown_1: int
     index: bytes
     substitute: bytes = bytes(0x10)
+    _decrypt_table: Optional[bytes] = None
 
     def __init__(self, reader: EndianBinaryReader):
         self.unknown_1 = reader.read_u_int()
@@ -97,15 +199,73 @@ class ArchiveStorageDecryptor:
         if UnityPyBoost:
             return UnityPyBoost.decrypt_block(self.index, self.substitute, data, index)
 
-        offset = 0
+        # same as decrypting each sequence via self.decrypt,
+        # but with the decrypt_byte results looked up from a precomputed table
+        table = self.get_decrypt_table()
         size = len(data)
         data = bytearray(data)
-        view = memoryview(data)
-        while offset < len(data):
-            offset += self.decrypt(view[offset:], index, size - offset)
+        offset = 0
+        while offset < size:
+            # the index only advances by one per sequence
+            seq_index = index
             index += 1
+
+            token = data[offset] = table[(seq_index & 0xFF) << 8 | data[offset]]
+            offset += 1
+            seq_index += 1
+
+            literal_length = token >> 4
+            if literal_length == 0xF:
+                b = 0xFF
+                while b == 0xFF:
+                    b = data[offset] = table[(seq_index & 0xFF) << 8 | data[offset]]
+                    offset += 1
+                    seq_index += 1
+                    literal_length += b
+
+            # the literals aren't encrypted
+            offset += literal_length
+
+            if offset < size:
+                # match offset
+                data[offset] = table[(seq_index & 0xFF) << 8 | data[offset]]
+                data[offset + 1] = table[((seq_index + 1) & 0xFF) << 8 | data[offset + 1]]
+                offset += 2
+                seq_index += 2
+                if token & 0xF == 0xF:
+                    b = 0xFF
+                    while b == 0xFF:
+                        b = data[offset] = table[(seq_index & 0xFF) << 8 | data[offset]]
+                        offset += 1
+                        seq_index += 1
         return data
 
+    def get_decrypt_table(self) -> bytes:
+        """Returns the results of decrypt_byte for all byte values and index residues,
+        as flat table with the result of (value, index) at (index & 0xFF) << 8 | value."""
+        if self._decrypt_table is None:
+            if np is not None:
+                residue = np.arange(0x100)
+                value = np.arange(0x100)
+                substitute = np.frombuffer(self.substitute, dtype=np.uint8).astype(np.int64)
+                index = np.frombuffer(self.index, dtype=np.uint8).astype(np.int64)
+                key = (
+                    substitute[((residue >> 2) & 3) + 4]
+                    + substitute[residue & 3]
+                    + substitute[((residue >> 4) & 3) + 8]
+                    + substitute[(residue >> 6) + 12]
+                )[:, None]
+                table = ((index[value & 0xF] - key) & 0xF | 0x10 * (index[value >> 4] - key)) % 256
+                self._decrypt_table = table.astype(np.uint8).tobytes()
+            else:
+                view = bytearray(0x10000)
+                for residue in range(0x100):
+                    for value in range(0x100):
+                        view[residue << 8 | value] = value
+                        self.decrypt_byte(view, residue << 8 | value, residue)
+                self._decrypt_table = bytes(view)
+        return self._decrypt_table
+
     def decrypt_byte(self, view: Union[bytearray, memoryview], offset: int, index: int):
         b = (
             self.substitute[((index >> 2) & 3) + 4]
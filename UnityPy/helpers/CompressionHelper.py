@@ -1,16 +1,31 @@
 import gzip
 import lzma
+import mmap
 import struct
-from typing import Callable, Dict, Tuple, Union
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 
 import brotli
 import lz4.block
 
+from .. import config
 from ..enums.BundleFile import CompressionFlags
 
+T = TypeVar("T")
+R = TypeVar("R")
 ByteString = Union[bytes, bytearray, memoryview]
 GZIP_MAGIC: bytes = b"\x1f\x8b"
 BROTLI_MAGIC: bytes = b"brotli"
+# size of the pieces in which lzma data is decompressed into a file
+LZMA_SPILL_CHUNK_SIZE = 0x400000
+# data that has to be buffered while compressing a stream via lzma is kept in memory up to this size
+LZMA_SPOOL_MAX_SIZE = 0x4000000
+# size of the pieces in which gzip and brotli data is read by the stream decompressors
+STREAM_CHUNK_SIZE = 0x100000
 
 
 # LZMA
@@ -23,12 +38,72 @@ def decompress_lzma(data: ByteString, read_decompressed_size: bool = False) -> b
     :return: uncompressed data
     :rtype: bytes
     """
+    dec = _lzma_decompressor(data)
+    data_offset = 13 if read_decompressed_size else 5
+    return dec.decompress(data[data_offset:])
+
+
+def decompress_lzma_to_file(
+    data: ByteString,
+    fp: BinaryIO,
+    read_decompressed_size: bool = False,
+    chunk_size: int = LZMA_SPILL_CHUNK_SIZE,
+) -> int:
+    """decompresses lzma-compressed data incrementally into a file,
+    so that at most chunk_size bytes of the uncompressed data are kept in memory
+
+    :param data: compressed data
+    :type data: ByteString
+    :param fp: writeable file handle
+    :type fp: BinaryIO
+    :param chunk_size: size of the pieces that are fed into and taken out of the decompressor
+    :type chunk_size: int
+    :return: number of written bytes
+    :rtype: int
+    """
+    dec = _lzma_decompressor(data)
+    view = memoryview(data)[13 if read_decompressed_size else 5 :]
+    written = 0
+    for pos in range(0, len(view), chunk_size):
+        written += fp.write(dec.decompress(view[pos : pos + chunk_size], chunk_size))
+        # the decompressor buffers the input that exceeded max_length
+        while not dec.needs_input and not dec.eof:
+            written += fp.write(dec.decompress(b"", chunk_size))
+        if dec.eof:
+            break
+    return written
+
+
+def decompress_lzma_to_mmap(data: ByteString, uncompressed_size: int) -> Union[mmap.mmap, bytes]:
+    """decompresses lzma-compressed data into an anonymous temporary file and memory-maps it,
+    so that the uncompressed data is paged in from disk instead of being kept in memory
+
+    :param data: compressed data
+    :type data: ByteString
+    :param uncompressed_size: size of the uncompressed data
+    :type uncompressed_size: int
+    :return: read-only memory map of the uncompressed data
+    :rtype: mmap.mmap
+    """
+    with tempfile.TemporaryFile() as f:
+        written = decompress_lzma_to_file(data, f)
+        if written != uncompressed_size:
+            raise ValueError(f"Decompressed size mismatch: expected {uncompressed_size}, got {written}")
+        if written == 0:
+            # empty files can't be mapped
+            return b""
+        f.flush()
+        # the mapping stays valid after the (already unlinked) file is closed
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _lzma_decompressor(data: ByteString) -> lzma.LZMADecompressor:
     props, dict_size = struct.unpack("<BI", data[:5])
     lc = props % 9
     remainder = props // 9
     pb = remainder // 5
     lp = remainder % 5
-    dec = lzma.LZMADecompressor(
+    return lzma.LZMADecompressor(
         format=lzma.FORMAT_RAW,
         filters=[
             {
@@ -40,22 +115,10 @@ def decompress_lzma(data: ByteString, read_decompressed_size: bool = False) -> b
             }
         ],
     )
-    data_offset = 13 if read_decompressed_size else 5
-    return dec.decompress(data[data_offset:])
 
 
-def compress_lzma(data: ByteString, write_decompressed_size: bool = False) -> bytes:
-    """compresses data via lzma (unity specific)
-    The current static settings may not be the best solution,
-    but they are the most commonly used values and should therefore be enough for the time being.
-
-    :param data: uncompressed data
-    :type data: ByteString
-    :return: compressed data
-    :rtype: bytes
-    """
-    dict_size = 0x800000  # 1 << 23
-    compressor = lzma.LZMACompressor(
+def _lzma_compressor(dict_size: int) -> lzma.LZMACompressor:
+    return lzma.LZMACompressor(
         format=lzma.FORMAT_RAW,
         filters=[
             {
@@ -71,6 +134,20 @@ def compress_lzma(data: ByteString, write_decompressed_size: bool = False) -> by
         ],
     )
 
+
+def compress_lzma(data: ByteString, write_decompressed_size: bool = False) -> bytes:
+    """compresses data via lzma (unity specific)
+    The current static settings may not be the best solution,
+    but they are the most commonly used values and should therefore be enough for the time being.
+
+    :param data: uncompressed data
+    :type data: ByteString
+    :return: compressed data
+    :rtype: bytes
+    """
+    dict_size = 0x800000  # 1 << 23
+    compressor = _lzma_compressor(dict_size)
+
     compressed_data = compressor.compress(data) + compressor.flush()
     cdl = len(compressed_data)
     if write_decompressed_size:
@@ -94,15 +171,17 @@ def decompress_lz4(data: ByteString, uncompressed_size: int) -> bytes:  # LZ4M/L
     return lz4.block.decompress(data, uncompressed_size)
 
 
-def compress_lz4(data: ByteString) -> bytes:  # LZ4M/LZ4HC
+def compress_lz4(data: ByteString, compression_level: int = 9) -> bytes:  # LZ4M/LZ4HC
     """compresses data via lz4.block
 
     :param data: uncompressed data
     :type data: ByteString
+    :param compression_level: lz4hc compression level (1-12)
+    :type compression_level: int
     :return: compressed data
     :rtype: bytes
     """
-    return lz4.block.compress(data, mode="high_compression", compression=9, store_size=False)
+    return lz4.block.compress(data, mode="high_compression", compression=compression_level, store_size=False)
 
 
 # Brotli
@@ -118,6 +197,25 @@ def decompress_brotli(data: ByteString) -> bytes:
     return brotli.decompress(data)
 
 
+def decompress_brotli_stream(read: Callable[[int], ByteString], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """decompresses brotli-compressed data piece by piece
+
+    :param read: function that returns the next (up to) chunk_size bytes of the compressed data
+    :type read: Callable[[int], ByteString]
+    :param chunk_size: size of the pieces of compressed data that are decompressed at once
+    :type chunk_size: int
+    :raises brotli.error: BrotliDecompress failed
+    :return: iterator over the uncompressed data
+    :rtype: Iterator[bytes]
+    """
+    decompressor = brotli.Decompressor()
+    while not decompressor.is_finished():
+        data = read(chunk_size)
+        if not data:
+            break
+        yield decompressor.process(data)
+
+
 def compress_brotli(data: ByteString) -> bytes:
     """compresses data via brotli
 
@@ -142,6 +240,38 @@ def decompress_gzip(data: ByteString) -> bytes:
     return gzip.decompress(data)
 
 
+def decompress_gzip_stream(read: Callable[[int], ByteString], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """decompresses gzip-compressed data piece by piece
+
+    :param read: function that returns the next (up to) chunk_size bytes of the compressed data
+    :type read: Callable[[int], ByteString]
+    :param chunk_size: size of the pieces of compressed data that are decompressed at once
+    :type chunk_size: int
+    :raises zlib.error: invalid gzip data
+    :return: iterator over the uncompressed data
+    :rtype: Iterator[bytes]
+    """
+    decompressor = None
+    while True:
+        data = read(chunk_size)
+        if not data:
+            break
+        while data:
+            if decompressor is None:
+                # gzip files can consist of multiple members and may be padded with zeroes
+                data = bytes(data).lstrip(b"\x00")
+                if not data:
+                    break
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            yield decompressor.decompress(data)
+            data = b""
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = None
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
 def compress_gzip(data: ByteString) -> bytes:
     """compresses data via gzip
     The current static settings may not be the best solution,
@@ -155,7 +285,13 @@ def compress_gzip(data: ByteString) -> bytes:
     return gzip.compress(data)
 
 
-def chunk_based_compress(data: ByteString, block_info_flag: int) -> Tuple[ByteString, list]:
+def chunk_based_compress(
+    data: ByteString,
+    block_info_flag: int,
+    chunk_size: Optional[int] = None,
+    compression_level: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> Tuple[ByteString, list]:
     """compresses AssetBundle data based on the block_info_flag
     LZ4/LZ4HC will be chunk-based compression
 
@@ -163,72 +299,179 @@ def chunk_based_compress(data: ByteString, block_info_flag: int) -> Tuple[ByteSt
     :type data: ByteString
     :param block_info_flag: block info flag
     :type block_info_flag: int
+    :param chunk_size: size of the LZ4/LZ4HC chunks,
+        defaults to config.COMPRESSION_CHUNK_SIZE or COMPRESSION_CHUNK_SIZE_MAP
+    :type chunk_size: int, optional
+    :param compression_level: LZ4/LZ4HC compression level,
+        defaults to config.COMPRESSION_LEVEL or the level of compress_lz4
+    :type compression_level: int, optional
+    :param workers: number of threads compressing the chunks, defaults to config.COMPRESS_WORKERS
+    :type workers: int, optional
     :return: compressed data and block info
     :rtype: tuple
     """
     switch = block_info_flag & 0x3F
-    chunk_size = None
-    compress_func = None
     if switch == 0:  # NONE
         return data, [(len(data), len(data), block_info_flag)]
 
+    compressed_file_data = bytearray()
+    block_info = chunk_based_compress_stream(
+        [data],
+        block_info_flag,
+        compressed_file_data.extend,
+        chunk_size=chunk_size,
+        compression_level=compression_level,
+        workers=workers,
+    )
+    return bytes(compressed_file_data), block_info
+
+
+def chunk_based_compress_stream(
+    data: Iterable[ByteString],
+    block_info_flag: int,
+    write: Callable[[ByteString], Any],
+    chunk_size: Optional[int] = None,
+    compression_level: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> List[Tuple[int, int, int]]:
+    """compresses AssetBundle data based on the block_info_flag
+    and passes each compressed block to write as soon as it's done,
+    so that the compressed data doesn't have to be kept in memory
+    LZ4/LZ4HC will be chunk-based compression, LZMA is compressed as single stream
+
+    :param data: uncompressed data, can be split into pieces of any size
+    :type data: Iterable[ByteString]
+    :param block_info_flag: block info flag
+    :type block_info_flag: int
+    :param write: function that receives the compressed data
+    :type write: Callable[[ByteString], Any]
+    :param chunk_size: size of the LZ4/LZ4HC chunks,
+        defaults to config.COMPRESSION_CHUNK_SIZE or COMPRESSION_CHUNK_SIZE_MAP
+    :type chunk_size: int, optional
+    :param compression_level: LZ4/LZ4HC compression level,
+        defaults to config.COMPRESSION_LEVEL or the level of compress_lz4
+    :type compression_level: int, optional
+    :param workers: number of threads compressing the chunks, defaults to config.COMPRESS_WORKERS,
+        the blocks are still written in their original order
+    :type workers: int, optional
+    :return: block info
+    :rtype: list
+    """
+    switch = block_info_flag & 0x3F
+    if switch == 0:  # NONE
+        size = 0
+        for piece in data:
+            write(piece)
+            size += len(piece)
+        return [(size, size, block_info_flag)]
+
+    if switch == CompressionFlags.LZMA:
+        # like chunk_based_compress, the data is stored uncompressed if compressing makes it bigger,
+        # which is only known at the end, so both are spooled until then
+        dict_size = 0x800000  # 1 << 23
+        compressor = _lzma_compressor(dict_size)
+        uncompressed_size = 0
+        raw = tempfile.SpooledTemporaryFile(max_size=LZMA_SPOOL_MAX_SIZE)
+        compressed = tempfile.SpooledTemporaryFile(max_size=LZMA_SPOOL_MAX_SIZE)
+        with raw, compressed:
+            for piece in data:
+                if not piece:
+                    continue
+                if uncompressed_size == 0:
+                    compressed.write(struct.pack("<BI", 0x5D, dict_size))
+                uncompressed_size += len(piece)
+                raw.write(piece)
+                compressed.write(compressor.compress(piece))
+            if uncompressed_size == 0:
+                return []
+            compressed.write(compressor.flush())
+            compressed_size = compressed.tell()
+            if compressed_size > uncompressed_size:
+                source, info = raw, (uncompressed_size, uncompressed_size, block_info_flag ^ switch)
+            else:
+                source, info = compressed, (uncompressed_size, compressed_size, block_info_flag)
+            source.seek(0)
+            for chunk in iter(lambda: source.read(LZMA_SPILL_CHUNK_SIZE), b""):
+                write(chunk)
+        return [info]
+
     if switch in COMPRESSION_MAP:
         compress_func = COMPRESSION_MAP[switch]
     else:
         raise NotImplementedError(f"No compression function in the CompressionHelper.COMPRESSION_MAP for {switch}")
 
-    if switch in COMPRESSION_CHUNK_SIZE_MAP:
-        chunk_size = COMPRESSION_CHUNK_SIZE_MAP[switch]
+    if compression_level is None and compress_func is compress_lz4:
+        compression_level = config.COMPRESSION_LEVEL
+    if compression_level is not None:
+        if compress_func is not compress_lz4:
+            raise NotImplementedError(f"Compression level is only supported for LZ4/LZ4HC, not for {switch}")
+        compress_func = partial(compress_lz4, compression_level=compression_level)
+
+    if not chunk_size:
+        chunk_size = config.COMPRESSION_CHUNK_SIZE
+    if not chunk_size:
+        if switch in COMPRESSION_CHUNK_SIZE_MAP:
+            chunk_size = COMPRESSION_CHUNK_SIZE_MAP[switch]
+        else:
+            raise NotImplementedError(f"No chunk size in the CompressionHelper.COMPRESSION_CHUNK_SIZE_MAP for {switch}")
+
+    if workers is None:
+        workers = config.COMPRESS_WORKERS
+
+    def compress_chunk(chunk: ByteString) -> Tuple[ByteString, Tuple[int, int, int]]:
+        compressed_data = compress_func(chunk)
+        size = len(chunk)
+        if len(compressed_data) > size:
+            return chunk, (size, size, block_info_flag ^ switch)
+        else:
+            return compressed_data, (size, len(compressed_data), block_info_flag)
+
+    chunks = _rechunk(data, chunk_size)
+    if workers and workers > 1:
+        results = _ordered_parallel_map(compress_chunk, chunks, workers)
     else:
-        raise NotImplementedError(f"No chunk size in the CompressionHelper.COMPRESSION_CHUNK_SIZE_MAP for {switch}")
+        results = map(compress_chunk, chunks)
 
     block_info = []
-    uncompressed_data_size = len(data)
-    compressed_file_data = bytearray()
-    p = 0
-    while uncompressed_data_size > chunk_size:
-        compressed_data = compress_func(data[p : p + chunk_size])
-        if len(compressed_data) > chunk_size:
-            compressed_file_data.extend(data[p : p + chunk_size])
-            block_info.append(
-                (
-                    chunk_size,
-                    chunk_size,
-                    block_info_flag ^ switch,
-                )
-            )
-        else:
-            compressed_file_data.extend(compressed_data)
-            block_info.append(
-                (
-                    chunk_size,
-                    len(compressed_data),
-                    block_info_flag,
-                )
-            )
-        p += chunk_size
-        uncompressed_data_size -= chunk_size
-    if uncompressed_data_size > 0:
-        compressed_data = compress_func(data[p:])
-        if len(compressed_data) > uncompressed_data_size:
-            compressed_file_data.extend(data[p:])
-            block_info.append(
-                (
-                    uncompressed_data_size,
-                    uncompressed_data_size,
-                    block_info_flag ^ switch,
-                )
-            )
-        else:
-            compressed_file_data.extend(compressed_data)
-            block_info.append(
-                (
-                    uncompressed_data_size,
-                    len(compressed_data),
-                    block_info_flag,
-                )
-            )
-    return bytes(compressed_file_data), block_info
+    for compressed_data, info in results:
+        write(compressed_data)
+        block_info.append(info)
+
+    return block_info
+
+
+def _ordered_parallel_map(func: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[R]:
+    """maps the items via a thread pool and yields the results in their original order,
+    only a few items per worker are in flight at once to keep the memory usage bounded"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Deque[Future[R]] = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _rechunk(data: Iterable[ByteString], chunk_size: int) -> Iterator[ByteString]:
+    """splits the pieces of data into chunks of chunk_size, only the last chunk may be smaller"""
+    buffer = bytearray()
+    for piece in data:
+        view = memoryview(piece)
+        if buffer:
+            missing = chunk_size - len(buffer)
+            buffer.extend(view[:missing])
+            view = view[missing:]
+            if len(buffer) < chunk_size:
+                continue
+            yield bytes(buffer)
+            buffer = bytearray()
+        while len(view) >= chunk_size:
+            yield view[:chunk_size]
+            view = view[chunk_size:]
+        buffer.extend(view)
+    if buffer:
+        yield bytes(buffer)
 
 
 def decompress_lzham(data: ByteString, uncompressed_size: int) -> bytes:
@@ -264,11 +507,16 @@ __all__ = (
     "compress_lz4",
     "compress_lzma",
     "decompress_brotli",
+    "decompress_brotli_stream",
     "decompress_gzip",
+    "decompress_gzip_stream",
     "decompress_lz4",
     "decompress_lzma",
+    "decompress_lzma_to_file",
+    "decompress_lzma_to_mmap",
     "decompress_lzham",
     "chunk_based_compress",
+    "chunk_based_compress_stream",
     "COMPRESSION_MAP",
     "DECOMPRESSION_MAP",
     "COMPRESSION_CHUNK_SIZE_MAP",
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Dict, Generator, Iterator, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Callable, Dict, Generator, Iterator, List, Optional, Tuple, Union
 
 from attrs import define
 
+from ..streams import EndianBinaryReader
+from .TypeTreeHelper import TypeTreeConfig, metaflag_is_aligned, read_value
+
 if TYPE_CHECKING:
     from ..classes import AssetBundle, AssetInfo, Object, PPtr
+    from ..files import ObjectReader
 
 
 @define(slots=True)
@@ -17,6 +21,8 @@ class ContainerHelper:
     container_dict: Dict[str, PPtr[Object]]
     path_dict: Dict[int, str]
     _preload_table: Optional[List[PPtr[Object]]] = None
+    # reads the preload table, if only the container was parsed
+    _read_preload_table: Optional[Callable[[], List[PPtr[Object]]]] = None
 
     def __init__(self, container: Union[List[Tuple[str, AssetInfo]], AssetBundle]) -> None:
         preload_table: Optional[List[PPtr[Object]]] = None
@@ -27,8 +33,56 @@ class ContainerHelper:
         self.container_dict = {key: value.asset for key, value in container}
         self.path_dict = {value.asset.path_id: key for key, value in container}
         self._preload_table = preload_table
+        self._read_preload_table = None
+
+    @classmethod
+    def from_object_reader(cls, obj: ObjectReader[AssetBundle]) -> ContainerHelper:
+        """Reads only the m_Container of an AssetBundle object.
+
+        The fields behind m_Container aren't read at all,
+        and the preload table is kept as raw data until parse_preload_table needs it.
+        """
+        node = obj._get_typetree_node()
+        names = [child.m_Name for child in node.m_Children]
+        if "m_Container" not in names:
+            return cls(obj.parse_as_object())
+
+        reader = obj.reader
+        config = TypeTreeConfig(False, obj.assets_file, False)
+        preload_table = None
+        raw_preload_table = None
+        obj.reset()
+        for child in node.m_Children[: names.index("m_Container")]:
+            element = child.m_Children[0].m_Children[1] if child.m_Name == "m_PreloadTable" else None
+            if element is None or not element.m_ByteSize or element.m_ByteSize < 0:
+                value = read_value(child, reader, config)
+                if child.m_Name == "m_PreloadTable":
+                    preload_table = value
+                continue
+
+            # the pointers have a fixed size, so they can be skipped and parsed later on
+            count = reader.read_int()
+            raw_preload_table = (element, count, reader.read_bytes(count * element.m_ByteSize))
+            if metaflag_is_aligned(child.m_MetaFlag) or metaflag_is_aligned(child.m_Children[0].m_MetaFlag):
+                reader.align_stream()
+
+        helper = cls(read_value(node.m_Children[names.index("m_Container")], reader, config))
+        helper._preload_table = preload_table
+        if raw_preload_table is not None:
+            element, count, data = raw_preload_table
+            endian = reader.endian
+
+            def read_preload_table() -> List[PPtr[Object]]:
+                element_reader = EndianBinaryReader(data, endian)
+                return [read_value(element, element_reader, config) for _ in range(count)]
+
+            helper._read_preload_table = read_preload_table
+        return helper
 
     def parse_preload_table(self) -> None:
+        if self._read_preload_table is not None:
+            self._preload_table = self._read_preload_table()
+            self._read_preload_table = None
         if self._preload_table is None:
             return
 
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Union
+
+from attrs import define
+
+from ..files import BundleFile, File, SerializedFile
+from ..streams import EndianBinaryReader
+from ..streams.EndianBinaryReader import EndianBinaryReader_Blocks, EndianBinaryReader_Memoryview
+from .CompressionHelper import _ordered_parallel_map
+from .ImportHelper import FileSourceType
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+if TYPE_CHECKING:
+    from ..environment import Environment
+    from ..files import ObjectReader
+
+ByteString = Union[bytes, bytearray, memoryview]
+# size of the pieces in which files are read to calculate their crc
+CRC_CHUNK_SIZE = 0x100000
+# number of objects that are hashed per task
+HASH_BATCH_SIZE = 256
+
+
+@define(slots=True)
+class ObjectDigest:
+    """Digest of the raw data of an object."""
+
+    file: str
+    path_id: int
+    class_id: int
+    byte_size: int
+    digest: bytes
+
+
+def get_hash_function(algorithm: str) -> Callable[[ByteString], bytes]:
+    """Returns a function that returns the digest of the given data.
+
+    algorithm -- any algorithm of hashlib (e.g. sha1) or of xxhash (e.g. xxh64, xxh3_128) if it's installed
+    """
+    if algorithm.startswith("xxh"):
+        if xxhash is None:
+            raise ImportError("xxhash is required for the xxhash algorithms, install it via `pip install xxhash`.")
+        return getattr(xxhash, f"{algorithm}_digest")
+    # check that the algorithm is available
+    hashlib.new(algorithm)
+    return lambda data: hashlib.new(algorithm, data).digest()
+
+
+def crc32(input_: FileSourceType, chunk_size: int = CRC_CHUNK_SIZE) -> int:
+    """Calculates the CRC32 of a file, e.g. to verify a bundle against the crc of its manifest.
+
+    input_ -- path, data or stream of the file
+    """
+    reader = EndianBinaryReader(input_) if not isinstance(input_, EndianBinaryReader) else input_
+    crc = 0
+    if isinstance(reader, EndianBinaryReader_Memoryview):
+        view = reader.view
+        for start in range(0, len(view), chunk_size):
+            crc = zlib.crc32(view[start : start + chunk_size], crc)
+    else:
+        position = reader.Position
+        reader.Position = 0
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+        reader.Position = position
+    if isinstance(input_, str):
+        reader.dispose()
+    return crc
+
+
+def bundle_crc32(bundle: BundleFile, workers: Optional[int] = None) -> int:
+    """Calculates the CRC32 of the uncompressed data of a UnityFS bundle,
+    e.g. to compare it with the crc of the bundle's manifest.
+
+    workers -- number of threads used to decompress the blocks,
+               the blocks are decompressed without keeping them in the caches of the bundle
+    """
+    storage = bundle._blocks_storage
+    if storage is None:
+        raise ValueError("The crc of the uncompressed data can only be calculated for UnityFS bundles")
+
+    def decompress_block(index: int) -> ByteString:
+        data = storage.get_cached_block(index)
+        if data is None:
+            block = storage.blocks[index]
+            data = storage.decompress(storage.read_compressed_block(index), block.uncompressedSize, block.flags, index)
+        return data
+
+    indices = range(len(storage.blocks))
+    if workers and workers > 1:
+        blocks = _ordered_parallel_map(decompress_block, indices, workers)
+    else:
+        blocks = map(decompress_block, indices)
+
+    crc = 0
+    for data in blocks:
+        crc = zlib.crc32(data, crc)
+    return crc
+
+
+def hash_objects(
+    source: Union[Environment, File, Iterable[SerializedFile]],
+    algorithm: str = "sha1",
+    workers: Optional[int] = None,
+) -> List[ObjectDigest]:
+    """Hashes the raw data of all objects, without parsing them.
+
+    The digests can be used to detect duplicate or changed objects, e.g. across builds.
+
+    Parameters
+    ----------
+    source : Environment | File | Iterable[SerializedFile]
+        The objects of all SerializedFiles within the source are hashed.
+    algorithm : str
+        Hash algorithm, see get_hash_function.
+    workers : int
+        Number of threads used to hash the objects,
+        hashlib, xxhash and the decompression of the blocks release the GIL for bigger data.
+
+    Returns
+    -------
+    List[ObjectDigest]
+        The digests in the order of the files and objects.
+    """
+    hash_function = get_hash_function(algorithm)
+    if isinstance(source, SerializedFile):
+        serialized_files = [source]
+    elif isinstance(source, File):
+        serialized_files = list(source.get_assets())
+    elif isinstance(source, Iterable):
+        serialized_files = list(source)
+    else:
+        # Environment
+        serialized_files = source.assets
+
+    objects = [obj for serialized_file in serialized_files for obj in serialized_file.objects.values()]
+    locks: Dict[int, Lock] = {}
+    for obj in objects:
+        locks.setdefault(id(obj.reader), Lock())
+
+    def hash_object(obj: ObjectReader) -> ObjectDigest:
+        data = _get_raw_data(obj, locks[id(obj.reader)])
+        return ObjectDigest(obj.assets_file.name, obj.path_id, obj.class_id, len(data), hash_function(data))
+
+    def hash_batch(start: int) -> List[ObjectDigest]:
+        return [hash_object(obj) for obj in objects[start : start + HASH_BATCH_SIZE]]
+
+    batches = range(0, len(objects), HASH_BATCH_SIZE)
+    if workers and workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(hash_batch, batches))
+    else:
+        results = [hash_batch(start) for start in batches]
+    return [digest for result in results for digest in result]
+
+
+def _get_raw_data(obj: ObjectReader, lock: Lock) -> ByteString:
+    """Returns the raw data of the object without moving the shared reader,
+    so that the objects of a file can be read by many threads."""
+    if obj.data is not None:
+        # changed object
+        return obj.data
+    reader = obj.reader
+    if isinstance(reader, EndianBinaryReader_Memoryview):
+        return reader.view[obj.byte_start : obj.byte_start + obj.byte_size]
+    if isinstance(reader, EndianBinaryReader_Blocks):
+        return reader.storage.read(obj.byte_start, obj.byte_size)
+    with lock:
+        return obj.get_raw_data()
+
+
+__all__ = [
+    "ObjectDigest",
+    "bundle_crc32",
+    "crc32",
+    "get_hash_function",
+    "hash_objects",
+]
@@ -11,6 +11,14 @@ from ..streams import EndianBinaryReader
 from .CompressionHelper import BROTLI_MAGIC, GZIP_MAGIC
 
 FileSourceType = Union[str, bytes, bytearray, io.IOBase, EndianBinaryReader, BinaryIO]
+# files with these extensions are never parsed as SerializedFile
+RESOURCE_FILE_EXTENSIONS = (
+    ".resS",
+    ".resource",
+    ".config",
+    ".xml",
+    ".dat",
+)
 
 
 def file_name_without_extension(file_name: str) -> str:
@@ -45,7 +53,7 @@ def check_file_type(
     input_: FileSourceType,
 ) -> Tuple[FileType, EndianBinaryReader]:
     if isinstance(input_, str) and os.path.isfile(input_):
-        reader = EndianBinaryReader(open(input_, "rb"))
+        reader = EndianBinaryReader(input_)
     elif isinstance(input_, EndianBinaryReader):
         reader = input_
     else:
@@ -66,7 +74,7 @@ def check_file_type(
         return FileType.BundleFile, reader
     elif signature.startswith(("UnityWebData", "TuanjieWebData")):
         return FileType.WebFile, reader
-    elif signature == "PK\x03\x04":
+    elif signature.startswith("PK\x03\x04"):
         return FileType.ZIP, reader
     else:
         if reader.Length < 128:
@@ -79,6 +87,7 @@ def check_file_type(
             g_reader = EndianBinaryReader(g_stream, endian="<")
             signature = g_reader.read_string_to_null(20)
             g_stream.close()
+            reader.Position = 0
             if signature.startswith(("UnityWebData", "TuanjieWebData")):
                 return FileType.WebFile, reader
         reader.Position = 0x20
@@ -135,15 +144,7 @@ def parse_file(
         typ, _ = check_file_type(reader)
     f = reader
     try:
-        if typ == FileType.AssetsFile and not name.endswith(
-            (
-                ".resS",
-                ".resource",
-                ".config",
-                ".xml",
-                ".dat",
-            )
-        ):
+        if typ == FileType.AssetsFile and not name.endswith(RESOURCE_FILE_EXTENSIONS):
             f = files.SerializedFile(reader, parent, name=name, is_dependency=is_dependency)
         elif typ == FileType.BundleFile:
             f = files.BundleFile(reader, parent, name=name, is_dependency=is_dependency)
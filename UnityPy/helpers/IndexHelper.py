@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from attrs import define, field
+
+from ..files import BundleFile, SerializedFile, WebFile
+from ..streams import EndianBinaryReader
+
+# version of the format of the IndexCache, caches of other versions are discarded
+INDEX_CACHE_VERSION = 2
+
+
+@define(slots=True)
+class SerializedFileIndex:
+    """Metadata of a SerializedFile that is needed to find it and its container paths without loading it.
+
+    name -- name of the SerializedFile, e.g. the name of the cab within its bundle
+    externals -- paths of the files the SerializedFile depends on
+    container -- container paths and the path ids of their assets
+    """
+
+    name: str
+    externals: List[str] = field(factory=list)
+    container: List[Tuple[str, int]] = field(factory=list)
+
+
+@define(slots=True)
+class FileIndex:
+    """Index of a file on the disk.
+
+    path -- path of the file, the base path for .split files
+    size, mtime -- size and modification time of the file, to detect changes
+    cabs -- SerializedFiles within the file (or the file itself)
+    resources -- names of the other files within the file, e.g. .resS files
+    """
+
+    path: str
+    size: int
+    mtime: float
+    cabs: List[SerializedFileIndex] = field(factory=list)
+    resources: List[str] = field(factory=list)
+
+
+def get_file_stat(path: str) -> Tuple[int, float]:
+    """Returns the size and modification time of a file, or the total size and latest change of a .split file."""
+    if os.path.exists(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime
+    size, mtime = 0, 0.0
+    i = 0
+    while os.path.exists(f"{path}.split{i}"):
+        stat = os.stat(f"{path}.split{i}")
+        size += stat.st_size
+        mtime = max(mtime, stat.st_mtime)
+        i += 1
+    return size, mtime
+
+
+def index_serialized_file(serialized_file: SerializedFile) -> SerializedFileIndex:
+    """Creates the index of a loaded SerializedFile, only the container of its AssetBundle is parsed."""
+    return SerializedFileIndex(
+        serialized_file.name,
+        [external.path for external in serialized_file.externals],
+        [(path, info.asset.path_id) for path, info in serialized_file.container.container],
+    )
+
+
+def index_file(path: str) -> FileIndex:
+    """Indexes a file on the disk, the file is only read as far as necessary.
+
+    path -- path of the file, .split files are indexed via their base path
+    """
+    # recursive import
+    from ..environment import Environment
+
+    environment = Environment(path=os.path.dirname(path))
+    is_split = not os.path.exists(path) and os.path.exists(f"{path}.split0")
+    f = environment.load_file(f"{path}.split0" if is_split else path)
+    index = FileIndex(path, *get_file_stat(path))
+
+    def add(name: str, item) -> None:
+        if isinstance(item, SerializedFile):
+            index.cabs.append(index_serialized_file(item))
+        elif isinstance(item, (BundleFile, WebFile)):
+            for sub_name, sub_item in item.files.items():
+                add(sub_name, sub_item)
+        elif isinstance(item, EndianBinaryReader):
+            index.resources.append(name)
+
+    add(path, f)
+    return index
+
+
+def index_files(
+    paths: List[str],
+    workers: Optional[int] = None,
+    cache: Optional[Union[IndexCache, str]] = None,
+) -> List[FileIndex]:
+    """Indexes the files.
+
+    paths -- paths of the files, .split files are indexed via their base path
+    workers -- number of processes the files are indexed by,
+               the files are indexed by this process if it's None or 1
+    cache -- IndexCache or path of its database,
+             only files that aren't in the cache or changed since they were cached are indexed
+    """
+    if isinstance(cache, str):
+        with IndexCache(cache) as index_cache:
+            return index_files(paths, workers, index_cache)
+
+    indices: Dict[str, FileIndex] = {}
+    if cache is not None:
+        for path in paths:
+            index = cache.get(path)
+            if index is not None:
+                indices[path] = index
+    missing = [path for path in paths if path not in indices]
+
+    if workers and workers > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # a few files per task to reduce the overhead of the processes
+            chunksize = max(1, len(missing) // (workers * 8))
+            new_indices = list(executor.map(index_file, missing, chunksize=chunksize))
+    else:
+        new_indices = [index_file(path) for path in missing]
+
+    for index in new_indices:
+        indices[index.path] = index
+    if cache is not None and new_indices:
+        cache.put(new_indices)
+    return [indices[path] for path in paths]
+
+
+class IndexCache:
+    """On-disk cache of FileIndexes in a SQLite database.
+
+    The indices are keyed by the absolute path of the files,
+    they're only used as long as the size and modification time of the files don't change.
+
+    path -- path of the database, it's created if it doesn't exist
+    """
+
+    connection: sqlite3.Connection
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_CACHE_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS files")
+            self.connection.execute(f"PRAGMA user_version = {INDEX_CACHE_VERSION}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, data TEXT)"
+        )
+        self.connection.commit()
+
+    def get(self, path: str) -> Optional[FileIndex]:
+        """Returns the cached index of the file, or None if it isn't cached or changed since."""
+        row = self.connection.execute(
+            "SELECT size, mtime, data FROM files WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        if row is None or (row[0], row[1]) != get_file_stat(path):
+            return None
+        return _load_index(path, row[0], row[1], row[2])
+
+    def put(self, indices: List[FileIndex]) -> None:
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            [(os.path.abspath(index.path), index.size, index.mtime, _dump_index(index)) for index in indices],
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> IndexCache:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def _dump_index(index: FileIndex) -> str:
+    return json.dumps(
+        {
+            "cabs": [
+                {
+                    "name": cab.name,
+                    "externals": cab.externals,
+                    "container": cab.container,
+                }
+                for cab in index.cabs
+            ],
+            "resources": index.resources,
+        }
+    )
+
+
+def _load_index(path: str, size: int, mtime: float, data: str) -> FileIndex:
+    item = json.loads(data)
+    return FileIndex(
+        path,
+        size,
+        mtime,
+        [
+            SerializedFileIndex(
+                cab["name"],
+                cab["externals"],
+                [(path, path_id) for path, path_id in cab["container"]],
+            )
+            for cab in item["cabs"]
+        ],
+        item["resources"],
+    )
+
+
+__all__ = [
+    "FileIndex",
+    "IndexCache",
+    "SerializedFileIndex",
+    "get_file_stat",
+    "index_file",
+    "index_files",
+    "index_serialized_file",
+]
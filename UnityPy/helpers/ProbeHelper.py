@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from typing import List, Optional, Union
+
+from attrs import define, field
+
+from ..enums import BuildTarget, CompressionFlags, FileType
+from ..files import BundleFile, SerializedFile
+from ..files.BundleFile import BlockInfo
+from ..streams import EndianBinaryReader
+from .ImportHelper import RESOURCE_FILE_EXTENSIONS, FileSourceType, check_file_type
+
+
+@define(slots=True)
+class SerializedFileProbe:
+    """Metadata of a SerializedFile, without any parsed object."""
+
+    name: str
+    format: int
+    unity_version: str
+    target_platform: BuildTarget
+    endian: str
+    file_size: int
+    metadata_size: int
+    type_tree_enabled: bool
+    class_ids: List[int]
+    object_count: int
+    externals: List[str]
+
+    @classmethod
+    def from_serialized_file(cls, serialized_file: SerializedFile) -> SerializedFileProbe:
+        header = serialized_file.header
+        return cls(
+            name=serialized_file.name,
+            format=header.version,
+            unity_version=serialized_file.unity_version,
+            target_platform=serialized_file.target_platform,
+            endian=header.endian,
+            file_size=header.file_size,
+            metadata_size=header.metadata_size,
+            type_tree_enabled=serialized_file._enable_type_tree,
+            class_ids=[typ.class_id for typ in serialized_file.types],
+            object_count=len(serialized_file.objects),
+            externals=[external.path for external in serialized_file.externals],
+        )
+
+
+@define(slots=True)
+class BundleNodeProbe:
+    """Entry of the directory info of a bundle."""
+
+    path: str
+    offset: int
+    size: int
+    flags: int = 0
+    serialized_file: Optional[SerializedFileProbe] = None
+
+
+@define(slots=True)
+class BundleProbe:
+    """Header, blocks info and directory info of a BundleFile."""
+
+    name: str
+    signature: str
+    format: int
+    version_player: str
+    version_engine: str
+    file_size: int
+    dataflags: int
+    blocks: List[BlockInfo] = field(factory=list)
+    nodes: List[BundleNodeProbe] = field(factory=list)
+
+    @property
+    def compression(self) -> CompressionFlags:
+        """Compression of the data blocks, NONE for bundles without blocks."""
+        if not self.blocks:
+            return CompressionFlags.NONE
+        return CompressionFlags(self.blocks[0].flags & 0x3F)
+
+    @property
+    def uncompressed_size(self) -> int:
+        return sum(block.uncompressedSize for block in self.blocks)
+
+    @property
+    def compressed_size(self) -> int:
+        return sum(block.compressedSize for block in self.blocks)
+
+
+def probe(
+    input_: FileSourceType,
+    serialized_files: bool = False,
+) -> Union[BundleProbe, SerializedFileProbe, None]:
+    """Reads only the metadata of a BundleFile or SerializedFile.
+
+    For bundles only the header, the blocks info and the directory info are read,
+    no data block is decompressed unless serialized_files is set.
+
+    Parameters
+    ----------
+    input_ : str | bytes | EndianBinaryReader | BinaryIO
+        Path or data of the file.
+    serialized_files : bool
+        Also reads the metadata of the SerializedFiles within a bundle.
+        This decompresses only the blocks that contain their metadata.
+
+    Returns
+    -------
+    BundleProbe | SerializedFileProbe | None
+        None if the file is neither a BundleFile nor a SerializedFile.
+    """
+    typ, reader = check_file_type(input_)
+    name = input_ if isinstance(input_, str) else ""
+    try:
+        if typ == FileType.BundleFile:
+            return _probe_bundle(reader, name, serialized_files)
+        elif typ == FileType.AssetsFile:
+            return SerializedFileProbe.from_serialized_file(SerializedFile(reader, name=name, header_only=True))
+        return None
+    finally:
+        if isinstance(input_, str):
+            # the reader was opened by check_file_type
+            reader.dispose()
+
+
+def _probe_bundle(reader: EndianBinaryReader, name: str, serialized_files: bool) -> BundleProbe:
+    bundle = BundleFile(reader, None, name=name, header_only=True)
+    result = BundleProbe(
+        name=bundle.name,
+        signature=bundle.signature,
+        format=bundle.version,
+        version_player=bundle.version_player,
+        version_engine=bundle.version_engine,
+        file_size=reader.Length,
+        dataflags=int(getattr(bundle, "dataflags", 0)),
+        blocks=bundle.blocks_info,
+    )
+    for node in bundle.directory_info:
+        node_probe = BundleNodeProbe(node.path, node.offset, node.size, getattr(node, "flags", 0))
+        if serialized_files and bundle.blocks_reader is not None and not node.path.endswith(RESOURCE_FILE_EXTENSIONS):
+            node_reader = bundle.get_node_reader(bundle.blocks_reader, node)
+            node_typ, _ = check_file_type(node_reader)
+            if node_typ == FileType.AssetsFile:
+                serialized_file = SerializedFile(node_reader, bundle, name=node.path, header_only=True)
+                node_probe.serialized_file = SerializedFileProbe.from_serialized_file(serialized_file)
+        result.nodes.append(node_probe)
+    return result
+
+
+__all__ = [
+    "BundleNodeProbe",
+    "BundleProbe",
+    "SerializedFileProbe",
+    "probe",
+]
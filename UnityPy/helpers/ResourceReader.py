@@ -22,6 +22,15 @@ def get_resource_data(res_path: str, assets_file: "SerializedFile", offset: int,
         reader = environment.get_cab(possible_name)
         if reader:
             break
+    if not reader:
+        # the files of WebFiles and zip archives are only parsed and registered once they're accessed
+        for container in (assets_file.parent, environment):
+            if container is not None:
+                _ = container.files
+        for possible_name in possible_names:
+            reader = environment.get_cab(possible_name)
+            if reader:
+                break
     if not reader:
         assets_file.load_dependencies(possible_names)
         for possible_name in possible_names:
@@ -0,0 +1,496 @@
+from __future__ import annotations
+
+import inspect
+import weakref
+from keyword import iskeyword
+from struct import Struct, calcsize, unpack_from
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import attrs
+
+from .. import classes
+from ..streams.EndianBinaryReader import EndianBinaryReader, EndianBinaryReader_Memoryview
+from .TypeTreeHelper import (
+    PPtr,
+    UnknownObject,
+    construct_object,
+    get_annotation_keys,
+    metaflag_is_aligned,
+)
+from .TypeTreeNode import TypeTreeNode
+
+if TYPE_CHECKING:
+    from ..files.SerializedFile import SerializedFile
+
+# reads the value of the node from data[pos:end], returns the value and the position behind it
+CompiledReader = Callable[[Any, int, int, Optional["SerializedFile"], TypeTreeNode], Tuple[Any, int]]
+
+# struct formats of the types that are read by FUNCTION_READ_MAP with a fixed size
+FIXED_SIZE_FORMATS = {
+    "SInt8": "b",
+    "UInt8": "B",
+    "char": "B",
+    "short": "h",
+    "SInt16": "h",
+    "unsigned short": "H",
+    "UInt16": "H",
+    "int": "i",
+    "SInt32": "i",
+    "unsigned int": "I",
+    "UInt32": "I",
+    "Type*": "I",
+    "long long": "q",
+    "SInt64": "q",
+    "unsigned long long": "Q",
+    "UInt64": "Q",
+    "FileSize": "Q",
+    "float": "f",
+    "double": "d",
+    "bool": "?",
+}
+
+# struct formats of the arrays that are read by FUNCTION_READ_MAP_ARRAY,
+# the (unsigned) shorts use the same formats as EndianBinaryReader.read_(u_)short_array,
+# SInt8 is missing as read_byte_array doesn't take the length of the array
+ARRAY_FORMATS = {
+    **{typ: fmt for typ, fmt in FIXED_SIZE_FORMATS.items() if typ != "SInt8"},
+    "short": "H",
+    "SInt16": "H",
+    "unsigned short": "h",
+    "UInt16": "h",
+}
+
+# types whose values depend on the read data or the parents of the node, they are only read by read_value
+DYNAMIC_TYPES = {"ReferencedObject", "ReferencedObjectData", "ManagedReferencesRegistry"}
+
+# node identity, endian, as_dict -> node reference, compiled reader (None if the node can't be compiled)
+READER_CACHE: Dict[Tuple[int, str, bool], Tuple[weakref.ref, Optional[CompiledReader]]] = {}
+
+
+class UnsupportedNodeError(Exception):
+    pass
+
+
+class TypeTreeReaderCompiler:
+    """Generates a reader function for a TypeTreeNode.
+
+    The generated function reads the same values as TypeTreeHelper.read_value,
+    but the node is only inspected once, when the function is generated.
+    Consecutive fixed-size fields, including the ones of nested classes, are read by a single struct,
+    paddings whose size is known in advance are part of that struct as well.
+
+    endian -- endian of the data the function reads
+    as_dict -- whether classes are read as dicts or objects
+    source -- the generated source, once a node was compiled
+    """
+
+    endian: str
+    as_dict: bool
+    source: str
+    _lines: List[str]
+    _indent: int
+    _namespace: Dict[str, Any]
+    _names: Dict[Any, str]
+    # id of the (sub) nodes -> expression of the node within the function,
+    # the nodes aren't part of the function, so that they can be garbage collected
+    _node_paths: Dict[int, str]
+    _count: int
+    # fixed-size fields that are read together before the next statement
+    _run_format: str
+    _run_names: List[str]
+    # position within a 4 byte alignment, if it's known at this point of the function
+    _offset: Optional[int]
+
+    def __init__(self, endian: str, as_dict: bool):
+        self.endian = endian
+        self.as_dict = as_dict
+        self.source = ""
+        self._lines = []
+        self._indent = 1
+        self._namespace = {"unpack_from": unpack_from}
+        self._names = {}
+        self._node_paths = {}
+        self._count = 0
+        self._run_format = ""
+        self._run_names = []
+        # the functions are only called for data that starts aligned
+        self._offset = 0
+
+    def compile(self, node: TypeTreeNode) -> CompiledReader:
+        """Generates the reader of the node.
+
+        Raises UnsupportedNodeError if the node can only be read by read_value.
+        """
+        stack = [(node, "node")]
+        while stack:
+            sub_node, path = stack.pop()
+            if sub_node.m_Type in DYNAMIC_TYPES:
+                raise UnsupportedNodeError(f"{sub_node.m_Type} can't be compiled")
+            self._node_paths.setdefault(id(sub_node), path)
+            stack.extend(
+                (child, f"{path}.m_Children[{i}]") for i, child in enumerate(sub_node.m_Children) if child is not None
+            )
+
+        value = self.read_value(node)
+        self.emit(f"return {value}, pos")
+        self.source = "def read(data, pos, end, assetsfile, node):\n" + "\n".join(self._lines) + "\n"
+        exec(compile(self.source, f"<TypeTreeReader {node.m_Type}>", "exec"), self._namespace)
+        return self._namespace["read"]
+
+    # code generation
+
+    def new_name(self, prefix: str = "v") -> str:
+        self._count += 1
+        return f"{prefix}{self._count}"
+
+    def constant(self, value: Any, prefix: str = "c") -> str:
+        """Returns the name under which the value is available to the generated function."""
+        key = (type(value), id(value))
+        name = self._names.get(key)
+        if name is None:
+            name = self._names[key] = self.new_name(prefix)
+            self._namespace[name] = value
+        return name
+
+    def emit(self, line: str, indent: int = 0) -> None:
+        self.flush()
+        self._lines.append("    " * (self._indent + indent) + line)
+
+    def flush(self) -> None:
+        """Reads the pending fixed-size fields."""
+        if not self._run_format:
+            return
+        fmt = self.endian + self._run_format
+        names = self._run_names
+        self._run_format = ""
+        self._run_names = []
+        if names:
+            self.emit(f"{', '.join(names)}, = {self.constant(Struct(fmt).unpack_from, 's')}(data, pos)")
+        self.emit(f"pos += {calcsize(fmt)}")
+
+    def advance(self, size: Optional[int]) -> None:
+        """Updates the known offset after reading size bytes, None if the size isn't known."""
+        if self._offset is not None and size is not None:
+            self._offset = (self._offset + size) % 4
+        else:
+            self._offset = None
+
+    def align(self) -> None:
+        if self._offset is not None:
+            self._run_format += "x" * (-self._offset % 4)
+        else:
+            self.emit("pos += -pos % 4")
+        self._offset = 0
+
+    # readers, they return the expression of the read value
+
+    def read_value(self, node: TypeTreeNode) -> str:
+        # see TypeTreeHelper.read_value
+        align = metaflag_is_aligned(node.m_MetaFlag)
+        children = node.m_Children
+
+        if node.m_Type in FIXED_SIZE_FORMATS or node.m_Type in ("string", "TypelessData"):
+            value = self.read_primitive(node.m_Type)
+        elif node.m_Type == "pair":
+            value = f"({self.read_value(children[0])}, {self.read_value(children[1])})"
+        elif children and children[0].m_Type == "Array":
+            if metaflag_is_aligned(children[0].m_MetaFlag):
+                align = True
+            size = self.read_fixed("i")
+            self.emit(f"if {size} < 0: raise ValueError('Negative length read from TypeTree')")
+            value = self.read_vector(children[0].m_Children[1], size)
+        else:
+            value = self.read_class(node)
+
+        if align:
+            self.align()
+        return value
+
+    def read_primitive(self, typ: str) -> str:
+        # see FUNCTION_READ_MAP
+        if typ == "string":
+            return self.read_string()
+        elif typ == "TypelessData":
+            return self.read_bytes()
+        return self.read_fixed(FIXED_SIZE_FORMATS[typ])
+
+    def read_fixed(self, fmt: str) -> str:
+        name = self.new_name()
+        self._run_format += fmt
+        self._run_names.append(name)
+        self.advance(calcsize(self.endian + fmt))
+        return name
+
+    def read_string(self) -> str:
+        # see EndianBinaryReader.read_aligned_string
+        length = self.read_fixed("i")
+        aligned = self._offset == 0
+        value = self.new_name()
+        self.emit(f"if 0 < {length} <= end - pos:")
+        self.emit(f"{value} = str(data[pos:pos + {length}], 'utf8', 'surrogateescape')", 1)
+        self.emit(f"pos = (pos + {length} + 3) & -4", 1)
+        self.emit("else:")
+        self.emit(f"{value} = ''", 1)
+        # the string is either aligned or empty
+        self._offset = 0 if aligned else None
+        return value
+
+    def read_bytes(self) -> str:
+        # see EndianBinaryReader.read_byte_array
+        length = self.read_fixed("i")
+        value = self.new_name()
+        # negative lengths are left to the generic reader
+        self.emit(f"if {length} < 0: raise ValueError('Negative length read from TypeTree')")
+        self.emit(f"{value} = bytes(data[pos:pos + {length}])")
+        self.emit(f"pos += {length}")
+        self.advance(None)
+        return value
+
+    def read_vector(self, subtype: TypeTreeNode, size: str) -> str:
+        # items of the vector of read_value
+        if metaflag_is_aligned(subtype.m_MetaFlag):
+            return self.read_array(subtype, size)
+
+        fmt = FIXED_SIZE_FORMATS.get(subtype.m_Type)
+        if fmt is not None:
+            value = self.new_name()
+            self.emit(f"{value} = list(unpack_from('{self.endian}%d{fmt}' % {size}, data, pos))")
+            self.emit(f"pos += {size} * {calcsize(fmt)}")
+            self.advance(0 if calcsize(fmt) % 4 == 0 else None)
+            return value
+
+        if self.is_fixed_size(subtype):
+            # all items are unpacked by the same struct
+            self.flush()
+            offset = self._offset
+            item = self.read_value(subtype)
+            fmt = self.endian + self._run_format
+            names = self._run_names
+            self._run_format = ""
+            self._run_names = []
+            item_size = calcsize(fmt)
+            iter_unpack = self.constant(Struct(fmt).iter_unpack, "s")
+            value = self.new_name()
+            self.emit(
+                f"{value} = [{item} for {', '.join(names)}, in {iter_unpack}(data[pos:pos + {size} * {item_size}])]"
+            )
+            self.emit(f"pos += {size} * {item_size}")
+            self._offset = offset
+            self.advance(0 if item_size % 4 == 0 else None)
+            return value
+
+        return self.read_list(size, lambda: self.read_value(subtype))
+
+    def read_array(self, node: TypeTreeNode, size: str) -> str:
+        # see TypeTreeHelper.read_value_array
+        align = metaflag_is_aligned(node.m_MetaFlag)
+        children = node.m_Children
+
+        fmt = ARRAY_FORMATS.get(node.m_Type)
+        if fmt is not None:
+            value = self.new_name()
+            self.emit(f"{value} = unpack_from('{self.endian}%d{fmt}' % {size}, data, pos)")
+            self.emit(f"pos += {size} * {calcsize(fmt)}")
+            self.advance(0 if calcsize(fmt) % 4 == 0 else None)
+        elif node.m_Type == "string":
+            value = self.read_list(size, self.read_string)
+        elif node.m_Type in FIXED_SIZE_FORMATS or node.m_Type == "TypelessData":
+            raise UnsupportedNodeError(f"Arrays of {node.m_Type} can't be compiled")
+        elif node.m_Type == "pair":
+            # the items of the pairs are read without their alignment if they are primitives
+            def read_pair_item(item: TypeTreeNode) -> str:
+                if item.m_Type in FIXED_SIZE_FORMATS or item.m_Type in ("string", "TypelessData"):
+                    return self.read_primitive(item.m_Type)
+                return self.read_value(item)
+
+            value = self.read_list(size, lambda: f"({read_pair_item(children[0])}, {read_pair_item(children[1])})")
+        elif children and children[0].m_Type == "Array":
+            if metaflag_is_aligned(children[0].m_MetaFlag):
+                align = True
+            subtype = children[0].m_Children[1]
+
+            def read_item() -> str:
+                item_size = self.read_fixed("i")
+                if metaflag_is_aligned(subtype.m_MetaFlag):
+                    return self.read_array(subtype, item_size)
+                return self.read_list(item_size, lambda: self.read_value(subtype))
+
+            value = self.read_list(size, read_item)
+        else:
+            value = self.read_list(size, lambda: self.read_array_class(node))
+
+        if align:
+            self.align()
+        return value
+
+    def read_list(self, size: str, read_item: Callable[[], str]) -> str:
+        value = self.new_name()
+        append = self.new_name("append")
+        self.emit(f"{value} = []")
+        self.emit(f"{append} = {value}.append")
+        self.emit(f"for _ in range({size}):")
+        self._indent += 1
+        self._offset = None
+        item = read_item()
+        self.emit(f"{append}({item})")
+        self._indent -= 1
+        self._offset = None
+        return value
+
+    def read_class(self, node: TypeTreeNode) -> str:
+        # class of read_value
+        if self.as_dict:
+            return self.dict_expression([(child.m_Name, self.read_value(child)) for child in node.m_Children])
+
+        values = {child._clean_name: self.read_value(child) for child in node.m_Children}
+        if node.m_Type.startswith("PPtr<"):
+            if "m_FileID" not in values or "m_PathID" not in values:
+                raise UnsupportedNodeError(f"{node.m_Type} has no m_FileID or m_PathID")
+            # PPtr[Any] creates the same objects as PPtr, as they can't store their __orig_class__
+            pptr = self.constant(PPtr, "PPtr")
+            return f"{pptr}(assetsfile=assetsfile, m_FileID={values['m_FileID']}, m_PathID={values['m_PathID']})"
+
+        clz = getattr(classes, node.m_Type, UnknownObject)
+        if accepts_keys(clz, values.keys()):
+            return self.call_expression(self.constant(clz, "C"), values.items())
+        construct = self.constant(construct_object)
+        node_path = self._node_paths[id(node)]
+        return f"{construct}({self.constant(clz, 'C')}, {node_path}, {self.dict_expression(values.items())})"
+
+    def read_array_class(self, node: TypeTreeNode) -> str:
+        # class of read_value_array
+        if self.as_dict:
+            return self.dict_expression([(child.m_Name, self.read_value(child)) for child in node.m_Children])
+
+        if node.m_Type.startswith("PPtr<"):
+            values = self.dict_expression([(child.m_Name, self.read_value(child)) for child in node.m_Children])
+            return f"{self.constant(PPtr, 'PPtr')}(assetsfile=assetsfile, **{values})"
+
+        items = [(child._clean_name, self.read_value(child)) for child in node.m_Children]
+        values = self.dict_expression(items)
+        clz = getattr(classes, node.m_Type, UnknownObject)
+        keys = set(child._clean_name for child in node.m_Children)
+        annotation_keys = get_annotation_keys(clz)
+        extra_keys = keys - annotation_keys
+        if annotation_keys - keys or clz is UnknownObject:
+            return f"{self.constant(UnknownObject)}({self._node_paths[id(node)]}, **{values})"
+        elif extra_keys:
+            construct = self.constant(construct_with_extra_keys)
+            return f"{construct}({self.constant(clz, 'C')}, {self.constant(frozenset(extra_keys))}, {values})"
+        return self.call_expression(self.constant(clz, "C"), items)
+
+    def dict_expression(self, items) -> str:
+        return "{" + ", ".join(f"{key!r}: {value}" for key, value in items) + "}"
+
+    def call_expression(self, func: str, items) -> str:
+        items = dict(items)
+        if all(key.isidentifier() and not iskeyword(key) for key in items):
+            return f"{func}({', '.join(f'{key}={value}' for key, value in items.items())})"
+        return f"{func}(**{self.dict_expression(items.items())})"
+
+    def is_fixed_size(self, node: TypeTreeNode) -> bool:
+        """Whether the node only consists of fixed-size fields without any alignment."""
+        if metaflag_is_aligned(node.m_MetaFlag) or not node.m_Children:
+            return node.m_Type in FIXED_SIZE_FORMATS and not metaflag_is_aligned(node.m_MetaFlag)
+        if node.m_Type in FIXED_SIZE_FORMATS or node.m_Type in ("string", "TypelessData"):
+            return False
+        if node.m_Children[0].m_Type == "Array" and node.m_Type != "pair":
+            return False
+        return all(self.is_fixed_size(child) for child in node.m_Children)
+
+
+def accepts_keys(clz, keys) -> bool:
+    """Whether the class can be created from the keys without construct_object's fallbacks.
+
+    Only the generated __init__ of attrs classes is checked, as it doesn't raise any other TypeErrors.
+    """
+    if not attrs.has(clz):
+        return False
+    parameters = inspect.signature(clz).parameters.values()
+    if any(parameter.kind not in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY) for parameter in parameters):
+        return False
+    required = {parameter.name for parameter in parameters if parameter.default is parameter.empty}
+    return required <= set(keys) <= {parameter.name for parameter in parameters}
+
+
+def construct_with_extra_keys(clz, extra_keys: frozenset, value: Dict[str, Any]) -> Any:
+    # see read_value_array, the keys that the class doesn't have are set as attributes
+    instance = clz(**{key: item for key, item in value.items() if key not in extra_keys})
+    for key in extra_keys:
+        setattr(instance, key, value[key])
+    return instance
+
+
+def get_reader(node: TypeTreeNode, endian: str, as_dict: bool) -> Optional[CompiledReader]:
+    """Returns the compiled reader of the node, it's only compiled once per node, endian and as_dict.
+
+    None is returned for nodes that can't be compiled, they have to be read via TypeTreeHelper.read_value.
+    """
+    key = (id(node), endian, as_dict)
+    entry = READER_CACHE.get(key)
+    if entry is not None and entry[0]() is node:
+        return entry[1]
+
+    try:
+        reader = TypeTreeReaderCompiler(endian, as_dict).compile(node)
+    except (UnsupportedNodeError, RecursionError, SyntaxError):
+        # e.g. too deeply nested nodes
+        reader = None
+
+    try:
+        # the entry is removed together with the node, so that its id can't be confused with a new node
+        ref = weakref.ref(node, lambda _, key=key: READER_CACHE.pop(key, None))
+    except TypeError:
+        # the nodes of UnityPyBoost don't support weak references
+        return reader
+    READER_CACHE[key] = (ref, reader)
+    return reader
+
+
+def read_typetree_compiled(
+    root_node: TypeTreeNode,
+    reader: EndianBinaryReader,
+    as_dict: bool = True,
+    byte_size: Optional[int] = None,
+    assetsfile: Optional[SerializedFile] = None,
+) -> Optional[Tuple[Any, int]]:
+    """Reads the typetree via the compiled reader of the node, see TypeTreeHelper.read_typetree.
+
+    Returns the value and the number of bytes read, or None if the typetree has to be read by the generic reader,
+    e.g. because the node can't be compiled or the data doesn't match the node.
+    """
+    pos = reader.Position
+    # the alignment of the compiled readers assumes that the data starts aligned
+    if pos % 4:
+        return None
+    if not isinstance(reader, EndianBinaryReader_Memoryview) and not byte_size:
+        return None
+    read = get_reader(root_node, reader.endian, as_dict)
+    if read is None:
+        return None
+
+    if isinstance(reader, EndianBinaryReader_Memoryview):
+        data, start, length = reader.view, pos, reader.Length
+    else:
+        data, start = reader.read_bytes(byte_size), 0  # type: ignore
+        length = len(data)
+
+    try:
+        value, end = read(data, start, length, assetsfile, root_node)
+    except Exception:
+        end = None
+    if end is None or end > length:
+        # the generic reader raises the appropriate error, or reads data that lies behind the object
+        reader.Position = pos
+        return None
+
+    reader.Position = pos + end - start
+    return value, end - start
+
+
+__all__ = [
+    "TypeTreeReaderCompiler",
+    "UnsupportedNodeError",
+    "get_reader",
+    "read_typetree_compiled",
+]
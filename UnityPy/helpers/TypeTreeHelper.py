@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING, Any, Optional, Union
 from attrs import define
 
 from .. import classes
+from .. import config as unitypy_config
 from ..streams.EndianBinaryReader import EndianBinaryReader
 from ..streams.EndianBinaryWriter import EndianBinaryWriter
 from .TypeTreeNode import TypeTreeNode
@@ -147,10 +148,20 @@ def read_typetree(
         data = reader.read_bytes(byte_size)
         obj, bytes_read = read_typetree_boost(data, root_node, reader.endian, as_dict, assetsfile, classes)
     else:
-        pos = reader.Position
-        config = TypeTreeConfig(as_dict, assetsfile, False)
-        obj = read_value(root_node, reader, config)
-        bytes_read = reader.Position - pos
+        result = None
+        if unitypy_config.COMPILE_TYPETREE_READERS:
+            # recursive import
+            from .TypeTreeCompiler import read_typetree_compiled
+
+            result = read_typetree_compiled(root_node, reader, as_dict, byte_size, assetsfile)
+
+        if result is not None:
+            obj, bytes_read = result
+        else:
+            pos = reader.Position
+            config = TypeTreeConfig(as_dict, assetsfile, False)
+            obj = read_value(root_node, reader, config)
+            bytes_read = reader.Position - pos
 
     if check_read and bytes_read != byte_size:
         raise ValueError(f"Expected to read {byte_size} bytes, but only read {bytes_read} bytes")
@@ -238,24 +249,7 @@ def read_value(
                     m_PathID=value["m_PathID"],
                 )
             else:
-                clz = getattr(classes, node.m_Type, UnknownObject)
-                try:
-                    value = clz(**value)
-                except TypeError:
-                    keys = set(value.keys())
-                    annotation_keys = get_annotation_keys(clz)
-                    missing_keys = annotation_keys - keys
-                    if clz is UnknownObject or missing_keys:
-                        value = UnknownObject(node, **value)
-                    else:
-                        extra_keys = keys - annotation_keys
-                        if extra_keys:
-                            instance = clz(**{key: value[key] for key in annotation_keys})
-                            for key in extra_keys:
-                                setattr(instance, key, value[key])
-                            value = instance
-                        else:
-                            value = UnknownObject(**value)
+                value = construct_object(getattr(classes, node.m_Type, UnknownObject), node, value)
 
     if align:
         reader.align_stream()
@@ -263,6 +257,26 @@ def read_value(
     return value
 
 
+def construct_object(clz, node: TypeTreeNode, value: dict[str, Any]) -> Object:
+    """Creates the object of the class from the values of the node's children,
+    or an UnknownObject if the values don't match the class."""
+    try:
+        return clz(**value)
+    except TypeError:
+        keys = set(value.keys())
+        annotation_keys = get_annotation_keys(clz)
+        missing_keys = annotation_keys - keys
+        if clz is UnknownObject or missing_keys:
+            return UnknownObject(node, **value)
+        extra_keys = keys - annotation_keys
+        if extra_keys:
+            instance = clz(**{key: value[key] for key in annotation_keys})
+            for key in extra_keys:
+                setattr(instance, key, value[key])
+            return instance
+        return UnknownObject(**value)
+
+
 def read_value_array(
     node: TypeTreeNode,
     reader: EndianBinaryReader,
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import hashlib
 import re
+import sys
 from struct import Struct
 from threading import Lock
 from typing import (
@@ -13,6 +15,7 @@ from typing import (
     Union,
     cast,
 )
+from weakref import WeakValueDictionary, finalize
 
 from attrs import define, field
 
@@ -108,6 +111,15 @@ class TypeTreeNode(TypeTreeNodeC):
                 stack.append((node, children_count))
         return dummy_root.m_Children[0]
 
+    @classmethod
+    def read_blob(cls, reader: EndianBinaryReader, version: int) -> bytes:
+        """Reads the raw data of a typetree blob, which can be parsed via parse_blob."""
+        node_count = reader.read_int()
+        stringbuffer_size = reader.read_int()
+        node_struct, _ = _get_blob_node_struct(reader.endian, version)
+        reader.Position -= 8
+        return reader.read_bytes(8 + node_struct.size * node_count + stringbuffer_size)
+
     @classmethod
     def parse_blob(cls, reader: EndianBinaryReader, version: int) -> TypeTreeNode:
         node_count = reader.read_int()
@@ -302,6 +314,97 @@ class TypeTreeNode(TypeTreeNodeC):
         return self.to_dict() == other.to_dict() and self.m_Children == other.m_Children
 
 
+class TypeTreeCache:
+    """Interns the typetrees of the SerializedTypes of all files.
+
+    Equal typetree blobs are only parsed once, all types with an equal key share the same TypeTreeNode,
+    so the nodes returned by the cache must not be modified.
+    The nodes are only weakly referenced, a typetree is dropped once no type uses it anymore.
+
+    hits, misses -- lookups that could or couldn't reuse a parsed typetree
+    saved_nodes -- number of nodes that didn't have to be parsed
+    saved_bytes -- estimated memory of the typetrees that didn't have to be created
+    """
+
+    hits: int
+    misses: int
+    saved_nodes: int
+    saved_bytes: int
+    _nodes: WeakValueDictionary[Tuple, TypeTreeNode]
+    # number of nodes and estimated size of the cached typetrees
+    _sizes: Dict[Tuple, Tuple[int, int]]
+    _lock: Lock
+
+    def __init__(self):
+        self._nodes = WeakValueDictionary()
+        self._sizes = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_nodes = 0
+        self.saved_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def get_blob_node(self, reader: EndianBinaryReader, version: int, key: Tuple = ()) -> TypeTreeNode:
+        """Reads a typetree blob and returns its node, the blob is only parsed if it isn't cached yet.
+
+        key -- identifies the type together with the blob, e.g. (class_id, old_type_hash, script_id)
+        """
+        return self.get_node(TypeTreeNode.read_blob(reader, version), version, reader.endian, key)
+
+    def get_node(self, blob: bytes, version: int, endian: str, key: Tuple = ()) -> TypeTreeNode:
+        """Returns the node of the raw typetree blob, the blob is only parsed if it isn't cached yet."""
+        blob_key = (*key, version, endian, hashlib.sha1(blob).digest())
+        with self._lock:
+            node = self._nodes.get(blob_key)
+            if node is not None:
+                node_count, size = self._sizes.get(blob_key, (0, 0))
+                self.hits += 1
+                self.saved_nodes += node_count
+                self.saved_bytes += size
+                return node
+
+        node = TypeTreeNode.parse_blob(EndianBinaryReader(blob, endian), version)
+        nodes = list(node.traverse())
+        size = sum(
+            sys.getsizeof(n) + sys.getsizeof(n.m_Children) + sys.getsizeof(n.m_Type) + sys.getsizeof(n.m_Name)
+            for n in nodes
+        )
+        with self._lock:
+            self.misses += 1
+            # another thread might have parsed the same blob in the meantime
+            cached = self._nodes.get(blob_key)
+            if cached is not None:
+                return cached
+            try:
+                self._nodes[blob_key] = node
+            except TypeError:
+                # nodes that don't support weak references aren't shared
+                return node
+            self._sizes[blob_key] = (len(nodes), size)
+        finalize(node, self._sizes.pop, blob_key, None)
+        return node
+
+    def clear(self) -> None:
+        with self._lock:
+            self._nodes.clear()
+            self._sizes.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters of the cache, saved_bytes is an estimate of the memory that was saved."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "typetrees": len(self._nodes),
+            "saved_nodes": self.saved_nodes,
+            "saved_bytes": self.saved_bytes,
+        }
+
+
+TYPETREE_CACHE = TypeTreeCache()
 COMMONSTRING_CACHE: Dict[Optional[UnityVersion], Dict[int, str]] = {}
 
 
@@ -0,0 +1,54 @@
+from struct import unpack_from
+from typing import BinaryIO, Dict, List, Optional, Union
+from zipfile import ZIP_STORED, ZipFile, ZipInfo
+
+from ..streams import EndianBinaryReader
+from ..streams.EndianBinaryReader import EndianBinaryReader_Memoryview
+
+# size of the fixed part of a local file header
+LOCAL_HEADER_SIZE = 30
+
+
+class ZipIndex:
+    """Index of the members of a zip archive (e.g. an apk or obb) by name.
+
+    Members are only read when they're opened.
+    Stored (uncompressed) members of archives in memory or memory-mapped archives
+    are returned as slices of the archive instead of copies.
+
+    members -- name -> info of all files in the archive
+    """
+
+    members: Dict[str, ZipInfo]
+    zip: ZipFile
+    _view: Optional[memoryview]
+
+    def __init__(self, source: Union[EndianBinaryReader, BinaryIO]):
+        self.zip = ZipFile(source)  # type: ignore
+        self.members = {info.filename: info for info in self.zip.infolist() if not info.is_dir()}
+        self._view = source.view if isinstance(source, EndianBinaryReader_Memoryview) else None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.members
+
+    def namelist(self) -> List[str]:
+        return list(self.members)
+
+    def open(self, name: str) -> EndianBinaryReader:
+        """Returns a reader for the data of the member."""
+        info = self.members[name]
+        if self._view is not None and info.compress_type == ZIP_STORED and not info.flag_bits & 0x1:
+            # the data follows the local header, whose extra field may differ from the central directory
+            name_length, extra_length = unpack_from("<HH", self._view, info.header_offset + 26)
+            start = info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length
+            return EndianBinaryReader(self._view[start : start + info.file_size])
+        # decompress the member at once, as seeking backwards within a compressed member restarts the decompression
+        return EndianBinaryReader(self.zip.read(info))
+
+    def close(self) -> None:
+        self.zip.close()
+
+
+__all__ = [
+    "ZipIndex",
+]
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from mmap import mmap
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, Optional, Protocol, Sequence, Union
+
+if TYPE_CHECKING:
+    from .EndianBinaryReader import EndianBinaryReader
+
+ByteString = Union[bytes, bytearray, memoryview]
+# unique keys of the storages within shared block caches
+CACHE_KEYS = count()
+
+
+class BlockInfoLike(Protocol):
+    uncompressedSize: int
+    compressedSize: int
+    flags: int
+
+
+class BlockCache:
+    """LRU cache for decompressed blocks that can be shared by many BlockStorages.
+
+    The least recently used blocks are evicted once the total size of the cached blocks exceeds max_bytes.
+    Blocks that are bigger than max_bytes aren't cached at all.
+
+    max_bytes -- memory budget of the cache
+    """
+
+    max_bytes: int
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+    _blocks: OrderedDict[Hashable, ByteString]
+    _lock: Lock
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._blocks = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._blocks
+
+    def get(self, key: Hashable) -> Optional[ByteString]:
+        with self._lock:
+            data = self._blocks.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def put(self, key: Hashable, data: ByteString) -> None:
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._blocks.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._blocks[key] = data
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._blocks.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+            self.size = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters of the cache, e.g. to tune max_bytes."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "blocks": len(self._blocks),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class BlockStorage:
+    """Random-access view over the uncompressed data of a block-compressed archive.
+
+    The storage only keeps the block table with the cumulative offsets of each block.
+    A block is read from the source, decrypted and decompressed the first time a read touches it.
+
+    reader -- reader of the (compressed) source, e.g. the bundle file
+    blocks -- block infos (uncompressedSize, compressedSize, flags)
+    data_offset -- position of the first compressed block within the reader
+    decompress -- function(compressed_data, uncompressed_size, flags, index) -> data
+    cache -- shared cache for the decompressed blocks,
+             by default the blocks are kept by the storage until it's discarded
+    """
+
+    reader: EndianBinaryReader
+    blocks: Sequence[BlockInfoLike]
+    offsets: List[int]
+    compressed_offsets: List[int]
+    decompress: Callable[[ByteString, int, int, int], ByteString]
+    start: int
+    length: int
+    cache: Optional[BlockCache]
+    _cache: Dict[int, ByteString]
+    _cache_key: int
+    _lock: Lock
+
+    def __init__(
+        self,
+        reader: EndianBinaryReader,
+        blocks: Sequence[BlockInfoLike],
+        data_offset: int,
+        decompress: Callable[[ByteString, int, int, int], ByteString],
+        cache: Optional[BlockCache] = None,
+    ):
+        self.reader = reader
+        self.blocks = blocks
+        self.decompress = decompress
+
+        self.offsets = [0]
+        self.compressed_offsets = [data_offset]
+        for block in blocks:
+            self.offsets.append(self.offsets[-1] + block.uncompressedSize)
+            self.compressed_offsets.append(self.compressed_offsets[-1] + block.compressedSize)
+
+        self.start = 0
+        self.length = self.offsets[-1]
+        self.cache = cache
+        self._cache = {}
+        # identifies the blocks of this storage in the shared cache
+        self._cache_key = next(CACHE_KEYS)
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def window(self, offset: int, size: int) -> BlockStorage:
+        """Returns a storage that shares the blocks of this one,
+        but only covers the given range (relative to this storage)."""
+        if offset < 0 or size < 0 or offset + size > self.length:
+            raise ValueError("Window exceeds the bounds of the storage")
+        window = object.__new__(type(self))
+        window.__dict__.update(self.__dict__)
+        window.start = self.start + offset
+        window.length = size
+        return window
+
+    def block_index(self, offset: int) -> int:
+        """Returns the index of the block that contains the given absolute offset."""
+        return bisect_right(self.offsets, offset) - 1
+
+    def read_compressed_block(self, index: int) -> bytes:
+        """Returns the raw (compressed, possibly encrypted) data of the block."""
+        with self._lock:
+            self.reader.Position = self.compressed_offsets[index]
+            return self.reader.read_bytes(self.blocks[index].compressedSize)
+
+    def get_cached_block(self, index: int) -> Optional[ByteString]:
+        """Returns the uncompressed data of the block if it's cached, otherwise None."""
+        data = self._cache.get(index)
+        if data is None and self.cache is not None:
+            data = self.cache.get((self._cache_key, index))
+        return data
+
+    def get_block(self, index: int) -> ByteString:
+        """Returns the uncompressed data of the block, decompressing it if necessary."""
+        data = self.get_cached_block(index)
+        if data is None:
+            block = self.blocks[index]
+            data = self.decompress(
+                self.read_compressed_block(index),
+                block.uncompressedSize,
+                block.flags,
+                index,
+            )
+            # memory-mapped blocks don't use up memory, so they aren't subject to the budget of the cache
+            if self.cache is None or isinstance(data, mmap):
+                self._cache[index] = data
+            else:
+                self.cache.put((self._cache_key, index), data)
+        return data
+
+    def decompress_all(self, workers: Optional[int] = None) -> bytearray:
+        """Decompresses all blocks into one preallocated buffer.
+
+        workers -- number of threads used to decrypt and decompress the blocks,
+                   LZ4 and LZMA release the GIL, so the blocks are decompressed concurrently
+        """
+        buffer = bytearray(self.offsets[-1])
+        view = memoryview(buffer)
+
+        # read all compressed blocks at once to avoid seeking per block
+        with self._lock:
+            self.reader.Position = self.compressed_offsets[0]
+            compressed = memoryview(self.reader.read_bytes(self.compressed_offsets[-1] - self.compressed_offsets[0]))
+        base = self.compressed_offsets[0]
+
+        def decompress_block(index: int) -> None:
+            data = self.get_cached_block(index)
+            if data is None:
+                block = self.blocks[index]
+                start = self.compressed_offsets[index] - base
+                data = self.decompress(
+                    compressed[start : start + block.compressedSize],
+                    block.uncompressedSize,
+                    block.flags,
+                    index,
+                )
+            view[self.offsets[index] : self.offsets[index + 1]] = data
+
+        if workers and workers > 1 and len(self.blocks) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # list to propagate exceptions
+                list(executor.map(decompress_block, range(len(self.blocks))))
+        else:
+            for index in range(len(self.blocks)):
+                decompress_block(index)
+
+        return buffer
+
+    @property
+    def loaded_blocks(self) -> int:
+        """Number of blocks of this storage that are currently cached."""
+        shared = 0
+        if self.cache is not None:
+            shared = sum((self._cache_key, index) in self.cache for index in range(len(self.blocks)))
+        return len(self._cache) + shared
+
+    def get_view(self, position: int) -> tuple[memoryview, int, int]:
+        """Returns the uncompressed block containing the position (relative to this storage),
+        together with its start and end relative to this storage."""
+        index = self.block_index(self.start + position)
+        view = memoryview(self.get_block(index))
+        return view, self.offsets[index] - self.start, self.offsets[index + 1] - self.start
+
+    def read(self, position: int, size: Optional[int] = -1) -> bytes:
+        """Reads size bytes at the position (relative to this storage)."""
+        if size is None or size < 0:
+            size = self.length - position
+        size = max(0, min(size, self.length - position))
+        if size == 0:
+            return b""
+
+        offset = self.start + position
+        end = offset + size
+        index = self.block_index(offset)
+
+        block_start = self.offsets[index]
+        if end <= self.offsets[index + 1]:
+            data = self.get_block(index)
+            return bytes(data[offset - block_start : end - block_start])
+
+        parts = []
+        while offset < end:
+            block_start = self.offsets[index]
+            block_end = self.offsets[index + 1]
+            data = self.get_block(index)
+            parts.append(data[offset - block_start : min(end, block_end) - block_start])
+            offset = block_end
+            index += 1
+        return b"".join(parts)
+
+
+class SegmentStorage(BlockStorage):
+    """Random-access view over consecutive segments of data, e.g. the pieces of a .split file.
+
+    The segments are used as they are, instead of being joined into one buffer,
+    so memory-mapped segments are only paged in when they're read.
+
+    segments -- data of the segments in order
+    """
+
+    segments: List[ByteString]
+
+    def __init__(self, segments: Sequence[ByteString]):
+        self.segments = list(segments)
+        self.blocks = []
+        self.offsets = [0]
+        for segment in self.segments:
+            self.offsets.append(self.offsets[-1] + len(segment))
+        self.compressed_offsets = self.offsets
+        self.start = 0
+        self.length = self.offsets[-1]
+        self.cache = None
+        self._cache = {}
+        self._cache_key = next(CACHE_KEYS)
+        self._lock = Lock()
+
+    def read_compressed_block(self, index: int) -> bytes:
+        return bytes(self.segments[index])
+
+    def get_cached_block(self, index: int) -> ByteString:
+        return self.segments[index]
+
+    def get_block(self, index: int) -> ByteString:
+        return self.segments[index]
+
+    def decompress_all(self, workers: Optional[int] = None) -> bytearray:
+        buffer = bytearray(self.length)
+        for index, segment in enumerate(self.segments):
+            buffer[self.offsets[index] : self.offsets[index + 1]] = segment
+        return buffer
+
+    @property
+    def loaded_blocks(self) -> int:
+        return len(self.segments)
+
+
+__all__ = [
+    "BlockCache",
+    "BlockStorage",
+    "SegmentStorage",
+]
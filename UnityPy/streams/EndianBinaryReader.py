@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import builtins
+import mmap
+import os
 import re
 import sys
-from io import BufferedReader, IOBase
+from io import BufferedReader, BytesIO, IOBase
 from struct import Struct, unpack
 from types import MethodType
 from typing import Any, Callable, ClassVar, Dict, List, Literal, Optional, Tuple, Union
 
+from .. import config
+from .BlockStorage import BlockStorage
+
 reNot0 = re.compile(b"(.*?)\x00", re.S)
 
 SYS_ENDIAN = "<" if sys.byteorder == "little" else ">"
@@ -28,6 +33,7 @@ TYPE_PARAM_SIZE_LIST = [
 
 MEMORY_FUNCTIONS: Dict[Endianess, Dict[str, Callable[["EndianBinaryReader_Memoryview"], Any]]] = {"<": {}, ">": {}}
 STREAM_FUNCTIONS: Dict[Endianess, Dict[str, Callable[["EndianBinaryReader_Streamable"], Any]]] = {"<": {}, ">": {}}
+BLOCKS_FUNCTIONS: Dict[Endianess, Dict[str, Callable[["EndianBinaryReader_Blocks"], Any]]] = {"<": {}, ">": {}}
 
 
 class EndianBinaryReader:
@@ -39,7 +45,7 @@ class EndianBinaryReader:
 
     def __new__(
         cls,
-        item: Union[bytes, bytearray, memoryview, IOBase, str],
+        item: Union[bytes, bytearray, memoryview, IOBase, str, BlockStorage],
         endian: Endianess = ">",
         offset: int = 0,
     ):
@@ -48,9 +54,19 @@ class EndianBinaryReader:
         elif isinstance(item, IOBase):
             obj = super(EndianBinaryReader, cls).__new__(EndianBinaryReader_Streamable)  # type: ignore
         elif isinstance(item, str):
-            obj = super(EndianBinaryReader, cls).__new__(EndianBinaryReader_Streamable_LocalFile)  # type: ignore
+            if config.MMAP_LOCAL_FILES:
+                obj = super(EndianBinaryReader, cls).__new__(EndianBinaryReader_Mmap)  # type: ignore
+            else:
+                obj = super(EndianBinaryReader, cls).__new__(EndianBinaryReader_Streamable_LocalFile)  # type: ignore
+        elif isinstance(item, BlockStorage):
+            obj = super(EndianBinaryReader, cls).__new__(EndianBinaryReader_Blocks)  # type: ignore
         elif isinstance(item, EndianBinaryReader):
-            item = item.stream if isinstance(item, EndianBinaryReader_Streamable) else item.view
+            if isinstance(item, EndianBinaryReader_Streamable):
+                item = item.stream
+            elif isinstance(item, EndianBinaryReader_Blocks):
+                item = item.storage
+            else:
+                item = item.view
             return EndianBinaryReader(item, endian, offset)
         elif hasattr(item, "read"):
             if hasattr(item, "seek") and hasattr(item, "tell"):
@@ -227,6 +243,18 @@ class EndianBinaryReader:
     def tell(self) -> int:
         return self.Position
 
+    def seekable(self) -> bool:
+        return True
+
+    def get_file_id(self) -> Optional[Tuple[int, int]]:
+        """Returns (device, inode) of the local file the data is read from, None if it's read from memory."""
+        return None
+
+    def detach(self) -> None:
+        """Makes the reader independent of its source, so that it can be closed or modified.
+        Readers over memory don't depend on a source."""
+        pass
+
 
 class EndianBinaryReader_Memoryview(EndianBinaryReader):
     __slots__ = ("view", "_endian", "BaseOffset", "Position", "Length")
@@ -284,6 +312,47 @@ class EndianBinaryReader_Memoryview(EndianBinaryReader):
         return ret
 
 
+class EndianBinaryReader_Mmap(EndianBinaryReader_Memoryview):
+    """Memoryview reader over a memory-mapped local file.
+    The data is paged in by the OS when it's read, instead of being copied into memory."""
+
+    __slots__ = ("mmap", "file_id")
+    mmap: Optional[mmap.mmap]
+    file_id: Tuple[int, int]
+
+    def __init__(self, path: str, endian: Endianess = ">", offset: int = 0):
+        with open(path, "rb") as f:
+            self.file_id = file_id(f)  # type: ignore
+            try:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can't be mapped
+                self.mmap = None
+        super().__init__(self.mmap if self.mmap is not None else b"", endian=endian, offset=offset)
+
+    def dispose(self) -> None:
+        super().dispose()
+        if self.mmap is not None:
+            self.mmap.close()
+
+    def detach(self) -> None:
+        """Copies the data into memory and closes the mapping, so that the file can be modified."""
+        if self.mmap is None:
+            return
+        view = self.view
+        self.view = memoryview(view.tobytes())
+        view.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            # slices of the mapping are still in use, it's unmapped once they're released
+            pass
+        self.mmap = None
+
+    def get_file_id(self) -> Optional[Tuple[int, int]]:
+        return self.file_id if self.mmap is not None else None
+
+
 class EndianBinaryReader_Streamable(EndianBinaryReader):
     __slots__ = ("stream", "_endian", "BaseOffset")
     stream: BufferedReader
@@ -323,15 +392,116 @@ class EndianBinaryReader_Streamable(EndianBinaryReader):
         self.stream.close()
         pass
 
+    def detach(self) -> None:
+        """Copies the data of the stream into memory, so that the stream can be closed or its file modified."""
+        position = self.stream.tell()
+        self.stream.seek(0)
+        stream = BytesIO(self.stream.read())
+        stream.seek(position)
+        self.stream = stream
+        self.read = stream.read
+
+    def get_file_id(self) -> Optional[Tuple[int, int]]:
+        return file_id(self.stream)
+
+
+class EndianBinaryReader_Blocks(EndianBinaryReader):
+    """Reader for the uncompressed data of a BlockStorage.
+    Blocks are only decompressed when a read touches them,
+    the current block is kept as memoryview for fast primitive reads."""
+
+    __slots__ = (
+        "storage",
+        "_endian",
+        "BaseOffset",
+        "Position",
+        "Length",
+        "_view",
+        "_view_start",
+        "_view_end",
+    )
+    storage: BlockStorage
+    _view: memoryview
+    _view_start: int
+    _view_end: int
+    _function_map = BLOCKS_FUNCTIONS
+
+    def __init__(self, storage: BlockStorage, endian: Endianess = ">", offset: int = 0):
+        super().__init__(storage, endian=endian, offset=offset)
+        self.storage = storage
+        self.Length = len(storage)
+        self._view = memoryview(b"")
+        self._view_start = 0
+        self._view_end = 0
+
+    @property
+    def bytes(self):
+        return self.storage.read(0, self.Length)
+
+    def dispose(self) -> None:
+        self._view = memoryview(b"")
+
+    def get_file_id(self) -> Optional[Tuple[int, int]]:
+        # segments of split files don't have a single source
+        source = getattr(self.storage, "reader", None)
+        return source.get_file_id() if source is not None else None
+
+    def _load_view(self, position: int) -> None:
+        self._view, self._view_start, self._view_end = self.storage.get_view(position)
+
+    def read(self, size: Optional[int] = -1, /):
+        if not size:
+            return b""
+        if size == -1:
+            size = self.Length - self.Position
+        pos = self.Position
+        if not (self._view_start <= pos and pos + size <= self._view_end):
+            if pos >= self.Length:
+                return b""
+            self._load_view(pos)
+        if pos + size <= self._view_end:
+            ret = self._view[pos - self._view_start : pos - self._view_start + size].tobytes()
+        else:
+            ret = self.storage.read(pos, size)
+        self.Position = pos + size
+        return ret
+
+    def read_string_to_null(self, max_length: int = 32767) -> str:
+        pos = self.Position
+        if pos < self.Length:
+            if not (self._view_start <= pos < self._view_end):
+                self._load_view(pos)
+            view_pos = pos - self._view_start
+            match = reNot0.search(self._view, view_pos, min(view_pos + max_length, len(self._view)))
+            if match:
+                self.Position = pos + match.end() - view_pos
+                return match[1].decode("utf8", "surrogateescape")
+        # string crosses a block border
+        return super().read_string_to_null(max_length)
+
 
 class EndianBinaryReader_Streamable_LocalFile(EndianBinaryReader_Streamable):
     def __init__(self, path: str, endian: Endianess = ">", offset: int = 0):
         super().__init__(open(path, "rb"), endian=endian, offset=offset)
 
+    def detach(self) -> None:
+        stream = self.stream
+        super().detach()
+        stream.close()
+
     def __del__(self):
         self.stream.close()
 
 
+def file_id(file: Union[str, IOBase, Any]) -> Optional[Tuple[int, int]]:
+    """Returns (device, inode) of a local file given by its path or handle, None if it isn't a local file."""
+    try:
+        stat = os.stat(file) if isinstance(file, str) else os.fstat(file.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    return stat.st_dev, stat.st_ino
+
+
 for endian_s in ("<", ">"):
     for reader_type_name, struct_type_char in TYPE_PARAM_SIZE_LIST:
         func_name = f"read_{reader_type_name}"
@@ -345,5 +515,14 @@ for endian_s in ("<", ">"):
         def stream_read_func(self: EndianBinaryReader_Streamable, /, struct=struct):
             return struct.unpack(self.stream.read(struct.size))[0]
 
+        def blocks_read_func(self: EndianBinaryReader_Blocks, /, struct=struct):
+            pos = self.Position
+            if self._view_start <= pos and pos + struct.size <= self._view_end:
+                value = struct.unpack_from(self._view, pos - self._view_start)[0]
+                self.Position = pos + struct.size
+                return value
+            return struct.unpack(self.read(struct.size))[0]
+
         MEMORY_FUNCTIONS[endian_s][func_name] = memory_read_func
         STREAM_FUNCTIONS[endian_s][func_name] = stream_read_func
+        BLOCKS_FUNCTIONS[endian_s][func_name] = blocks_read_func
@@ -1,7 +1,11 @@
+from .BlockStorage import BlockCache, BlockStorage, SegmentStorage
 from .EndianBinaryReader import EndianBinaryReader
 from .EndianBinaryWriter import EndianBinaryWriter
 
 __all__ = [
+    "BlockCache",
+    "BlockStorage",
     "EndianBinaryReader",
     "EndianBinaryWriter",
+    "SegmentStorage",
 ]
@@ -0,0 +1,78 @@
+"""Compares the speed of the compiled typetree readers with the generic reader.
+
+Usage: python tests/benchmark_typetree.py [repeat]
+"""
+
+import random
+import sys
+import timeit
+from typing import Any
+
+from UnityPy import config
+from UnityPy.enums import ClassIDType
+from UnityPy.helpers.Tpk import get_typetree_node
+from UnityPy.helpers.TypeTreeCompiler import FIXED_SIZE_FORMATS
+from UnityPy.helpers.TypeTreeHelper import read_typetree, write_typetree
+from UnityPy.helpers.TypeTreeNode import TypeTreeNode
+from UnityPy.helpers.UnityVersion import UnityVersion
+from UnityPy.streams import EndianBinaryReader, EndianBinaryWriter
+
+VERSION = UnityVersion.from_list(2019, 4, 0, 0)
+CLASSES = [
+    ClassIDType.GameObject,
+    ClassIDType.Transform,
+    ClassIDType.Material,
+    ClassIDType.Mesh,
+    ClassIDType.AnimationClip,
+]
+
+
+def generate_value(node: TypeTreeNode, rnd: random.Random, array_size: int) -> Any:
+    if node.m_Type in FIXED_SIZE_FORMATS:
+        fmt = FIXED_SIZE_FORMATS[node.m_Type]
+        if fmt in "fd":
+            return rnd.random()
+        return fmt == "?" or rnd.randrange(100)
+    if node.m_Type == "string":
+        return "benchmark"
+    if node.m_Type == "TypelessData":
+        return bytes(array_size)
+    if node.m_Type == "pair":
+        return tuple(generate_value(child, rnd, array_size) for child in node.m_Children)
+    if node.m_Children and node.m_Children[0].m_Type == "Array":
+        item = node.m_Children[0].m_Children[1]
+        return [generate_value(item, rnd, array_size // 4) for _ in range(array_size)]
+    return {child.m_Name: generate_value(child, rnd, array_size) for child in node.m_Children}
+
+
+def benchmark(repeat: int = 5) -> None:
+    rnd = random.Random(0)
+    print(f"{'class':<16}{'bytes':>10}{'as_dict':>9}{'generic':>12}{'compiled':>12}{'speedup':>9}")
+    for class_id in CLASSES:
+        node = get_typetree_node(class_id, VERSION)
+        writer = EndianBinaryWriter(endian="<")
+        write_typetree(generate_value(node, rnd, 16), node, writer)
+        data = writer.bytes
+
+        for as_dict in (True, False):
+
+            def read(node: TypeTreeNode = node, data: bytes = data, as_dict: bool = as_dict) -> None:
+                read_typetree(node, EndianBinaryReader(data, "<"), as_dict, len(data))
+
+            number = max(1, 200_000 // len(data))
+            timings = []
+            for compile_readers in (False, True):
+                config.COMPILE_TYPETREE_READERS = compile_readers
+                read()  # compiles the reader
+                timings.append(min(timeit.repeat(read, number=number, repeat=repeat)) / number)
+            config.COMPILE_TYPETREE_READERS = True
+
+            generic, compiled = timings
+            print(
+                f"{node.m_Type:<16}{len(data):>10}{str(as_dict):>9}"
+                f"{generic * 1e6:>10.1f}us{compiled * 1e6:>10.1f}us{generic / compiled:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,223 @@
+"""Generates small synthetic SerializedFiles and bundles,
+so that the tests don't depend on the samples alone."""
+
+import os
+import random
+from typing import Dict, List, Sequence, Tuple
+
+import UnityPy
+from UnityPy import config
+from UnityPy.helpers.Tpk import get_typetree_node
+from UnityPy.helpers.TypeTreeHelper import write_typetree
+from UnityPy.helpers.TypeTreeNode import TypeTreeNode
+from UnityPy.helpers.UnityVersion import UnityVersion
+from UnityPy.streams import EndianBinaryWriter
+
+UNITY_VERSION = "2020.3.48f1"
+SERIALIZED_FILE_VERSION = 22
+# small chunks, so that the bundles consist of several blocks
+CHUNK_SIZE = 0x4000
+
+PRIMITIVE_TYPES = {
+    "SInt8",
+    "UInt8",
+    "char",
+    "short",
+    "SInt16",
+    "unsigned short",
+    "UInt16",
+    "int",
+    "SInt32",
+    "unsigned int",
+    "UInt32",
+    "Type*",
+    "long long",
+    "SInt64",
+    "unsigned long long",
+    "UInt64",
+    "FileSize",
+}
+
+
+def _get_node(class_id: int) -> TypeTreeNode:
+    return get_typetree_node(class_id, UnityVersion.from_str(UNITY_VERSION))
+
+
+def _default_value(node: TypeTreeNode):
+    if node.m_Type in PRIMITIVE_TYPES:
+        return 0
+    if node.m_Type in ("float", "double"):
+        return 0.0
+    if node.m_Type == "bool":
+        return False
+    if node.m_Type == "string":
+        return ""
+    if node.m_Type == "TypelessData":
+        return b""
+    if node.m_Type == "pair":
+        return (_default_value(node.m_Children[0]), _default_value(node.m_Children[1]))
+    if node.m_Children and node.m_Children[0].m_Type == "Array":
+        return []
+    return {child.m_Name: _default_value(child) for child in node.m_Children}
+
+
+def generate_object(class_id: int, values: dict) -> bytes:
+    """Returns the data of an object of the class, values overwrite the default values of its fields."""
+    node = _get_node(class_id)
+    data = _default_value(node)
+    data.update(values)
+    writer = EndianBinaryWriter(endian="<")
+    write_typetree(data, node, writer)
+    return writer.bytes
+
+
+def _write_type(writer: EndianBinaryWriter, class_id: int):
+    writer.write_int(class_id)
+    writer.write_boolean(False)  # is_stripped_type
+    writer.write_short(-1)  # script_type_index
+    writer.write_bytes(bytes(range(16)))  # old_type_hash
+    # the nodes of the tpk lack the fields that are only stored in the files
+    node = TypeTreeNode.from_list(
+        [
+            {
+                "m_TypeFlags": 0,
+                "m_Index": 0,
+                "m_MetaFlag": 0,
+                "m_RefTypeHash": 0,
+                **{key: value for key, value in item.items() if value is not None and key != "m_Children"},
+            }
+            for item in _get_node(class_id).to_dict_list()
+        ]
+    )
+    node.dump_blob(writer, SERIALIZED_FILE_VERSION)
+    writer.write_int(0)  # type_dependencies
+
+
+def generate_serialized_file(objects: Sequence[Tuple[int, int, bytes]]) -> bytes:
+    """Returns a SerializedFile that contains the given (path_id, class_id, data) objects in the given order."""
+    class_ids = sorted({class_id for _, class_id, _ in objects})
+
+    meta = EndianBinaryWriter(endian="<")
+    meta.write_string_to_null(UNITY_VERSION)
+    meta.write_int(5)  # target_platform
+    meta.write_boolean(True)  # enable_type_tree
+    meta.write_int(len(class_ids))
+    for class_id in class_ids:
+        _write_type(meta, class_id)
+
+    data = EndianBinaryWriter(endian="<")
+    meta.write_int(len(objects))
+    for path_id, class_id, obj_data in objects:
+        meta.align_stream(4)
+        meta.write_long(path_id)
+        meta.write_long(data.Position)
+        meta.write_u_int(len(obj_data))
+        meta.write_int(class_ids.index(class_id))
+        data.write(obj_data)
+        data.align_stream(8)
+    meta.write_int(0)  # script_types
+    meta.write_int(0)  # externals
+    meta.write_int(0)  # ref_types
+    meta.write_string_to_null("")  # userInformation
+
+    metadata = meta.bytes
+    data_offset = 48 + len(metadata)
+    data_offset += (16 - data_offset % 16) % 16
+    writer = EndianBinaryWriter()
+    # old header
+    writer.write_u_int(0)
+    writer.write_u_int(0)
+    writer.write_u_int(SERIALIZED_FILE_VERSION)
+    writer.write_u_int(0)
+    writer.write_boolean(False)  # big endian
+    writer.write_bytes(b"\x00" * 3)
+    writer.write_u_int(len(metadata))
+    writer.write_long(data_offset + data.Length)
+    writer.write_long(data_offset)
+    writer.write_long(0)
+    writer.write(metadata)
+    writer.align_stream(16)
+    writer.write(data.bytes)
+    return writer.bytes
+
+
+def generate_assets(name: str, text_count: int = 40, text_size: int = 2000, seed: int = 0) -> bytes:
+    """Returns a SerializedFile with text_count TextAssets and an AssetBundle that contains them."""
+    rng = random.Random(seed)
+    objects: List[Tuple[int, int, bytes]] = []
+    container = []
+    for i in range(text_count):
+        path_id = 1000 + i
+        script = "".join(rng.choice("abcdefgh ") for _ in range(text_size + i))
+        objects.append((path_id, 49, generate_object(49, {"m_Name": f"text_{i}", "m_Script": script})))
+        asset = {"preloadIndex": i, "preloadSize": 1, "asset": {"m_FileID": 0, "m_PathID": path_id}}
+        container.append((f"assets/{name}/text_{i}.txt", asset))
+    preload_table = [{"m_FileID": 0, "m_PathID": path_id} for path_id, _, _ in objects]
+    values = {"m_Name": name, "m_Container": container, "m_PreloadTable": preload_table, "m_AssetBundleName": name}
+    objects.insert(0, (1, 142, generate_object(142, values)))
+    return generate_serialized_file(objects)
+
+
+def generate_bundle(nodes: Sequence[Tuple[str, bytes, int]], packer: str = "none") -> bytes:
+    """Returns a UnityFS bundle with the given (path, data, flags) nodes,
+    the data is compressed in CHUNK_SIZE blocks by the packer of BundleFile.save."""
+    blob = b"".join(data for _, data, _ in nodes)
+
+    blocks_info = EndianBinaryWriter(b"\x00" * 16)
+    blocks_info.write_int(1)
+    blocks_info.write_u_int(len(blob))
+    blocks_info.write_u_int(len(blob))
+    blocks_info.write_u_short(0x40)
+    blocks_info.write_int(len(nodes))
+    offset = 0
+    for path, data, flags in nodes:
+        blocks_info.write_long(offset)
+        blocks_info.write_long(len(data))
+        blocks_info.write_u_int(flags)
+        blocks_info.write_string_to_null(path)
+        offset += len(data)
+    blocks_info_data = blocks_info.bytes
+
+    writer = EndianBinaryWriter()
+    writer.write_string_to_null("UnityFS")
+    writer.write_u_int(7)
+    writer.write_string_to_null("5.x.x")
+    writer.write_string_to_null(UNITY_VERSION)
+    size_position = writer.Position
+    writer.write_long(0)
+    writer.write_u_int(len(blocks_info_data))
+    writer.write_u_int(len(blocks_info_data))
+    writer.write_u_int(0x40)
+    writer.align_stream(16)
+    writer.write(blocks_info_data)
+    writer.write(blob)
+    writer.Position = size_position
+    writer.write_long(writer.Length)
+    data = writer.bytes
+
+    if packer == "none":
+        return data
+    chunk_size = config.COMPRESSION_CHUNK_SIZE
+    config.COMPRESSION_CHUNK_SIZE = CHUNK_SIZE
+    try:
+        return UnityPy.load(data).file.save(packer=packer)
+    finally:
+        config.COMPRESSION_CHUNK_SIZE = chunk_size
+
+
+def generate_samples(path: str) -> Dict[str, bytes]:
+    """Writes bundles with each compression and a plain SerializedFile into path,
+    returns the data of the files by their name."""
+    cab = generate_assets("CAB-synthetic")
+    resource = random.Random(1).getrandbits(0x8000 * 8).to_bytes(0x8000, "little") + bytes(0x8000)
+    nodes = [("CAB-synthetic", cab, 4), ("CAB-synthetic.resS", resource, 0)]
+    samples = {
+        "synthetic_lz4.bundle": generate_bundle(nodes, "lz4"),
+        "synthetic_lzma.bundle": generate_bundle(nodes, "lzma"),
+        "CAB-plain": generate_assets("plain", text_count=5, seed=2),
+    }
+    os.makedirs(path, exist_ok=True)
+    for name, data in samples.items():
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(data)
+    return samples
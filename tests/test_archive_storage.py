@@ -0,0 +1,91 @@
+import os
+import random
+from tempfile import TemporaryDirectory
+
+import lz4.block
+
+from UnityPy.helpers import ArchiveStorageManager
+from UnityPy.helpers.ArchiveStorageManager import ArchiveStorageDecryptor
+
+
+def create_decryptor(seed: int) -> ArchiveStorageDecryptor:
+    rng = random.Random(seed)
+    decryptor = object.__new__(ArchiveStorageDecryptor)
+    decryptor.index = bytes(rng.randrange(16) for _ in range(16))
+    decryptor.substitute = bytes(rng.randrange(16) for _ in range(16))
+    return decryptor
+
+
+def decrypt_block_reference(decryptor: ArchiveStorageDecryptor, data: bytes, index: int) -> bytearray:
+    offset = 0
+    data = bytearray(data)
+    view = memoryview(data)
+    while offset < len(data):
+        offset += decryptor.decrypt(view[offset:], index, len(data) - offset)
+        index += 1
+    return data
+
+
+def test_decrypt_block():
+    if ArchiveStorageManager.UnityPyBoost:
+        return
+    for seed in range(10):
+        decryptor = create_decryptor(seed)
+        rng = random.Random(seed)
+        data = lz4.block.compress(bytes(rng.choice(b"Unity\xff") for _ in range(0x1000)), store_size=False)
+        try:
+            expected = decrypt_block_reference(decryptor, data, seed)
+        except IndexError:
+            # the key doesn't fit the data
+            continue
+        assert decryptor.decrypt_block(data, seed) == expected
+
+
+def test_decrypt_table():
+    decryptor = create_decryptor(0)
+    table = decryptor.get_decrypt_table()
+    for index in (0, 0x3F, 0x40, 0xFF):
+        view = bytearray(range(0x100))
+        for value in range(0x100):
+            decryptor.decrypt_byte(view, value, index)
+        assert table[index << 8 : (index + 1) << 8] == view
+
+
+def test_brute_force_key():
+    from Crypto.Cipher import AES
+
+    key = b"UnityPyTestKey01"
+    key_sig = bytes(range(16))
+    # the signature of the bundle is the key_sig encrypted by the key, xored with the data_sig
+    data_sig = bytes(x ^ y for x, y in zip(AES.new(key, AES.MODE_ECB).encrypt(key_sig), b"#$unity3dchina!@"))
+    rng = random.Random(0)
+    shard_size = 0x1000
+    # the key straddles the border of the second and third shard, another one follows later on
+    data = bytearray(rng.getrandbits(8) for _ in range(shard_size * 4))
+    data[shard_size * 2 - 8 : shard_size * 2 + 8] = key
+    data[shard_size * 3 + 8 : shard_size * 3 + 24] = key
+
+    with TemporaryDirectory(prefix="unitypy_test") as temp_dir:
+        fp = os.path.join(temp_dir, "global-metadata.dat")
+        with open(fp, "wb") as f:
+            f.write(data)
+        for workers in (None, 3):
+            searched = []
+            found = ArchiveStorageManager.brute_force_key(
+                fp,
+                key_sig,
+                data_sig,
+                workers=workers,
+                shard_size=shard_size,
+                progress=lambda done, total, searched=searched: searched.append(done),
+            )
+            assert found == key
+            # the progress is reported in the order of the shards
+            assert searched == [shard_size]
+
+
+if __name__ == "__main__":
+    for x in list(locals()):
+        if str(x)[:4] == "test":
+            locals()[x]()
+    input("All Tests Passed")
@@ -1,15 +1,39 @@
+import hashlib
 import io
 import os
 import platform
+import shutil
+import zipfile
+import zlib
+from functools import lru_cache
+from tempfile import TemporaryDirectory
+from typing import List, Optional, Tuple
 
 from PIL import Image
+from synthetic_samples import generate_object, generate_samples, generate_serialized_file
 
 import UnityPy
+from UnityPy.files import BundleFile, SerializedFile
+from UnityPy.helpers import HashHelper, IndexHelper
+from UnityPy.helpers.ContainerHelper import ContainerHelper
+from UnityPy.helpers.TypeTreeNode import TYPETREE_CACHE
 from UnityPy.streams import EndianBinaryReader
 
 SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples")
 
 
+@lru_cache(maxsize=None)
+def _synthetic_samples() -> TemporaryDirectory:
+    temp_dir = TemporaryDirectory(prefix="unitypy_test")
+    generate_samples(temp_dir.name)
+    return temp_dir
+
+
+def sample_dirs() -> List[str]:
+    """Returns the directories of the samples and of the synthetic samples, which are generated once."""
+    return [SAMPLES, _synthetic_samples().name]
+
+
 def test_read_single():
     for f in os.listdir(SAMPLES):
         env = UnityPy.load(os.path.join(SAMPLES, f))
@@ -119,6 +143,390 @@ def test_save():
         assert save1 == save2, f"Failed to save {name} correctly"
 
 
+def test_save_fp():
+    for samples in sample_dirs():
+        env = UnityPy.load(samples)
+        for name, file in env.files.items():
+            if not isinstance(file, BundleFile):
+                continue
+            for packer in ("none", "lz4", "lzma"):
+                stream = io.BytesIO()
+                assert file.save(packer=packer, fp=stream) is None
+                assert stream.getvalue() == file.save(packer=packer), f"Failed to stream {name} with {packer}"
+
+
+def count_reused_blocks(bundle: BundleFile) -> List[int]:
+    """Returns the list the indices of the compressed blocks that are copied while saving are added to."""
+    storage = bundle._blocks_storage
+    reused = []
+    read_compressed_block = storage.read_compressed_block
+    storage.read_compressed_block = lambda index: reused.append(index) or read_compressed_block(index)
+    return reused
+
+
+def blocks_within(bundle: BundleFile, ranges: List[Tuple[int, int]]) -> List[int]:
+    """Returns the indices of the blocks that lie completely within one of the (start, end) ranges."""
+    offsets = bundle._blocks_storage.offsets
+    return [
+        i
+        for i in range(len(offsets) - 1)
+        if any(start <= offsets[i] and offsets[i + 1] <= end for start, end in ranges)
+    ]
+
+
+def test_save_original():
+    for samples in sample_dirs():
+        for f in os.listdir(samples):
+            env = UnityPy.load(os.path.join(samples, f))
+            if not isinstance(env.file, BundleFile) or not env.objects:
+                continue
+            reused = count_reused_blocks(env.file)
+
+            # unchanged blocks are copied, changed ones are recompressed
+            objs = list(env.objects)
+            raw_data = [obj.get_raw_data() for obj in objs]
+            raw_data[-1] += b"\x00" * 4
+            objs[-1].set_raw_data(raw_data[-1])
+            re_env = UnityPy.load(env.file.save(packer="original"))
+            assert [obj.get_raw_data() for obj in re_env.objects] == raw_data
+            # at least the blocks that lie completely within the unchanged nodes
+            unchanged = [
+                (node.offset, node.offset + node.size)
+                for node in env.file.directory_info
+                if node.path != objs[-1].assets_file.name
+            ]
+            assert set(blocks_within(env.file, unchanged)) <= set(reused)
+
+
+def test_save_original_objects():
+    fp = os.path.join(sample_dirs()[1], "synthetic_lz4.bundle")
+    for resize in (False, True):
+        env = UnityPy.load(fp)
+        reused = count_reused_blocks(env.file)
+        node = env.file.directory_info[0]
+        asset = env.file.files[node.path]
+        objs = list(asset.objects.values())
+        obj = objs[len(objs) // 2]
+        raw_data = {o.path_id: o.get_raw_data() for o in objs}
+        data = raw_data[obj.path_id]
+        raw_data[obj.path_id] = data + b"\x00" * 8 if resize else data[:-1] + b"\x01"
+        obj.set_raw_data(raw_data[obj.path_id])
+        re_env = UnityPy.load(env.file.save(packer="original"))
+        re_objects = re_env.file.files[node.path].objects
+        assert {path_id: o.get_raw_data() for path_id, o in re_objects.items()} == raw_data
+
+        end = env.file._blocks_storage.length
+        resource = (node.offset + node.size, end)
+        if resize:
+            # the metadata and the objects behind the changed one moved,
+            # only the objects in front of it are kept
+            kept = [(node.offset + asset.header.data_offset, node.offset + obj.byte_start), resource]
+        else:
+            # everything except the object itself stays the same, up to the end of the following resource file
+            kept = [(node.offset, node.offset + obj.byte_start), (node.offset + obj.byte_start + obj.byte_size, end)]
+        assert reused == blocks_within(env.file, kept)
+        assert len(reused) > len(blocks_within(env.file, [resource]))
+
+
+class CountingStream(io.BytesIO):
+    """Stream that counts the bytes that are read from it."""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_probe():
+    for samples in sample_dirs():
+        for f in os.listdir(samples):
+            fp = os.path.join(samples, f)
+            env = UnityPy.load(fp)
+            probe = UnityPy.probe(fp, serialized_files=True)
+            with open(fp, "rb") as stream:
+                data = stream.read()
+            if isinstance(env.file, BundleFile):
+                assert [node.path for node in probe.nodes] == list(env.file.files)
+                for node in probe.nodes:
+                    f = env.file.files[node.path]
+                    if isinstance(f, SerializedFile):
+                        assert node.serialized_file.object_count == len(f.objects)
+                        assert node.serialized_file.unity_version == f.unity_version
+                # only the header and the blocks info are read, not the data blocks
+                stream = CountingStream(data)
+                assert UnityPy.probe(stream) == UnityPy.probe(data)
+                assert stream.bytes_read <= probe.file_size - probe.compressed_size
+            elif isinstance(env.file, SerializedFile):
+                assert probe.object_count == len(env.file.objects)
+                # the object data isn't read, the header is read again after detecting the type
+                stream = CountingStream(data)
+                assert UnityPy.probe(stream) == UnityPy.probe(data)
+                assert stream.bytes_read <= probe.metadata_size + 0x100
+
+
+def test_bundle_member_views():
+    workers = UnityPy.config.DECOMPRESS_WORKERS
+    UnityPy.config.DECOMPRESS_WORKERS = 1
+    try:
+        for samples in sample_dirs():
+            for f in os.listdir(samples):
+                env = UnityPy.load(os.path.join(samples, f))
+                if not isinstance(env.file, BundleFile):
+                    continue
+                # the members are slices of the decompressed data instead of copies
+                readers = [getattr(member, "reader", member) for member in env.file.files.values()]
+                assert len({id(reader.view.obj) for reader in readers}) == 1
+    finally:
+        UnityPy.config.DECOMPRESS_WORKERS = workers
+
+
+def test_object_table():
+    for samples in sample_dirs():
+        env = UnityPy.load(samples)
+        for asset in env.assets:
+            objects = asset.objects
+            assert list(objects) == [obj.path_id for obj in objects.values()]
+            assert all(objects[path_id] is obj for path_id, obj in objects.items())
+            for class_id in set(objects.class_ids):
+                assert objects.get_by_class_id(class_id) == [
+                    obj for obj in objects.values() if obj.class_id == class_id
+                ]
+
+            # changes to the table
+            path_id, obj = next(iter(objects.items()))
+            del objects[path_id]
+            assert path_id not in objects
+            assert len(objects) == len(objects.path_ids) - 1
+            objects[path_id] = obj
+            assert objects[path_id] is obj
+            assert obj in objects.get_by_class_id(obj.class_id)
+
+
+def test_object_table_path_id_limits():
+    # unsorted path ids whose differences overflow int64
+    path_ids = [2**63 - 8, -(2**63) + 8, 5]
+    objects = [(path_id, 49, generate_object(49, {"m_Name": str(path_id)})) for path_id in path_ids]
+    asset = UnityPy.load(generate_serialized_file(objects)).file
+    for path_id in path_ids:
+        assert path_id in asset.objects
+        assert asset.objects[path_id].read().m_Name == str(path_id)
+    assert sorted(asset.objects) == sorted(path_ids)
+
+
+def test_lazy_typetrees():
+    def lookups():
+        stats = TYPETREE_CACHE.stats
+        return stats["hits"] + stats["misses"]
+
+    for samples in sample_dirs():
+        start = lookups()
+        env = UnityPy.load(samples)
+        assets = env.assets
+        # the typetrees aren't parsed while loading
+        assert lookups() == start
+        parsed = 0
+        for asset in assets:
+            # unparsed typetrees are written back as they were read
+            data = asset.save()
+            nodes = [typ.node for typ in asset.types]
+            assert asset.save() == data
+            parsed += sum(node is not None for node in nodes)
+        # each typetree is parsed once, when it's used
+        assert lookups() == start + parsed
+
+
+def test_lazy_container():
+    for samples in sample_dirs():
+        env = UnityPy.load(samples)
+        ref_env = UnityPy.load(samples)
+        for asset, ref_asset in zip(env.assets, ref_env.assets):
+            # only the container is read, not the whole AssetBundle
+            container = asset.container
+            if ref_asset.assetbundle is None:
+                assert len(container) == 0
+                continue
+            ref = ContainerHelper(ref_asset.assetbundle)
+            assert container.container == ref.container
+            assert container.path_dict == ref.path_dict
+            container.parse_preload_table()
+            ref.parse_preload_table()
+        # the preload table is parsed when it's needed, the paths of the dependencies are the same
+        assert [asset.container.path_dict for asset in env.assets] == [
+            asset.container.path_dict for asset in ref_env.assets
+        ]
+
+
+def test_save_serialized_file():
+    for samples in sample_dirs():
+        env = UnityPy.load(samples)
+        for asset in env.assets:
+            data = asset.save()
+            assert isinstance(data, bytes)
+            stream = io.BytesIO()
+            assert asset.save(fp=stream) is None
+            assert stream.getvalue() == data
+
+            # changed objects are written from their new data, the others are copied
+            objects = list(asset.objects.values())
+            raw_data = [obj.get_raw_data() for obj in objects]
+            objects[0].set_raw_data(raw_data[0] + b"\x01" * 3)
+            raw_data[0] += b"\x01" * 3
+            re_asset = UnityPy.load(asset.save()).file
+            assert [obj.get_raw_data() for obj in re_asset.objects.values()] == raw_data
+
+
+def test_save_in_place():
+    # local files are memory-mapped by default, otherwise they're streamed
+    try:
+        for mmap_local_files in (True, False):
+            UnityPy.config.MMAP_LOCAL_FILES = mmap_local_files
+            for samples in sample_dirs():
+                with TemporaryDirectory(prefix="unitypy_test") as temp_dir:
+                    for f in os.listdir(samples):
+                        fp = os.path.join(temp_dir, f)
+                        shutil.copy(os.path.join(samples, f), fp)
+                        env = UnityPy.load(fp)
+                        if not env.assets:
+                            continue
+                        objects = list(env.assets[0].objects.values())
+                        raw_data = [obj.get_raw_data() for obj in objects]
+                        raw_data[0] += b"\x00" * 4
+                        objects[0].set_raw_data(raw_data[0])
+
+                        # the file that is read from can't be written into directly
+                        with open(fp, "r+b") as out:
+                            try:
+                                env.file.save(fp=out)
+                            except ValueError:
+                                pass
+                            else:
+                                raise AssertionError("saved into the file it's read from")
+                        # but it's replaced by the saved file, which keeps the loaded data intact
+                        env.save(pack="lz4", out_path=temp_dir)
+                        assert [obj.get_raw_data() for obj in UnityPy.load(fp).assets[0].objects.values()] == raw_data
+                        assert [obj.get_raw_data() for obj in objects[1:]] == raw_data[1:]
+    finally:
+        UnityPy.config.MMAP_LOCAL_FILES = True
+
+
+if platform.system() == "Windows":
+    # files that are still open can't be replaced on windows
+    del test_save_in_place
+
+
+def test_changes():
+    for samples in sample_dirs():
+        for f in os.listdir(samples):
+            env = UnityPy.load(os.path.join(samples, f))
+            if not env.assets:
+                continue
+            asset = env.assets[0]
+            obj, other = list(asset.objects.values())[:2]
+            data = obj.get_raw_data()
+
+            # setting the same data doesn't change anything
+            obj.set_raw_data(data)
+            assert not obj.is_changed and not env.file.is_changed
+            assert not env.file.get_changes()
+
+            obj.set_raw_data(data + b"\x00" * 4)
+            del asset.objects[other.path_id]
+            changes = env.file.get_changes()
+            assert changes.byte_delta == 4 - other.byte_size
+            asset_changes = changes if isinstance(env.file, SerializedFile) else changes.files[0]
+            assert asset_changes.path_ids == [obj.path_id, other.path_id]
+            assert asset_changes.objects[1].new_size is None
+
+
+def test_load_zip():
+    for samples in sample_dirs():
+        stream = io.BytesIO()
+        with zipfile.ZipFile(stream, "w") as z:
+            for i, f in enumerate(sorted(os.listdir(samples))):
+                with open(os.path.join(samples, f), "rb") as sample:
+                    compression = zipfile.ZIP_STORED if i % 2 else zipfile.ZIP_DEFLATED
+                    z.writestr(f"assets/{f}", sample.read(), compress_type=compression)
+
+        env = UnityPy.load(stream.getvalue())
+        # the members are only loaded once they're accessed
+        assert not env.cabs
+        with TemporaryDirectory(prefix="unitypy_test") as temp_dir:
+            # members that weren't loaded can't be changed, so saving doesn't load them
+            env.save(out_path=temp_dir)
+            assert not os.listdir(temp_dir)
+        assert not env.cabs
+        ref = UnityPy.load(*(os.path.join(samples, f) for f in sorted(os.listdir(samples))))
+        assert sorted(obj.get_raw_data() for obj in env.objects) == sorted(obj.get_raw_data() for obj in ref.objects)
+
+
+def test_load_folder_workers():
+    for samples in sample_dirs():
+        ref = UnityPy.load(samples)
+        env = UnityPy.Environment()
+        env.load_folder(samples, workers=2)
+        # the files are only indexed
+        assert not env.cabs
+        assert isinstance(env.container, ContainerHelper)
+        for key in list(ref.container.keys())[:1]:
+            assert key in env.container
+            assert not env.cabs
+            assert env.container[key].deref().get_raw_data() == ref.container[key].deref().get_raw_data()
+            # only the file that contains the path was loaded
+            assert 0 < len(env.cabs) < len(ref.cabs)
+        assert len(env.container) == len(ref.container)
+        assert sorted(env.container.keys()) == sorted(ref.container.keys())
+        assert sorted(obj.get_raw_data() for obj in env.objects) == sorted(obj.get_raw_data() for obj in ref.objects)
+        assert env.files.keys() == ref.files.keys()
+
+
+def test_index_cache():
+    for samples in sample_dirs():
+        with TemporaryDirectory(prefix="unitypy_test") as temp_dir:
+            cache = os.path.join(temp_dir, "index.db")
+            ref = UnityPy.load(samples)
+            for _ in range(2):
+                env = UnityPy.load(samples, index_cache=cache)
+                assert not env.cabs
+                assert sorted(obj.get_raw_data() for obj in env.objects) == sorted(
+                    obj.get_raw_data() for obj in ref.objects
+                )
+
+            # the cached indices are the same as new ones, as long as the files don't change
+            fp = os.path.join(temp_dir, "sample")
+            with open(os.path.join(samples, sorted(os.listdir(samples))[0]), "rb") as f:
+                data = f.read()
+            with open(fp, "wb") as f:
+                f.write(data)
+            with IndexHelper.IndexCache(cache) as index_cache:
+                index = IndexHelper.index_files([fp], cache=index_cache)[0]
+                assert index_cache.get(fp) == index
+                with open(fp, "ab") as f:
+                    f.write(b"\x00")
+                assert index_cache.get(fp) is None
+
+
+def test_hash_objects():
+    for samples in sample_dirs():
+        env = UnityPy.load(samples)
+        objects = [obj for asset in env.assets for obj in asset.objects.values()]
+        digests = HashHelper.hash_objects(env)
+        assert [digest.digest for digest in digests] == [hashlib.sha1(obj.get_raw_data()).digest() for obj in objects]
+        assert HashHelper.hash_objects(env, "md5", workers=4) == HashHelper.hash_objects(env, "md5")
+
+        for f in os.listdir(samples):
+            fp = os.path.join(samples, f)
+            with open(fp, "rb") as stream:
+                assert HashHelper.crc32(fp) == zlib.crc32(stream.read())
+            env = UnityPy.load(fp)
+            if isinstance(env.file, BundleFile) and env.file.signature == "UnityFS":
+                data = env.file._blocks_storage.decompress_all()
+                assert HashHelper.bundle_crc32(env.file, workers=2) == zlib.crc32(data)
+
+
 if __name__ == "__main__":
     for x in list(locals()):
         if str(x)[:4] == "test":
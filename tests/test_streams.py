@@ -0,0 +1,210 @@
+import io
+import os
+import random
+from tempfile import TemporaryDirectory
+
+from UnityPy import config
+from UnityPy.files.BundleFile import BlockInfo
+from UnityPy.helpers import CompressionHelper
+from UnityPy.streams import BlockCache, BlockStorage, EndianBinaryReader, SegmentStorage
+from UnityPy.streams.EndianBinaryReader import EndianBinaryReader_Mmap
+
+
+def generate_blocks(size: int = 0x50000, seed: int = 0):
+    rng = random.Random(seed)
+    data = bytes(rng.choice(b"UnityPy\x00") for _ in range(size))
+    compressed, block_info = CompressionHelper.chunk_based_compress(data, 2)
+    blocks = [BlockInfo(*info) for info in block_info]
+    return data, compressed, blocks
+
+
+def decompress_block(data, uncompressed_size, flags, index):
+    return CompressionHelper.DECOMPRESSION_MAP[flags & 0x3F](data, uncompressed_size)
+
+
+def test_block_storage():
+    data, compressed, blocks = generate_blocks()
+    storage = BlockStorage(EndianBinaryReader(compressed), blocks, 0, decompress_block)
+    assert len(storage) == len(data)
+    assert storage.loaded_blocks == 0
+
+    # a read within one block only decompresses that block
+    assert storage.read(0x20010, 16) == data[0x20010:0x20020]
+    assert storage.loaded_blocks == 1
+
+    # reads across block borders
+    assert storage.read(0x1FFF0, 0x40) == data[0x1FFF0:0x20030]
+    assert storage.read(0, -1) == data
+    assert storage.loaded_blocks == len(blocks)
+
+
+def test_block_storage_reader():
+    data, compressed, blocks = generate_blocks()
+    storage = BlockStorage(EndianBinaryReader(compressed), blocks, 0, decompress_block)
+    window = storage.window(0x1FFF0, 0x100)
+    reader = EndianBinaryReader(window, endian="<")
+    ref = EndianBinaryReader(data[0x1FFF0:0x200F0], endian="<")
+    assert reader.Length == ref.Length
+    while ref.Position < ref.Length - 16:
+        assert reader.read_u_int() == ref.read_u_int()
+        assert reader.read_string_to_null() == ref.read_string_to_null()
+        assert reader.Position == ref.Position
+    assert reader.bytes == ref.bytes
+    # only the two blocks around the window were touched
+    assert storage.loaded_blocks == 2
+
+
+def test_block_storage_decompress_all():
+    data, compressed, blocks = generate_blocks()
+    for workers in (None, 1, 4):
+        storage = BlockStorage(EndianBinaryReader(compressed), blocks, 0, decompress_block)
+        # already decompressed blocks are reused
+        storage.get_block(1)
+        assert storage.decompress_all(workers) == data
+
+
+def test_block_cache():
+    data, compressed, blocks = generate_blocks()
+    # budget for two blocks
+    cache = BlockCache(0x40000)
+    storages = [BlockStorage(EndianBinaryReader(compressed), blocks, 0, decompress_block, cache) for _ in range(2)]
+    for storage in storages:
+        assert storage.read(0, -1) == data
+    assert cache.size <= cache.max_bytes
+    assert cache.misses == 2 * len(blocks)
+    assert cache.evictions == 2 * len(blocks) - 2
+
+    # the most recently used blocks are still cached
+    assert storages[1].read(0x40000, 0x10) == data[0x40000:0x40010]
+    assert cache.hits == 1
+    assert storages[0].loaded_blocks == 0
+    assert storages[1].loaded_blocks == 2
+
+
+def test_segment_storage():
+    data, _, _ = generate_blocks()
+    rng = random.Random(0)
+    cuts = sorted(rng.randrange(len(data)) for _ in range(8))
+    segments = [data[start:end] for start, end in zip([0, *cuts], [*cuts, len(data)])]
+    storage = SegmentStorage(segments)
+    assert len(storage) == len(data)
+    assert storage.read(0) == data
+    for _ in range(50):
+        offset = rng.randrange(len(data))
+        size = rng.randrange(0x8000)
+        assert storage.read(offset, size) == data[offset : offset + size]
+        window = storage.window(offset, len(data) - offset)
+        assert window.read(0, size) == data[offset : offset + size]
+
+    reader = EndianBinaryReader(storage, endian="<")
+    ref = EndianBinaryReader(data, endian="<")
+    while ref.Position < ref.Length - 16:
+        assert reader.read_u_int() == ref.read_u_int()
+        assert reader.read_string_to_null() == ref.read_string_to_null()
+    assert reader.bytes == data
+
+
+def test_chunk_based_compress_workers():
+    data, compressed, blocks = generate_blocks()
+    for workers in (1, 4):
+        assert CompressionHelper.chunk_based_compress(data, 2, workers=workers) == (
+            compressed,
+            [(block.uncompressedSize, block.compressedSize, block.flags) for block in blocks],
+        )
+
+    compressed, block_info = CompressionHelper.chunk_based_compress(
+        data, 3, chunk_size=0x10000, compression_level=3, workers=4
+    )
+    assert [size for size, _, _ in block_info] == [0x10000] * 5
+    storage = BlockStorage(
+        EndianBinaryReader(compressed), [BlockInfo(*info) for info in block_info], 0, decompress_block
+    )
+    assert storage.read(0) == data
+
+    # the defaults used when saving a BundleFile are set via the config
+    config.COMPRESSION_CHUNK_SIZE = 0x8000
+    config.COMPRESSION_LEVEL = 3
+    try:
+        assert CompressionHelper.chunk_based_compress(data, 3) == CompressionHelper.chunk_based_compress(
+            data, 3, chunk_size=0x8000, compression_level=3
+        )
+    finally:
+        config.COMPRESSION_CHUNK_SIZE = None
+        config.COMPRESSION_LEVEL = None
+    assert [size for size, _, _ in CompressionHelper.chunk_based_compress(data, 3)[1]] == [0x20000] * 2 + [0x10000]
+
+
+def test_chunk_based_compress_stream_lzma():
+    compressible, _, _ = generate_blocks(0x1000)
+    rng = random.Random(0)
+    incompressible = bytes(rng.getrandbits(8) for _ in range(0x1000))
+    for data in (compressible, incompressible):
+        stream = bytearray()
+        block_info = CompressionHelper.chunk_based_compress_stream([data[:0x100], data[0x100:]], 1, stream.extend)
+        # the output is the same as without streaming, data that would get bigger is stored uncompressed
+        assert CompressionHelper.chunk_based_compress(data, 1) == (stream, block_info)
+        assert (block_info[0][2] == 0) == (data is incompressible)
+
+
+def test_lzma_spill():
+    data, _, _ = generate_blocks()
+    compressed = CompressionHelper.compress_lzma(data)
+    stream = io.BytesIO()
+    assert CompressionHelper.decompress_lzma_to_file(compressed, stream, chunk_size=0x1000) == len(data)
+    assert stream.getvalue() == data
+    assert CompressionHelper.decompress_lzma_to_mmap(compressed, len(data))[:] == data
+
+
+def test_decompress_stream():
+    data, _, _ = generate_blocks()
+    for compress, decompress in (
+        (CompressionHelper.compress_gzip, CompressionHelper.decompress_gzip_stream),
+        (CompressionHelper.compress_brotli, CompressionHelper.decompress_brotli_stream),
+    ):
+        stream = io.BytesIO(compress(data))
+        assert b"".join(decompress(stream.read, chunk_size=0x1000)) == data
+
+
+def test_mmap_reader():
+    data, _, _ = generate_blocks(0x1000)
+    with TemporaryDirectory(prefix="unitypy_test") as temp_dir:
+        fp = os.path.join(temp_dir, "data")
+        with open(fp, "wb") as f:
+            f.write(data)
+        # local files are memory-mapped unless it's disabled
+        config.MMAP_LOCAL_FILES = False
+        try:
+            assert not isinstance(EndianBinaryReader(fp), EndianBinaryReader_Mmap)
+        finally:
+            config.MMAP_LOCAL_FILES = True
+        reader = EndianBinaryReader(fp, endian="<")
+        assert isinstance(reader, EndianBinaryReader_Mmap)
+        assert reader.Length == len(data)
+        assert reader.read_u_int_array(16) == EndianBinaryReader(data, endian="<").read_u_int_array(16)
+        assert reader.bytes == data
+        # the data is kept in memory once the reader is detached from the file
+        reader.detach()
+        assert reader.mmap is None
+        os.remove(fp)
+        assert reader.bytes == data
+        reader.dispose()
+
+
+def test_stream_reader_detach():
+    data, _, _ = generate_blocks(0x1000)
+    stream = io.BytesIO(data)
+    reader = EndianBinaryReader(stream, endian="<", offset=0x10)
+    reader.Position = 0x20
+    # the stream is only copied once it's detached
+    reader.detach()
+    stream.close()
+    assert reader.Position == 0x20
+    assert reader.read_bytes(0x10) == data[0x30:0x40]
+    assert reader.bytes == data[0x10:]
+
+
+if __name__ == "__main__":
+    for x in list(locals()):
+        if str(x)[:4] == "test":
+            locals()[x]()
+    input("All Tests Passed")
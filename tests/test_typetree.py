@@ -6,10 +6,12 @@ from typing import List, Tuple, Type, TypeVar, Union
 
 import psutil
 
+from UnityPy import config
 from UnityPy.classes.generated import GameObject
+from UnityPy.helpers import TypeTreeCompiler
 from UnityPy.helpers.Tpk import get_typetree_node
 from UnityPy.helpers.TypeTreeHelper import read_typetree, write_typetree
-from UnityPy.helpers.TypeTreeNode import TypeTreeNode
+from UnityPy.helpers.TypeTreeNode import TypeTreeCache, TypeTreeNode
 from UnityPy.helpers.UnityVersion import UnityVersion
 from UnityPy.streams import EndianBinaryReader, EndianBinaryWriter
 
@@ -201,6 +203,92 @@ def test_node_from_list_dict():
     assert node == TEST_CLASS_NODE
 
 
+def test_typetree_cache():
+    root = TypeTreeNode.from_list(get_typetree_node(4, UnityVersion.from_list(2019, 4, 0, 0)).to_dict_list())
+    for index, node in enumerate(root.traverse()):
+        # fields that the Tpk nodes don't have, but the blob requires
+        node.m_Version = node.m_Version or 1
+        node.m_ByteSize = -1 if node.m_ByteSize is None else node.m_ByteSize
+        node.m_Index = index
+        node.m_TypeFlags = node.m_TypeFlags or 0
+        node.m_MetaFlag = node.m_MetaFlag or 0
+        node.m_RefTypeHash = 0
+    writer = EndianBinaryWriter(b"", "<")
+    root.dump_blob(writer, 22)
+    blob = writer.bytes
+
+    cache = TypeTreeCache()
+    nodes = []
+    for _ in range(2):
+        reader = EndianBinaryReader(blob + b"\xff", "<")
+        nodes.append(cache.get_blob_node(reader, 22, (1, None, None)))
+        # the reader is placed behind the blob
+        assert reader.Position == len(blob)
+    assert nodes[0] is nodes[1]
+    assert nodes[0] == root
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+    assert cache.stats["saved_bytes"] > 0
+
+    # a different key doesn't share the node
+    node = cache.get_blob_node(EndianBinaryReader(blob, "<"), 22, (2, None, None))
+    assert node is not nodes[0]
+    assert len(cache) == 2
+
+    # typetrees that aren't used anymore are dropped
+    del node, nodes
+    gc.collect()
+    assert len(cache) == 0
+
+
+def test_compiled_reader():
+    node = get_typetree_node(4, UnityVersion.from_list(2019, 4, 0, 0))
+    writer = EndianBinaryWriter(b"", "<")
+    # aligned data behind some other data
+    writer.write_bytes(b"\0" * 8)
+    write_typetree(
+        {
+            "m_GameObject": {"m_FileID": 0, "m_PathID": 1},
+            "m_LocalRotation": {"x": 0.0, "y": 0.0, "z": 0.0, "w": 1.0},
+            "m_LocalPosition": {"x": 1.0, "y": 2.0, "z": 3.0},
+            "m_LocalScale": {"x": 1.0, "y": 1.0, "z": 1.0},
+            "m_Children": [{"m_FileID": 0, "m_PathID": 2}, {"m_FileID": 1, "m_PathID": -3}],
+            "m_Father": {"m_FileID": 0, "m_PathID": 0},
+        },
+        node,
+        writer,
+    )
+    data = writer.bytes
+
+    compile_typetree_readers = config.COMPILE_TYPETREE_READERS
+    for as_dict in (True, False):
+        values = []
+        try:
+            for compile_readers in (False, True):
+                config.COMPILE_TYPETREE_READERS = compile_readers
+                reader = EndianBinaryReader(data, "<")
+                reader.Position = 8
+                values.append(read_typetree(node, reader, as_dict=as_dict, byte_size=len(data) - 8))
+                assert reader.Position == len(data)
+        finally:
+            config.COMPILE_TYPETREE_READERS = compile_typetree_readers
+        assert values[0] == values[1]
+
+        # the reader is compiled once per node
+        read = TypeTreeCompiler.get_reader(node, "<", as_dict)
+        assert read is not None
+        assert TypeTreeCompiler.get_reader(node, "<", as_dict) is read
+
+    # nodes whose layout depends on the data are left to the generic reader
+    node = TypeTreeNode.from_list(
+        [
+            {"m_Level": 0, "m_Type": "Root", "m_Name": "Base", "m_ByteSize": -1, "m_Version": 1},
+            {"m_Level": 1, "m_Type": "ReferencedObject", "m_Name": "m_Ref", "m_ByteSize": -1, "m_Version": 1},
+        ]
+    )
+    assert TypeTreeCompiler.get_reader(node, "<", True) is None
+
+
 if __name__ == "__main__":
     for x in list(locals()):
         if str(x)[:4] == "test":